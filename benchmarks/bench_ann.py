@@ -0,0 +1,88 @@
+# benchmarks/bench_ann.py
+#
+# Recall@TOP_K y latencia p50/p99 de cada tipo de índice (index_factory)
+# contra la búsqueda exacta, sobre datos sintéticos de 768 dimensiones.
+# Los vectores se generan en clusters (como los embeddings reales) y
+# normalizados; datos uniformes son el peor caso para IVF/HNSW.
+#
+# Uso:  python -m benchmarks.bench_ann [n_vectores] [n_queries]
+
+import sys
+import time
+import faiss
+import numpy as np
+
+from src.config import VECTOR_DIM, TOP_K, IVF_NPROBE, HNSW_EF_SEARCH
+from src.index_factory import FLAT, IVF, HNSW, new_index, ivf_nlist
+
+
+def synthetic(n: int, n_queries: int, dim: int = VECTOR_DIM, clusters: int = 200):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    def sample(m):
+        x = centers[rng.integers(0, clusters, m)] + 0.5 * rng.standard_normal((m, dim)).astype("float32")
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+    return sample(n), sample(n_queries)
+
+
+def build(kind: str, data: np.ndarray) -> faiss.Index:
+    index = new_index(kind, data.shape[1], len(data))
+    if not index.is_trained:
+        sample = data[np.random.default_rng(1).choice(len(data), min(len(data), 50 * index.nlist), replace=False)]
+        index.train(sample)
+    index.add(data)
+    return index
+
+
+def latency(index: faiss.Index, queries: np.ndarray):
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q.reshape(1, -1), TOP_K)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def recall(index: faiss.Index, queries: np.ndarray, truth: np.ndarray) -> float:
+    _, ids = index.search(queries, TOP_K)
+    return float(np.mean([len(set(a) & set(b)) / TOP_K for a, b in zip(ids, truth)]))
+
+
+def main(n: int, n_queries: int):
+    data, queries = synthetic(n, n_queries)
+    print(f"[Bench] {n} vectores x {VECTOR_DIM} dims, {n_queries} queries, TOP_K={TOP_K}")
+    print(f"{'index':>24} | {'build':>8} | {'recall':>6} | {'p50':>8} {'p99':>8}")
+
+    results = {}
+    for kind in (FLAT, IVF, HNSW):
+        t0 = time.perf_counter()
+        index = build(kind, data)
+        build_s = time.perf_counter() - t0
+        if kind == FLAT:
+            _, truth = index.search(queries, TOP_K)
+        # Barre el parámetro de búsqueda alrededor del valor configurado
+        if kind == IVF:
+            knobs = [("nprobe", v) for v in sorted({1, 4, IVF_NPROBE, 4 * IVF_NPROBE})]
+        elif kind == HNSW:
+            knobs = [("efSearch", v) for v in sorted({16, HNSW_EF_SEARCH, 4 * HNSW_EF_SEARCH})]
+        else:
+            knobs = [(None, None)]
+        for name, value in knobs:
+            if name == "nprobe":
+                index.nprobe = value
+            elif name == "efSearch":
+                index.hnsw.efSearch = value
+            label = kind if name is None else f"{kind} {name}={value}"
+            p50, p99 = latency(index, queries)
+            r = recall(index, queries, truth)
+            results[label] = (r, p50, p99)
+            print(f"{label:>24} | {build_s:>7.1f}s | {r:>6.3f} | {p50:>6.2f}ms {p99:>6.2f}ms")
+        del index
+    print(f"[Bench] IVF nlist={ivf_nlist(n)} (√n)")
+    return results
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    main(n, n_queries)
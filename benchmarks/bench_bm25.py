@@ -0,0 +1,86 @@
+# benchmarks/bench_bm25.py
+#
+# Búsqueda léxica sobre todo el corpus: índice invertido BM25 (FTS5 en el
+# chunk store) contra un recorrido lineal por substring de todos los textos.
+# También mide cuánto cuesta mantener el índice al hacer append.
+#
+# Uso:  python -m benchmarks.bench_bm25 [n_chunks ...]
+
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+import numpy as np
+
+from src.config import TOP_K
+from src.chunk_store import ChunkStore
+
+VOCAB = 20_000
+WORDS_PER_CHUNK = 20
+BATCH = 1_000
+
+
+def synthetic_texts(n: int):
+    rng = np.random.default_rng(0)
+    # Frecuencias tipo Zipf, como en texto real
+    words = rng.zipf(1.3, size=(n, WORDS_PER_CHUNK)) % VOCAB
+    return [" ".join(f"w{w}" for w in row) for row in words]
+
+
+def timeit(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def main(sizes):
+    print(f"{'chunks':>8} | {'append/1k':>9} {'no FTS':>8} | {'bm25 p50':>9} {'p99':>8} | {'scan p50':>9} | speedup")
+    questions = ["w137 w2048 w733", "w15001 w99", "w4242"]
+    for n in sizes:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            texts = synthetic_texts(n)
+            records = [{"doc_id": f"doc-{i // 60}", "chunk_id": i % 60, "text": t} for i, t in enumerate(texts)]
+
+            store = ChunkStore(os.path.join(tmpdir, "chunks.sqlite3"))
+            t0 = time.perf_counter()
+            for lo in range(0, n, BATCH):
+                store.append(lo, records[lo:lo + BATCH])
+            with_fts = (time.perf_counter() - t0) * 1000 / (n / BATCH)
+
+            # Misma tabla sin el índice invertido, como referencia del costo de mantenerlo
+            plain = sqlite3.connect(os.path.join(tmpdir, "plain.sqlite3"), isolation_level=None)
+            plain.execute("CREATE TABLE chunks (id INTEGER PRIMARY KEY, doc_id TEXT, chunk_id INTEGER, text TEXT)")
+            plain.execute("CREATE UNIQUE INDEX idx_chunks_doc ON chunks(doc_id, chunk_id)")
+            t0 = time.perf_counter()
+            for lo in range(0, n, BATCH):
+                plain.execute("BEGIN")
+                plain.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                                  [(lo + i, r["doc_id"], r["chunk_id"], r["text"]) for i, r in enumerate(records[lo:lo + BATCH])])
+                plain.execute("COMMIT")
+            without_fts = (time.perf_counter() - t0) * 1000 / (n / BATCH)
+
+            def bm25():
+                for q in questions:
+                    store.search_bm25(q, TOP_K)
+
+            def scan():
+                for q in questions:
+                    kws = q.split()
+                    [t for t in texts if any(k in t for k in kws)]
+
+            b50, b99 = timeit(bm25, 50)
+            s50, _ = timeit(scan, 5)
+            print(f"{n:>8} | {with_fts:>7.1f}ms {without_fts:>6.1f}ms | {b50:>7.2f}ms {b99:>6.2f}ms | {s50:>7.1f}ms | {s50 / b50:>6.1f}x")
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    main(sizes)
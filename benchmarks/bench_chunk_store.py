@@ -0,0 +1,73 @@
+# benchmarks/bench_chunk_store.py
+#
+# Costo de agregar un artículo y de leer los TOP_K textos de una query,
+# con metadatos.json (reescritura completa con indent=2) versus el chunk store.
+#
+# Uso:  python -m benchmarks.bench_chunk_store [n_chunks ...]
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+
+from src.config import TOP_K
+from src.chunk_store import ChunkStore
+from src.utils import load_metadata, save_metadata
+
+ARTICLE_CHUNKS = 200
+
+
+def records(doc, n, start=0):
+    return [{"doc_id": doc, "chunk_id": start + i, "text": "lorem ipsum dolor sit amet " * 4}
+            for i in range(n)]
+
+
+def ms(fn, repeats=5):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(samples))
+
+
+def main(sizes):
+    rng = np.random.default_rng(0)
+    print(f"{'chunks':>9} | {'append JSON':>11} {'append store':>12} | {'lookup JSON':>11} {'lookup store':>12}")
+    for n in sizes:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(tmpdir, "metadatos.json")
+            save_metadata(records("base", n), json_path)
+            store = ChunkStore(os.path.join(tmpdir, "chunks.sqlite3"))
+            store.append(0, records("base", n))
+            article = records("nuevo", ARTICLE_CHUNKS)
+
+            def append_json():
+                metadatos = load_metadata(json_path)
+                metadatos.extend(article)
+                save_metadata(metadatos, json_path)
+
+            def append_store():
+                store.append(store.next_id(), article)
+
+            ids = rng.integers(0, n, TOP_K).tolist()
+
+            def lookup_json():
+                metadatos = load_metadata(json_path)
+                return [metadatos[i]["text"] for i in ids]
+
+            def lookup_store():
+                return [c["text"] for c in store.get_many(ids)]
+
+            print(f"{n:>9} | {ms(append_json, 3):>9.1f}ms {ms(append_store, 3):>10.1f}ms |"
+                  f" {ms(lookup_json, 3):>9.1f}ms {ms(lookup_store, 50):>10.3f}ms")
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 300_000]
+    main(sizes)
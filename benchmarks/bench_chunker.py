@@ -0,0 +1,81 @@
+# benchmarks/bench_chunker.py
+#
+# Chunker nativo (src.chunker) contra el RecursiveCharacterTextSplitter de
+# LangChain que se instanciaba en cada llamada: chunks/seg, ms por artículo
+# y chunks por artículo sobre los textos de data/docs/ (repetidos para
+# llegar a un tamaño medible). LangChain solo se usa si está instalado.
+#
+# Uso:  python -m benchmarks.bench_chunker [repeticiones]
+
+import os
+import sys
+import glob
+import time
+import numpy as np
+
+from src.config import CHUNK_SIZE, CHUNK_OVERLAP, DOCS_DIR
+from src.chunker import chunk_text
+
+
+def load_articles():
+    articles = []
+    for path in sorted(glob.glob(os.path.join(DOCS_DIR, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            articles.append(f.read())
+    return articles
+
+
+# Configuración anterior del splitter de LangChain
+OLD_CHUNK_SIZE, OLD_CHUNK_OVERLAP = 100, 20
+
+
+def langchain_splitter(chunk_size: int, chunk_overlap: int):
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    except ImportError:
+        return None
+
+    def split(text):
+        # Como el código anterior: un splitter nuevo por artículo
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        return splitter.split_text(text)
+    return split
+
+
+def run(split, articles, repeats):
+    counts, sizes = [], []
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for text in articles:
+            chunks = split(text)
+            counts.append(len(chunks))
+            sizes.extend(len(c) for c in chunks)
+    elapsed = time.perf_counter() - t0
+    return sum(counts) / elapsed, elapsed * 1000 / len(counts), np.mean(counts), np.mean(sizes), max(sizes)
+
+
+def main(repeats: int):
+    articles = load_articles()
+    if not articles:
+        print(f"No hay artículos en {DOCS_DIR}")
+        return
+    total = sum(len(a) for a in articles)
+    print(f"{len(articles)} artículos, {total / 1e3:.0f}k caracteres; chunk_size={CHUNK_SIZE}, overlap={CHUNK_OVERLAP}")
+    splitters = [
+        ("nativo (chars)", lambda t: [c.text for c in chunk_text(t, unit="chars")]),
+        ("nativo (tokens)", lambda t: [c.text for c in chunk_text(t, CHUNK_SIZE // 4, CHUNK_OVERLAP // 4, unit="tokens")]),
+    ]
+    old = langchain_splitter(OLD_CHUNK_SIZE, OLD_CHUNK_OVERLAP)
+    if old is None:
+        print("(langchain no instalado: se omite la comparación)")
+    else:
+        splitters.append((f"langchain {OLD_CHUNK_SIZE}/{OLD_CHUNK_OVERLAP}", old))
+        splitters.append((f"langchain {CHUNK_SIZE}/{CHUNK_OVERLAP}", langchain_splitter(CHUNK_SIZE, CHUNK_OVERLAP)))
+    print(f"{'splitter':>18} | {'chunks/s':>9} | {'ms/artículo':>11} | {'chunks/art':>10} | {'largo medio':>11} {'max':>5}")
+    for name, split in splitters:
+        rate, ms, per_article, mean_len, max_len = run(split, articles, repeats)
+        print(f"{name:>18} | {rate:>9.0f} | {ms:>11.2f} | {per_article:>10.1f} | {mean_len:>11.0f} {max_len:>5}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
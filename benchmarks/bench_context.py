@@ -0,0 +1,87 @@
+# benchmarks/bench_context.py
+#
+# Tamaño del prompt que recibe el LLM, antes y después del empaquetado del
+# contexto: antes se enviaban los TOP_K fragmentos de la búsqueda híbrida tal
+# cual (con el texto que comparten los vecinos repetido); ahora se eligen con
+# MMR entre CONTEXT_CANDIDATES, se unen los vecinos y se corta en
+# MAX_TOKENS_CONTEXT. Corpus: los artículos de data/docs (o artículos falsos
+# si no hay), con embeddings falsos; preguntas armadas con frases del corpus.
+#
+# Uso:  python -m benchmarks.bench_context [n_preguntas]
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+
+from src.config import DOCS_DIR, TOP_K, CONTEXT_CANDIDATES, MAX_TOKENS_CONTEXT
+from src.chunker import chunk_text, count_tokens
+from src.chunk_store import ChunkStore
+from src.context_packing import pack_context
+from src.fake_upstream import fake_embedding, fake_article
+from src.retrieval_store import RetrievalStore
+from src.segment_index import SegmentedIndex
+from src.utils import build_rag_payload, extract_article_text
+
+
+def load_texts():
+    if os.path.isdir(DOCS_DIR):
+        texts = [open(os.path.join(DOCS_DIR, f), encoding="utf-8").read()
+                 for f in sorted(os.listdir(DOCS_DIR)) if f.endswith(".txt")]
+        if texts:
+            return texts
+    return [extract_article_text(fake_article(f"Topic {i}")) for i in range(5)]
+
+
+def prompt_tokens(context, question):
+    return count_tokens(build_rag_payload(context, question)["messages"][1]["content"])
+
+
+def main():
+    n_questions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    tmpdir = tempfile.mkdtemp()
+    try:
+        index = SegmentedIndex(os.path.join(tmpdir, "index"), legacy_path=None)
+        chunks = ChunkStore(os.path.join(tmpdir, "chunks.sqlite3"))
+        records = []
+        for d, text in enumerate(load_texts()):
+            records += [{"doc_id": f"doc{d}", "chunk_id": i, "text": c.text, "start": c.start, "end": c.end}
+                        for i, c in enumerate(chunk_text(text))]
+        index.append(np.array([fake_embedding(r["text"]) for r in records], dtype="float32"))
+        chunks.append(0, records)
+        snap = RetrievalStore(index, chunks).snapshot()
+        print(f"Corpus: {len(records)} fragmentos; TOP_K={TOP_K}, candidatos={CONTEXT_CANDIDATES}, "
+              f"presupuesto={MAX_TOKENS_CONTEXT} tokens\n")
+
+        rng = np.random.default_rng(0)
+        before, after, merged, pack_ms = [], [], [], []
+        for _ in range(n_questions):
+            words = records[rng.integers(len(records))]["text"].split()
+            lo = rng.integers(max(1, len(words) - 6))
+            question = " ".join(words[lo:lo + 6]) + "?"
+            vec = np.array([fake_embedding(question)], dtype="float32")
+
+            top = snap.lookup(snap.hybrid_search(vec, question, TOP_K))
+            before.append(prompt_tokens([c["text"] for c in top], question))
+
+            found = snap.lookup(snap.hybrid_search(vec, question, max(TOP_K, CONTEXT_CANDIDATES)))
+            t0 = time.perf_counter()
+            chosen, context = pack_context(found, snap.vectors([c["id"] for c in found]))
+            pack_ms.append((time.perf_counter() - t0) * 1000)
+            after.append(prompt_tokens(context, question))
+            merged.append(len(chosen) - len(context))
+
+        print(f"{'':>28} | {'media':>7} | {'p50':>7} | {'máx':>7}")
+        for label, values in (("tokens del prompt (antes)", before), ("tokens del prompt (ahora)", after)):
+            print(f"{label:>28} | {np.mean(values):>7.1f} | {np.median(values):>7.0f} | {np.max(values):>7.0f}")
+        print(f"\nReducción media: {(1 - np.mean(after) / np.mean(before)) * 100:.1f}%  |  "
+              f"fragmentos unidos con un vecino por pregunta: {np.mean(merged):.2f}  |  "
+              f"empaquetar: {np.mean(pack_ms):.2f} ms")
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
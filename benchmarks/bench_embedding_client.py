@@ -0,0 +1,52 @@
+# benchmarks/bench_embedding_client.py
+#
+# Throughput de embeddings contra un servidor local que simula /api/embed:
+#   - un requests.post por fragmento, en serie (comportamiento anterior)
+#   - EmbeddingClient: lotes + conexiones keep-alive + concurrencia acotada
+#
+# Uso:  python -m benchmarks.bench_embedding_client [n_chunks] [latencia_ms]
+
+import sys
+import time
+import requests
+
+from src.config import EMBED_MODEL
+from src.embedding_client import EmbeddingClient
+from src.fake_upstream import start_fake_upstream
+
+
+def serial_per_chunk(endpoint, texts):
+    for t in texts:
+        resp = requests.post(endpoint, json={"model": EMBED_MODEL, "input": t}, timeout=30)
+        resp.raise_for_status()
+        resp.json()["embeddings"][0]
+
+
+def main(n_chunks: int, latency_ms: float):
+    server, base_url = start_fake_upstream(latency=latency_ms / 1000, per_item_latency=0.0002)
+    endpoint = f"{base_url}/api/embed"
+    texts = [f"fragmento de prueba número {i}" for i in range(n_chunks)]
+
+    t0 = time.perf_counter()
+    serial_per_chunk(endpoint, texts)
+    serial = time.perf_counter() - t0
+
+    client = EmbeddingClient(endpoint=endpoint)
+    t0 = time.perf_counter()
+    vecs = client.embed(texts)
+    batched = time.perf_counter() - t0
+    assert vecs.shape[0] == n_chunks
+    client.close()
+    server.shutdown()
+
+    print(f"{n_chunks} fragmentos, latencia simulada {latency_ms:.0f} ms por request")
+    print(f"  serie, 1 POST/fragmento : {serial:6.2f}s  ({n_chunks / serial:8.1f} chunks/s)")
+    print(f"  EmbeddingClient         : {batched:6.2f}s  ({n_chunks / batched:8.1f} chunks/s)"
+          f"  batch={client.batch_size} concurrencia={client.max_concurrency}")
+    print(f"  speedup                 : {serial / batched:6.1f}x")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    main(n, latency)
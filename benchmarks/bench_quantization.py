@@ -0,0 +1,90 @@
+# benchmarks/bench_quantization.py
+#
+# Memoria por chunk y pérdida de recall del segmento base comprimido
+# (INDEX_QUANTIZATION = sq8 / fp16 / pq) frente al IndexFlatL2 actual, sin
+# y con re-ranking exacto desde los vectores en disco. Embeddings sintéticos
+# normalizados y agrupados (como los de un corpus real, no ruido uniforme).
+#
+# Uso:  python -m benchmarks.bench_quantization [n_vectores] [tipo_indice]
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+
+from src.config import VECTOR_DIM, TOP_K, RERANK_FACTOR
+from src.segment_index import SegmentedIndex
+from src.quantize_index import index_memory
+
+N_QUERIES = 200
+N_CLUSTERS = 500
+INTRINSIC_DIM = 64   # los embeddings reales viven cerca de un subespacio de pocas dimensiones
+
+
+def synthetic_embeddings(n: int, seed: int = 0) -> np.ndarray:
+    fixed = np.random.default_rng(42)
+    centers = fixed.standard_normal((N_CLUSTERS, VECTOR_DIM)).astype("float32")
+    basis = fixed.standard_normal((INTRINSIC_DIM, VECTOR_DIM)).astype("float32") / np.sqrt(INTRINSIC_DIM)
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((n, INTRINSIC_DIM)).astype("float32") @ basis
+    x = centers[rng.integers(0, N_CLUSTERS, n)] + noise
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, truth)]))
+
+
+def timed_search(view, q: np.ndarray):
+    samples = []
+    for row in q:
+        t0 = time.perf_counter()
+        view.search(row[None, :], TOP_K)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(samples, 50)
+
+
+def main(n: int, index_type: str):
+    data = synthetic_embeddings(n)
+    q = synthetic_embeddings(N_QUERIES, seed=1)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print(f"{n} vectores de {VECTOR_DIM} dims, índice {index_type}, top-{TOP_K}, re-rank x{RERANK_FACTOR}")
+        print(f"{'modo':>6} | {'RAM B/chunk':>11} {'mapeado':>7} {'disco':>7} | "
+              f"{'recall':>7} {'p50':>7} | {'+rerank':>7} {'p50':>7}")
+        truth = None
+        for quantization in ("none", "fp16", "sq8", "pq"):
+            directory = os.path.join(tmpdir, quantization)
+            seg = SegmentedIndex(directory, legacy_path=None, index_type=index_type,
+                                 quantization=quantization, rerank=RERANK_FACTOR)
+            for lo in range(0, n, 50_000):
+                seg.append(data[lo:lo + 50_000])
+            seg.compact(wait=True)
+            mem = index_memory(seg)
+            view = seg.open_view()
+
+            view.rerank = 0
+            _, I = view.search(q, TOP_K)
+            if truth is None:
+                truth = I  # "none" + flat: resultado exacto de referencia
+            plain = recall(I, truth), timed_search(view, q)
+            if quantization == "none":
+                reranked = plain
+            else:
+                view.rerank = RERANK_FACTOR
+                reranked = recall(view.search(q, TOP_K)[1], truth), timed_search(view, q)
+            print(f"{quantization:>6} | {mem['ram_per_vector']:>11.0f} {mem['mapped_per_vector']:>7.0f} "
+                  f"{mem['disk_per_vector']:>7.0f} | "
+                  f"{plain[0]:>7.3f} {plain[1]:>5.2f}ms | {reranked[0]:>7.3f} {reranked[1]:>5.2f}ms")
+            del view, seg
+            shutil.rmtree(directory)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    index_type = sys.argv[2] if len(sys.argv) > 2 else "flat"
+    main(n, index_type)
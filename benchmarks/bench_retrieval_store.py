@@ -0,0 +1,84 @@
+# benchmarks/bench_retrieval_store.py
+#
+# Compara la latencia de /query (sin embedding ni LLM) entre:
+#   - recargar índice + metadatos.json desde disco en cada request (comportamiento anterior)
+#   - servir desde el RetrievalStore residente en memoria + chunk store
+#
+# Uso:  python -m benchmarks.bench_retrieval_store [n_chunks ...]
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import faiss
+import numpy as np
+
+from src.config import VECTOR_DIM, TOP_K
+from src.chunk_store import ChunkStore
+from src.retrieval_store import RetrievalStore
+from src.segment_index import SegmentedIndex
+
+
+def build_corpus(tmpdir: str, n_chunks: int):
+    index_path = os.path.join(tmpdir, "bench.index")
+    meta_path = os.path.join(tmpdir, "bench_meta.json")
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(VECTOR_DIM)
+    index.add(rng.random((n_chunks, VECTOR_DIM), dtype="float32"))
+    faiss.write_index(index, index_path)
+    metadata = [
+        {"doc_id": f"doc-{i // 50}", "chunk_id": i % 50, "text": "lorem ipsum dolor sit amet " * 4}
+        for i in range(n_chunks)
+    ]
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    chunks = ChunkStore(os.path.join(tmpdir, "bench_chunks.sqlite3"))
+    chunks.append(0, metadata)
+    return index_path, meta_path, chunks
+
+
+def per_request_reload(index_path, meta_path, q):
+    index = faiss.read_index(index_path)
+    with open(meta_path, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    _, ids = index.search(q, TOP_K)
+    return [metadata[i]["text"] for i in ids[0] if i < len(metadata)]
+
+
+def resident(store, q):
+    snap = store.snapshot()
+    _, ids = snap.index.search(q, TOP_K)
+    return [c["text"] for c in snap.lookup(ids[0])]
+
+
+def timeit(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def main(sizes):
+    q = np.random.default_rng(1).random((1, VECTOR_DIM), dtype="float32")
+    print(f"{'chunks':>8} | {'reload p50':>10} {'p99':>8} | {'store p50':>10} {'p99':>8} | speedup")
+    for n in sizes:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            index_path, meta_path, chunks = build_corpus(tmpdir, n)
+            segmented = SegmentedIndex(os.path.join(tmpdir, "index"), legacy_path=index_path)
+            store = RetrievalStore(segmented, chunks)
+            store.warm()
+            r50, r99 = timeit(lambda: per_request_reload(index_path, meta_path, q), 20)
+            s50, s99 = timeit(lambda: resident(store, q), 200)
+            print(f"{n:>8} | {r50:>8.2f}ms {r99:>6.2f}ms | {s50:>8.2f}ms {s99:>6.2f}ms | {r50 / s50:>6.1f}x")
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 50_000]
+    main(sizes)
@@ -0,0 +1,66 @@
+# benchmarks/bench_scoped_search.py
+#
+# Compara la latencia de búsqueda global (todo el índice) contra la búsqueda
+# limitada a un artículo (doc_id), incluyendo la consulta de ids al chunk store.
+#
+# Uso:  python -m benchmarks.bench_scoped_search [n_chunks ...]
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+
+from src.config import VECTOR_DIM, TOP_K
+from src.chunk_store import ChunkStore
+from src.retrieval_store import RetrievalStore
+from src.segment_index import SegmentedIndex
+
+CHUNKS_PER_DOC = 60   # un artículo típico de Wikipedia con CHUNK_SIZE=100
+DOCS_PER_APPEND = 50  # simula uploads sucesivos → varios segmentos
+
+
+def build_corpus(tmpdir: str, n_chunks: int) -> RetrievalStore:
+    rng = np.random.default_rng(0)
+    segmented = SegmentedIndex(os.path.join(tmpdir, "index"), legacy_path=None, compact_max_segments=10**6)
+    chunks = ChunkStore(os.path.join(tmpdir, "chunks.sqlite3"))
+    step = CHUNKS_PER_DOC * DOCS_PER_APPEND
+    for lo in range(0, n_chunks, step):
+        n = min(step, n_chunks - lo)
+        start = segmented.append(rng.random((n, VECTOR_DIM), dtype="float32"))
+        chunks.append(start, [
+            {"doc_id": f"doc-{(lo + i) // CHUNKS_PER_DOC}", "chunk_id": (lo + i) % CHUNKS_PER_DOC, "text": "x"}
+            for i in range(n)
+        ])
+    segmented.compact(wait=True)
+    return RetrievalStore(segmented, chunks)
+
+
+def timeit(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def main(sizes):
+    q = np.random.default_rng(1).random((1, VECTOR_DIM), dtype="float32")
+    print(f"{'chunks':>8} | {'global p50':>10} {'p99':>8} | {'doc p50':>10} {'p99':>8} | speedup")
+    for n in sizes:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            snap = build_corpus(tmpdir, n).snapshot()
+            doc = f"doc-{(n // CHUNKS_PER_DOC) // 2}"
+            g50, g99 = timeit(lambda: snap.search(q, TOP_K), 50)
+            d50, d99 = timeit(lambda: snap.search(q, TOP_K, [doc]), 200)
+            print(f"{n:>8} | {g50:>8.2f}ms {g99:>6.2f}ms | {d50:>8.2f}ms {d99:>6.2f}ms | {g50 / d50:>6.1f}x")
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 200_000]
+    main(sizes)
@@ -0,0 +1,139 @@
+# benchmarks/bench_startup.py
+#
+# Arranque en frío (scale-to-zero): tiempo de importar src.api_server en un
+# intérprete nuevo y, con el servidor levantado en un proceso nuevo, tiempo
+# hasta aceptar conexiones, hasta que /ready responde 200 y hasta la primera
+# /query respondida. El índice tiene N vectores (IVF desde ANN_MIN_VECTORS),
+# leído con y sin IO_FLAG_MMAP.
+#
+# Uso:  python -m benchmarks.bench_startup [n_vectores] [repeticiones]
+
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import subprocess
+import multiprocessing as mp
+
+API_PORT, UPSTREAM_PORT = 8770, 8771
+
+IMPORT_SNIPPET = """
+import sys, time
+t0 = time.perf_counter()
+import src.api_server
+print((time.perf_counter() - t0) * 1000, int("bs4" in sys.modules), int("langchain" in sys.modules))
+"""
+
+
+def build_index(tmpdir: str, n: int):
+    import numpy as np
+    from src.segment_index import SegmentedIndex
+    from src.chunk_store import ChunkStore
+    from src.fake_upstream import fake_embedding
+    from src.config import VECTOR_DIM
+
+    seg = SegmentedIndex(os.path.join(tmpdir, "index"), legacy_path=None)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, VECTOR_DIM)).astype("float32")
+    vectors[0] = fake_embedding("apple fact")
+    for lo in range(0, n, 10_000):
+        seg.append(vectors[lo:lo + 10_000])
+    seg.compact(wait=True)
+    ChunkStore(os.path.join(tmpdir, "chunks.sqlite3")).append(
+        0, [{"doc_id": f"d{i // 50}", "chunk_id": i % 50, "text": f"apple fact {i}"} for i in range(n)]
+    )
+
+
+def serve_fake_upstream(port: int):
+    from src.fake_upstream import FakeUpstreamServer
+    FakeUpstreamServer(port=port, latency=0.0).serve_forever()
+
+
+def serve_api(port: int, upstream_url: str, tmpdir: str, mmap: bool):
+    # Proceso "spawn": parte sin nada importado, como una máquina recién encendida
+    from src import config
+    config.EMBED_ENDPOINT = f"{upstream_url}/api/embed"
+    config.CHAT_ENDPOINT = f"{upstream_url}/v1/chat/completions"
+    config.EMBED_CACHE_ENABLED = False
+    config.INDEX_DIR = os.path.join(tmpdir, "index")
+    config.INDEX_MMAP = mmap
+    config.FAISS_INDEX_PATH = os.path.join(tmpdir, "none.index")
+    config.CHUNK_STORE_PATH = os.path.join(tmpdir, "chunks.sqlite3")
+    config.METADATA_PATH = os.path.join(tmpdir, "none.json")
+    config.JOBS_DB_PATH = os.path.join(tmpdir, "jobs.sqlite3")
+    import uvicorn
+    from src.api_server import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def wait_for_port(port: int, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.05).close()
+            return
+        except OSError:
+            time.sleep(0.005)
+    raise RuntimeError(f"port {port} never opened")
+
+
+def measure_import(repeats: int):
+    samples, flags = [], None
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, check=True)
+        ms, bs4, langchain = out.stdout.split()[-3:]
+        samples.append(float(ms))
+        flags = (bs4 == "1", langchain == "1")
+    return sorted(samples)[len(samples) // 2], flags
+
+
+def measure_cold_start(tmpdir: str, mmap: bool):
+    import httpx
+    ctx = mp.get_context("spawn")
+    t0 = time.perf_counter()
+    proc = ctx.Process(target=serve_api, args=(API_PORT, f"http://127.0.0.1:{UPSTREAM_PORT}", tmpdir, mmap), daemon=True)
+    proc.start()
+    try:
+        wait_for_port(API_PORT)
+        listening = time.perf_counter() - t0
+        base = f"http://127.0.0.1:{API_PORT}"
+        with httpx.Client(timeout=60) as client:
+            while client.get(base + "/ready").status_code != 200:
+                time.sleep(0.005)
+            ready = time.perf_counter() - t0
+            client.post(base + "/query", json={"question": "apple fact"}).raise_for_status()
+            first = time.perf_counter() - t0
+        return listening * 1000, ready * 1000, first * 1000
+    finally:
+        proc.terminate()
+        proc.join()
+
+
+def main(n: int, repeats: int):
+    tmpdir = tempfile.mkdtemp()
+    upstream = mp.Process(target=serve_fake_upstream, args=(UPSTREAM_PORT,), daemon=True)
+    upstream.start()
+    try:
+        import_ms, (bs4, langchain) = measure_import(repeats)
+        print(f"import src.api_server: {import_ms:.0f} ms (mediana de {repeats}); "
+              f"bs4 importado: {bs4}, langchain importado: {langchain}")
+
+        build_index(tmpdir, n)
+        wait_for_port(UPSTREAM_PORT)
+        print(f"\nÍndice de {n} vectores; tiempos desde que parte el proceso")
+        print(f"{'lectura':>8} | {'escuchando':>10} | {'/ready':>8} | {'1a /query':>9}")
+        for mmap in (False, True):
+            runs = sorted(measure_cold_start(tmpdir, mmap) for _ in range(repeats))
+            listening, ready, first = runs[len(runs) // 2]
+            print(f"{'mmap' if mmap else 'read':>8} | {listening:>8.0f}ms | {ready:>6.0f}ms | {first:>7.0f}ms")
+    finally:
+        upstream.terminate()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    main(n, repeats)
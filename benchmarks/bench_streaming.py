@@ -0,0 +1,76 @@
+# benchmarks/bench_streaming.py
+#
+# Tiempo hasta el primer byte (TTFB) y tiempo total de /query contra
+# /query/stream, con un LLM falso que tarda `latencia` en empezar y
+# `ms_por_token` por cada token de una respuesta de ~N tokens.
+#
+# Uso:  python -m benchmarks.bench_streaming [latencia_ms] [ms_por_token] [tokens] [requests]
+
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+import multiprocessing as mp
+import httpx
+import numpy as np
+
+from benchmarks.load_test_async import serve_api, wait_for_port
+
+
+def serve_fake_llm(port: int, latency: float, token_latency: float, n_tokens: int):
+    from src.fake_upstream import FakeUpstreamServer
+    answer = " ".join(f"token{i}" for i in range(n_tokens))
+    FakeUpstreamServer(port=port, latency=latency, token_latency=token_latency, answer=answer).serve_forever()
+
+
+async def measure(url: str, n: int, tag: str):
+    ttfb, total = [], []
+    async with httpx.AsyncClient(timeout=120) as client:
+        for i in range(n):
+            t0 = time.perf_counter()
+            # Preguntas distintas para no pegarle a la caché de respuestas
+            async with client.stream("POST", url, json={"question": f"apple fact {tag} {i}"}) as resp:
+                resp.raise_for_status()
+                first = None
+                async for chunk in resp.aiter_bytes():
+                    if first is None and chunk:
+                        first = time.perf_counter() - t0
+            ttfb.append(first * 1000)
+            total.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(ttfb, 50), np.percentile(ttfb, 99), np.percentile(total, 50)
+
+
+def main(latency_ms: float, token_ms: float, n_tokens: int, n: int):
+    upstream_port, api_port = 8768, 8767
+    tmpdir = tempfile.mkdtemp()
+    procs = [
+        mp.Process(target=serve_fake_llm, daemon=True,
+                   args=(upstream_port, latency_ms / 1000, token_ms / 1000, n_tokens)),
+        mp.Process(target=serve_api, args=(api_port, f"http://127.0.0.1:{upstream_port}", tmpdir),
+                   daemon=True),
+    ]
+    for p in procs:
+        p.start()
+    try:
+        wait_for_port(upstream_port)
+        wait_for_port(api_port)
+        base = f"http://127.0.0.1:{api_port}"
+        print(f"LLM falso: {latency_ms:.0f} ms hasta el primer token + {token_ms:.0f} ms x {n_tokens} tokens")
+        print(f"{'endpoint':>14} | {'TTFB p50':>9} {'p99':>8} | {'total p50':>9}")
+        for path in ("/query", "/query/stream"):
+            t50, t99, tot = asyncio.run(measure(base + path, n, path))
+            print(f"{path:>14} | {t50:>7.0f}ms {t99:>6.0f}ms | {tot:>7.0f}ms")
+    finally:
+        for p in procs:
+            p.terminate()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    args = [float(a) for a in sys.argv[1:]]
+    latency = args[0] if len(args) > 0 else 200.0
+    token_ms = args[1] if len(args) > 1 else 20.0
+    n_tokens = int(args[2]) if len(args) > 2 else 100
+    n = int(args[3]) if len(args) > 3 else 10
+    main(latency, token_ms, n_tokens, n)
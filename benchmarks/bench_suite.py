@@ -0,0 +1,269 @@
+# benchmarks/bench_suite.py
+#
+# Suite de rendimiento sin red, contra los servicios falsos (RAG_UPSTREAM=fake,
+# que también sirven los artículos en /wiki/<título>). Para cada tamaño de
+# corpus, en un proceso nuevo y con datos en un directorio temporal, mide:
+#   - build:   agregar N vectores (aleatorios) + textos al índice segmentado y compactarlo
+#   - query:   p50/p99 y QPS de /query en serie (embedding + búsqueda híbrida + LLM falsos)
+#   - upload:  artículos y fragmentos por segundo por la cola de ingesta (scrape → embed → index)
+#   - memoria: RSS tras el build y máximo del proceso
+# Escribe una línea JSON por tamaño (stdout y --output) con el commit y la
+# configuración; con --baseline compara contra una corrida anterior y sale
+# con código 1 si alguna métrica empeoró más que --tolerance.
+#
+# Uso:  python -m benchmarks.bench_suite [--sizes 1000,10000,100000,1000000] [--queries 200]
+#           [--uploads 20] [--latency-ms 0] [--output resultados.jsonl]
+#           [--baseline anterior.jsonl] [--tolerance 0.2]
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+import multiprocessing as mp
+
+from datetime import datetime, timezone
+from typing import Dict, List
+
+# Métricas donde más es mejor; en el resto (segundos, ms, MB) menos es mejor
+HIGHER_IS_BETTER = {"build_vectors_per_s", "query_qps", "upload_docs_per_s", "upload_chunks_per_s"}
+COMPARED = ["build_s", "build_vectors_per_s", "query_p50_ms", "query_p99_ms", "query_qps",
+            "upload_docs_per_s", "upload_chunks_per_s", "rss_after_build_mb", "peak_rss_mb"]
+
+WORDS = ("river mountain history city science music language empire species energy "
+         "market island theory festival railway climate village protein galaxy harbor").split()
+
+
+def serve_fake_upstream(port: int, latency: float):
+    from src.fake_upstream import FakeUpstreamServer
+    FakeUpstreamServer(port=port, latency=latency).serve_forever()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.05).close()
+            return
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError(f"port {port} never opened")
+
+
+def rss_mb(peak: bool = False) -> float:
+    if peak:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KB
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def dir_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files) / 2 ** 20
+
+
+def prepare_environment(port: int, tmpdir: str):
+    """Fake upstreams and temp paths, set before anything from src reads the config."""
+    os.environ["RAG_UPSTREAM"] = "fake"
+    os.environ["RAG_FAKE_UPSTREAM_PORT"] = str(port)
+    from src import config
+    config.INDEX_DIR = os.path.join(tmpdir, "index")
+    config.FAISS_INDEX_PATH = os.path.join(tmpdir, "none.index")
+    config.METADATA_PATH = os.path.join(tmpdir, "none.json")
+    config.CHUNK_STORE_PATH = os.path.join(tmpdir, "chunks.sqlite3")
+    config.JOBS_DB_PATH = os.path.join(tmpdir, "jobs.sqlite3")
+    config.DOCS_DIR = os.path.join(tmpdir, "docs")
+    config.HTML_CACHE_ENABLED = False
+    config.SCRAPE_HOST_INTERVAL = 0.0
+    # Cada /query debe recorrer todo el camino, no salir de la caché
+    config.ANSWER_CACHE_ENABLED = False
+
+
+def build(n: int) -> Dict:
+    import numpy as np
+    from src.config import VECTOR_DIM, BUILD_FLUSH_EVERY
+    from src.segment_index import segmented_index
+    from src.chunk_store import chunk_store
+
+    rng = np.random.default_rng(0)
+    sentences = [" ".join(rng.choice(WORDS, 12)) for _ in range(1000)]
+    t0 = time.perf_counter()
+    for lo in range(0, n, BUILD_FLUSH_EVERY):
+        hi = min(n, lo + BUILD_FLUSH_EVERY)
+        vectors = rng.standard_normal((hi - lo, VECTOR_DIM)).astype("float32")
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        start = segmented_index.append(vectors)
+        chunk_store.append(start, [
+            {"doc_id": f"bench-{i // 50}", "chunk_id": i % 50, "text": f"{sentences[i % 1000]} item {i}"}
+            for i in range(lo, hi)
+        ])
+    segmented_index.compact(wait=True)
+    elapsed = time.perf_counter() - t0
+    return {"build_s": round(elapsed, 3), "build_vectors_per_s": round(n / elapsed, 1)}
+
+
+async def query_and_upload(n_queries: int, n_uploads: int, upstream_url: str) -> Dict:
+    import httpx
+    import numpy as np
+    from src.api_server import app
+    from src.async_upstream import upstreams
+    from src.bulk_ingest import ingest_urls
+    from src.jobs import DONE
+
+    out = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        # Calentamiento: carga el índice y abre las conexiones
+        for i in range(3):
+            (await client.post("/query", json={"question": f"warm {i}"})).raise_for_status()
+        latencies = []
+        t0 = time.perf_counter()
+        for i in range(n_queries):
+            question = f"{WORDS[i % len(WORDS)]} {WORDS[(i * 7) % len(WORDS)]} number {i}?"
+            t = time.perf_counter()
+            (await client.post("/query", json={"question": question})).raise_for_status()
+            latencies.append((time.perf_counter() - t) * 1000)
+        total = time.perf_counter() - t0
+    out.update(query_p50_ms=round(float(np.percentile(latencies, 50)), 2),
+               query_p99_ms=round(float(np.percentile(latencies, 99)), 2),
+               query_qps=round(n_queries / total, 1))
+
+    if n_uploads:
+        urls = [f"{upstream_url}/wiki/Bench_article_{i}" for i in range(n_uploads)]
+        t0 = time.perf_counter()
+        jobs = await ingest_urls(urls)
+        elapsed = time.perf_counter() - t0
+        done = [j for j in jobs if j["status"] == DONE]
+        if len(done) != len(jobs):
+            raise RuntimeError(f"{len(jobs) - len(done)} uploads failed: {jobs[0]['error']}")
+        out.update(upload_docs_per_s=round(len(done) / elapsed, 2),
+                   upload_chunks_per_s=round(sum(j["chunks_indexed"] for j in done) / elapsed, 1))
+    await upstreams.aclose()
+    return out
+
+
+def run_size(n: int, args, port: int, results) -> None:
+    # Proceso "spawn": parte sin nada importado, así la memoria medida es solo de este tamaño
+    tmpdir = tempfile.mkdtemp(prefix=f"bench_suite_{n}_")
+    try:
+        prepare_environment(port, tmpdir)
+        row = {"size": n, **build(n)}
+        from src.config import INDEX_DIR
+        row["index_mb"] = round(dir_mb(INDEX_DIR), 1)
+        row["rss_after_build_mb"] = round(rss_mb(), 1)
+        row.update(asyncio.run(query_and_upload(args.queries, args.uploads, f"http://127.0.0.1:{port}")))
+        row["peak_rss_mb"] = round(rss_mb(peak=True), 1)
+
+        from src.metrics import STAGE_SECONDS
+        row["stages_mean_ms"] = {
+            stage: round(STAGE_SECONDS.sum(stage=stage) / STAGE_SECONDS.count(stage=stage) * 1000, 3)
+            for (stage,) in STAGE_SECONDS.series()
+        }
+        results.put(row)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def run_info(args) -> Dict:
+    from src import config
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "suite": "bench_suite",
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "settings": {
+            "index_type": config.INDEX_TYPE,
+            "quantization": config.INDEX_QUANTIZATION,
+            "upstream_latency_ms": args.latency_ms,
+            "queries": args.queries,
+            "uploads": args.uploads,
+        },
+    }
+
+
+def compare(rows: List[Dict], path: str, tolerance: float) -> List[str]:
+    """Metrics of `rows` that got worse than the same size in `path` by more than `tolerance`."""
+    with open(path, encoding="utf-8") as f:
+        baseline = {r["size"]: r for r in map(json.loads, filter(str.strip, f))}
+    regressions = []
+    for row in rows:
+        old = baseline.get(row["size"])
+        if old is None:
+            continue
+        for metric in COMPARED:
+            if not old.get(metric) or row.get(metric) is None:
+                continue
+            ratio = row[metric] / old[metric]
+            worse = ratio < 1 - tolerance if metric in HIGHER_IS_BETTER else ratio > 1 + tolerance
+            if worse:
+                regressions.append(f"{row['size']:>9} {metric:>20}: {old[metric]} → {row[metric]} ({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline performance suite (fake embedding/chat upstreams).")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="corpus sizes, in chunks")
+    parser.add_argument("--queries", type=int, default=200, help="/query requests per size")
+    parser.add_argument("--uploads", type=int, default=20, help="articles ingested per size (0 = skip)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake upstream latency per request")
+    parser.add_argument("--output", help="append one JSON line per size to this file")
+    parser.add_argument("--baseline", help="JSON lines of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    port = free_port()
+    ctx = mp.get_context("spawn")
+    upstream = ctx.Process(target=serve_fake_upstream, args=(port, args.latency_ms / 1000), daemon=True)
+    upstream.start()
+    wait_for_port(port)
+
+    info = run_info(args)
+    rows = []
+    print(f"{'chunks':>9} | {'build s':>8} | {'idx MB':>7} | {'p50 ms':>7} | {'p99 ms':>7} | "
+          f"{'qps':>6} | {'docs/s':>6} | {'chunks/s':>8} | {'RSS MB':>7}", file=sys.stderr)
+    try:
+        for n in sizes:
+            results = ctx.Queue()
+            proc = ctx.Process(target=run_size, args=(n, args, port, results))
+            proc.start()
+            proc.join()
+            if proc.exitcode != 0:
+                sys.exit(f"size {n} failed (exit code {proc.exitcode})")
+            row = {**info, **results.get()}
+            rows.append(row)
+            print(f"{n:>9} | {row['build_s']:>8.2f} | {row['index_mb']:>7.1f} | {row['query_p50_ms']:>7.2f} | "
+                  f"{row['query_p99_ms']:>7.2f} | {row['query_qps']:>6.1f} | {row.get('upload_docs_per_s', 0):>6.2f} | "
+                  f"{row.get('upload_chunks_per_s', 0):>8.1f} | {row['peak_rss_mb']:>7.1f}", file=sys.stderr)
+            line = json.dumps(row, ensure_ascii=False)
+            print(line)
+            if args.output:
+                with open(args.output, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+    finally:
+        upstream.terminate()
+
+    if args.baseline:
+        regressions = compare(rows, args.baseline, args.tolerance)
+        for r in regressions:
+            print(f"[Regresión] {r}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# benchmarks/bench_workers.py
+#
+# Throughput de /query según la cantidad de workers de uvicorn (--workers),
+# todos sobre el mismo índice (base flat leído desde un .npy mapeado) y el
+# mismo chunk store, contra servicios falsos (RAG_UPSTREAM=fake) sin latencia.
+# Por cada cantidad de workers: QPS, p50/p99 con `concurrencia` clientes y la
+# memoria de los workers: RSS sumado y PSS sumado (las páginas compartidas se
+# reparten entre procesos, así que PSS ≈ lo que de verdad ocupan juntos).
+# El cliente corre en esta misma máquina: con pocos núcleos compite con los
+# workers, y el escalado solo se ve hasta (núcleos - 1) workers.
+#
+# Uso:  python -m benchmarks.bench_workers [n_vectores] [workers,...] [segundos] [concurrencia]
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+import subprocess
+import multiprocessing as mp
+import numpy as np
+
+API_PORT, UPSTREAM_PORT = 8780, 8781
+# Vocabulario sintético: cada palabra aparece en ~n·12/5000 fragmentos, como términos poco frecuentes de un corpus real
+VOCABULARY = [f"w{i}" for i in range(5000)]
+
+
+def build_index(tmpdir: str, n: int):
+    from src.segment_index import SegmentedIndex
+    from src.chunk_store import ChunkStore
+    from src.config import VECTOR_DIM
+
+    seg = SegmentedIndex(os.path.join(tmpdir, "index"), legacy_path=None)
+    rng = np.random.default_rng(0)
+    for lo in range(0, n, 10_000):
+        vectors = rng.standard_normal((min(10_000, n - lo), VECTOR_DIM)).astype("float32")
+        seg.append(vectors / np.linalg.norm(vectors, axis=1, keepdims=True))
+    seg.compact(wait=True)
+    ChunkStore(os.path.join(tmpdir, "chunks.sqlite3")).append(
+        0, [{"doc_id": f"d{i // 50}", "chunk_id": i % 50, "text": " ".join(rng.choice(VOCABULARY, 12))}
+            for i in range(n)]
+    )
+
+
+def serve_fake_upstream(port: int):
+    from src.fake_upstream import FakeUpstreamServer
+    FakeUpstreamServer(port=port).serve_forever()
+
+
+def worker_pids(parent: int):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == parent:
+                        pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return pids
+
+
+def memory_mb(pids):
+    """(sum of RSS, sum of PSS) of `pids`, in MB."""
+    rss = pss = 0
+    for pid in pids:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    rss += int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    pss += int(line.split()[1])
+    return rss / 1024, pss / 1024
+
+
+async def load(base: str, seconds: float, concurrency: int):
+    import httpx
+    latencies = []
+    rng = np.random.default_rng()
+    deadline = time.perf_counter() + seconds
+
+    async def client_loop(client):
+        while time.perf_counter() < deadline:
+            # Preguntas distintas: ninguna sale de la caché de respuestas
+            t = time.perf_counter()
+            resp = await client.post("/query", json={"question": " ".join(rng.choice(VOCABULARY, 3)) + "?"})
+            resp.raise_for_status()
+            latencies.append((time.perf_counter() - t) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    return len(latencies) / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def measure(tmpdir: str, workers: int, seconds: float, concurrency: int):
+    import httpx
+    env = {**os.environ, "RAG_UPSTREAM": "fake", "RAG_FAKE_UPSTREAM_PORT": str(UPSTREAM_PORT),
+           "RAG_EMBEDDINGS_DIR": tmpdir}
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "src.api_server:app", "--host", "127.0.0.1",
+                             "--port", str(API_PORT), "--workers", str(workers), "--log-level", "warning"],
+                            env=env, stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{API_PORT}"
+    try:
+        deadline = time.time() + 120
+        while time.time() < deadline:
+            try:
+                if httpx.get(base + "/ready").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+        # Calentamiento: cada worker carga el índice y abre sus conexiones
+        asyncio.run(load(base, 2.0, concurrency))
+        qps, p50, p99 = asyncio.run(load(base, seconds, concurrency))
+        # Con un solo worker uvicorn atiende en el mismo proceso
+        rss, pss = memory_mb(worker_pids(proc.pid) or [proc.pid])
+        return qps, p50, p99, rss, pss
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(n: int, worker_counts, seconds: float, concurrency: int):
+    tmpdir = tempfile.mkdtemp()
+    upstream = mp.get_context("spawn").Process(target=serve_fake_upstream, args=(UPSTREAM_PORT,), daemon=True)
+    upstream.start()
+    try:
+        build_index(tmpdir, n)
+        print(f"Índice de {n} vectores, {concurrency} clientes, {seconds:.0f} s por medición, "
+              f"{os.cpu_count()} núcleos\n")
+        print(f"{'workers':>7} | {'QPS':>7} | {'p50 ms':>7} | {'p99 ms':>7} | {'RSS MB':>7} | {'PSS MB':>7}")
+        for workers in worker_counts:
+            qps, p50, p99, rss, pss = measure(tmpdir, workers, seconds, concurrency)
+            print(f"{workers:>7} | {qps:>7.1f} | {p50:>7.1f} | {p99:>7.1f} | {rss:>7.0f} | {pss:>7.0f}")
+    finally:
+        upstream.terminate()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 40_000
+    worker_counts = [int(w) for w in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 2, 4]
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+    concurrency = int(sys.argv[4]) if len(sys.argv) > 4 else 32
+    main(n, worker_counts, seconds, concurrency)
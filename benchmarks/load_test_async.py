@@ -0,0 +1,155 @@
+# benchmarks/load_test_async.py
+#
+# Load test de /query contra servicios de embedding y chat falsos con latencia fija.
+# Compara el handler async actual con una réplica del handler sync anterior
+# (`def` + requests.post bloqueante en el threadpool) a distintos niveles de
+# concurrencia de clientes.
+#
+# Uso:  python -m benchmarks.load_test_async [latencia_ms] [requests_por_nivel]
+
+import os
+import sys
+import time
+import shutil
+import socket
+import asyncio
+import tempfile
+import multiprocessing as mp
+import faiss
+import httpx
+import numpy as np
+import uvicorn
+
+from src import config
+from src.fake_upstream import fake_embedding
+
+CONCURRENCY_LEVELS = [1, 8, 32, 64, 128]
+
+
+def serve_fake_upstream(port: int, latency: float):
+    from src.fake_upstream import FakeUpstreamServer
+    FakeUpstreamServer(port=port, latency=latency).serve_forever()
+
+
+def prepare_environment(upstream_url: str, tmpdir: str):
+    """Point config at the fake upstream and a tiny temp index before the app is imported."""
+    config.EMBED_ENDPOINT = f"{upstream_url}/api/embed"
+    config.CHAT_ENDPOINT = f"{upstream_url}/v1/chat/completions"
+    config.EMBED_CACHE_ENABLED = False
+    config.FAISS_INDEX_PATH = os.path.join(tmpdir, "load.index")  # se importa como segmento base
+    config.INDEX_DIR = os.path.join(tmpdir, "index")
+    config.CHUNK_STORE_PATH = os.path.join(tmpdir, "load_chunks.sqlite3")
+    config.METADATA_PATH = os.path.join(tmpdir, "load_meta.json")
+    config.JOBS_DB_PATH = os.path.join(tmpdir, "load_jobs.sqlite3")
+
+    from src.chunk_store import ChunkStore
+    texts = [f"apple fact number {i}" for i in range(200)]
+    index = faiss.IndexFlatL2(config.VECTOR_DIM)
+    index.add(np.array([fake_embedding(t) for t in texts], dtype="float32"))
+    faiss.write_index(index, config.FAISS_INDEX_PATH)
+    ChunkStore(config.CHUNK_STORE_PATH).append(
+        0, [{"doc_id": "d", "chunk_id": i, "text": t} for i, t in enumerate(texts)]
+    )
+
+
+def add_legacy_sync_route(app):
+    """Replica of the previous blocking handler, for comparison."""
+    import requests
+    from src.retrieval_store import retrieval_store
+    from src.utils import build_rag_payload, parse_chat_response
+
+    @app.post("/query-sync")
+    def query_sync(req: dict):
+        q = req["question"]
+        snap = retrieval_store.snapshot()
+        resp = requests.post(config.EMBED_ENDPOINT, json={"model": config.EMBED_MODEL, "input": q},
+                             timeout=config.REQUEST_TIMEOUT)
+        vec = np.array(resp.json()["embeddings"][0], dtype="float32").reshape(1, -1)
+        _, ids = snap.index.search(vec, config.TOP_K)
+        chunks = [c["text"] for c in snap.lookup(ids[0])]
+        resp = requests.post(config.CHAT_ENDPOINT, json=build_rag_payload(chunks, q),
+                             timeout=config.REQUEST_TIMEOUT)
+        return {"answer": parse_chat_response(resp.json())}
+
+    # Las rutas nuevas deben ir antes del mount estático "/"
+    app.router.routes.insert(0, app.router.routes.pop())
+
+
+def serve_api(port: int, upstream_url: str, tmpdir: str):
+    prepare_environment(upstream_url, tmpdir)
+    from src.api_server import app
+    add_legacy_sync_route(app)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"port {port} did not open")
+
+
+async def run_level(url: str, concurrency: int, total: int):
+    latencies = []
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post(url, json={"question": f"apple fact {i}"})
+                    r.raise_for_status()
+                except httpx.HTTPError:
+                    return
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t0
+    errors = total - len(latencies)
+    if not latencies:
+        return 0.0, float("nan"), float("nan"), errors
+    return (len(latencies) / elapsed, np.percentile(latencies, 50) * 1000,
+            np.percentile(latencies, 99) * 1000, errors)
+
+
+def main(latency_ms: float, total: int):
+    upstream_port, api_port = 8766, 8765
+    tmpdir = tempfile.mkdtemp()
+    procs = [
+        mp.Process(target=serve_fake_upstream, args=(upstream_port, latency_ms / 1000), daemon=True),
+        mp.Process(target=serve_api, args=(api_port, f"http://127.0.0.1:{upstream_port}", tmpdir),
+                   daemon=True),
+    ]
+    for p in procs:
+        p.start()
+    try:
+        wait_for_port(upstream_port)
+        wait_for_port(api_port)
+        base = f"http://127.0.0.1:{api_port}"
+
+        print(f"Upstream falso: {latency_ms:.0f} ms por llamada (embedding + chat = 2 llamadas por /query)")
+        print(f"{'conc':>5} | {'async req/s':>11} {'p50':>8} {'p99':>8} {'err':>4} |"
+              f" {'sync req/s':>10} {'p50':>8} {'p99':>8} {'err':>4}")
+        for c in CONCURRENCY_LEVELS:
+            n = max(total, c * 2)
+            a = asyncio.run(run_level(f"{base}/query", c, n))
+            s_ = asyncio.run(run_level(f"{base}/query-sync", c, n))
+            print(f"{c:>5} | {a[0]:>11.1f} {a[1]:>6.0f}ms {a[2]:>6.0f}ms {a[3]:>4} |"
+                  f" {s_[0]:>10.1f} {s_[1]:>6.0f}ms {s_[2]:>6.0f}ms {s_[3]:>4}")
+    finally:
+        for p in procs:
+            p.terminate()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 200.0
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    main(latency, total)
@@ -0,0 +1,27 @@
+# conftest.py
+
+import os
+import atexit
+import shutil
+import tempfile
+
+# Los tests corren sin red: embeddings y chat van a servicios falsos locales.
+# Con RAG_UPSTREAM=live se prueban contra los servicios reales.
+os.environ.setdefault("RAG_UPSTREAM", "fake")
+
+# Estado (índice, SQLite, writer.lock) en un directorio temporal: los módulos
+# crean sus singletons al importarse y no deben tocar embeddings/ ni el lock
+# de un servidor de desarrollo corriendo en este mismo árbol.
+os.environ["RAG_EMBEDDINGS_DIR"] = tempfile.mkdtemp(prefix="rag_tests_")
+atexit.register(shutil.rmtree, os.environ["RAG_EMBEDDINGS_DIR"], ignore_errors=True)
+
+import pytest
+
+from src.config import UPSTREAM_MODE
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fake_upstream():
+    if UPSTREAM_MODE == "fake":
+        from src.fake_upstream import ensure_fake_upstream
+        ensure_fake_upstream()
@@ -5,12 +5,26 @@ import axios from "axios";
 import Chat from "./Chat";
 import "./App.css";
 
+const JOB_POLL_MS = 1000;
+
 function App() {
   const [url, setUrl] = useState("");
   const [loadingArticle, setLoading] = useState(false);
   const [articleLoaded, setArticleLoaded] = useState(false);
   const [docId, setDocId] = useState("");
   const [errorMsg, setErrorMsg] = useState("");
+  const [statusMsg, setStatusMsg] = useState("");
+  const [stage, setStage] = useState("");
+
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const res = await axios.get(`/jobs/${jobId}`);
+      const job = res.data;
+      if (job.status === "done" || job.status === "failed") return job;
+      setStage(job.stage);
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_MS));
+    }
+  };
 
   const handleUpload = async (e) => {
     e.preventDefault();
@@ -21,7 +35,19 @@ function App() {
     }
     setLoading(true);
     try {
+      // El backend encola el artículo; consultamos el job hasta que termine
       const res = await axios.post("/upload-article", { url });
+      // Sin job_id el artículo ya estaba indexado: no hay nada que esperar
+      if (res.data.job_id) {
+        const job = await waitForJob(res.data.job_id);
+        if (job.status === "failed") {
+          setErrorMsg(job.error || "Unknown error loading the article.");
+          return;
+        }
+        setStatusMsg("");
+      } else {
+        setStatusMsg(res.data.status);
+      }
       setDocId(res.data.doc_id);
       setArticleLoaded(true);
       setErrorMsg("");
@@ -31,6 +57,7 @@ function App() {
       setErrorMsg(detail);
     } finally {
       setLoading(false);
+      setStage("");
     }
   };
 
@@ -40,6 +67,7 @@ function App() {
     setDocId("");
     setArticleLoaded(false);
     setErrorMsg("");
+    setStatusMsg("");
   };
 
   return (
@@ -57,7 +85,7 @@ function App() {
               placeholder="https://en.wikipedia.org/wiki/..."
             />
             <button type="submit" disabled={loadingArticle}>
-              {loadingArticle ? "Loading..." : "Load Article"}
+              {loadingArticle ? `Loading${stage ? ` (${stage})` : ""}...` : "Load Article"}
             </button>
           </form>
           {errorMsg && <p className="error">{errorMsg}</p>}
@@ -69,6 +97,7 @@ function App() {
               Restart Chat
             </button>
           </div>
+          {statusMsg && <p className="status">{statusMsg}</p>}
           <Chat docId={docId} />
         </>
       )}
@@ -1,7 +1,6 @@
 // frontend/src/Chat.js
 
 import React, { useState, useRef, useEffect } from "react";
-import axios from "axios";
 import "./Chat.css";
 
 function Chat({ docId }) {
@@ -30,14 +29,50 @@ function Chat({ docId }) {
     setLoadingQ(true);
 
     try {
-      const res = await axios.post("/query", { question });
-      const answer = res.data.answer;
-      setMessages((prev) => [...prev, { from: "bot", text: answer }]);
+      // Solo busca en el artículo de este chat; la respuesta llega token a token
+      const res = await fetch("/query/stream", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ question, doc_id: docId }),
+      });
+      if (!res.ok) {
+        const body = await res.json().catch(() => ({}));
+        throw new Error(body.detail || "Unknown error querying the chatbot.");
+      }
+
+      // El primer token crea el mensaje del bot; los siguientes lo extienden
+      let started = false;
+      const appendToAnswer = (token) => {
+        const first = !started;
+        started = true;
+        setMessages((prev) => {
+          if (first) return [...prev, { from: "bot", text: token }];
+          const last = prev[prev.length - 1];
+          return [...prev.slice(0, -1), { ...last, text: last.text + token }];
+        });
+      };
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        // Cada evento SSE termina en una línea en blanco
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const evt of events) {
+          if (!evt.startsWith("data: ")) continue;
+          const data = JSON.parse(evt.slice("data: ".length));
+          if (data.token) appendToAnswer(data.token);
+          if (data.error) throw new Error(data.error);
+        }
+      }
       setErrorQ("");
     } catch (err) {
-      console.error(err.response || err);
-      const detail = err.response?.data?.detail || "Unknown error querying the chatbot.";
-      setErrorQ(detail);
+      console.error(err);
+      setErrorQ(err.message || "Unknown error querying the chatbot.");
       setMessages((prev) => [...prev, { from: "bot", text: "Sorry, an error occurred." }]);
     } finally {
       setLoadingQ(false);
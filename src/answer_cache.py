@@ -0,0 +1,184 @@
+import re
+import time
+import threading
+import numpy as np
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+from src.config import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL,
+    ANSWER_CACHE_SIMILARITY
+)
+from src.chunk_store import ChunkStore, chunk_store
+from src.metrics import CACHE_LOOKUPS
+
+# Clave exacta: (pregunta normalizada, alcance, ids de fragmentos recuperados)
+ExactKey = Tuple[str, Optional[FrozenSet[str]], Tuple[int, ...]]
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(re.findall(r"\w+", question.lower()))
+
+
+@dataclass
+class _Entry:
+    key: ExactKey
+    scope: Optional[FrozenSet[str]]
+    docs: FrozenSet[str]          # documentos de los fragmentos usados
+    vector: np.ndarray            # embedding normalizado de la pregunta
+    answer: str
+    generation: int               # generación del índice (manifest) cuando se respondió
+    versions: Dict[str, str]      # content_hash de los documentos del alcance cuando se respondió
+    created: float
+
+
+class AnswerCache:
+    """
+    Two-level, in-memory cache of /query answers.
+
+    Level 1 (exact) is keyed by the normalized question, the document scope
+    and the ids of the chunks retrieved for it; since chunk rows never
+    change, a hit there always has the same context the LLM would see.
+    Level 2 (semantic) runs before retrieval and reuses the answer of a
+    cached question in the same scope whose embedding has cosine similarity
+    ≥ `similarity`. Entries are evicted LRU beyond `max_entries` and expire
+    after `ttl` seconds. `invalidate_docs` drops what depends on documents
+    that changed in this process. Each worker has its own cache, so semantic
+    hits are also checked against shared state on disk: scoped ones require
+    the documents' content hashes in `chunks` to be those the answer was
+    computed with, unscoped ones the index generation (the manifest's, which
+    every append, removal and compaction bumps).
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 ttl: float = ANSWER_CACHE_TTL,
+                 similarity: float = ANSWER_CACHE_SIMILARITY,
+                 chunks: ChunkStore = chunk_store):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.chunks = chunks
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[ExactKey, _Entry]" = OrderedDict()
+
+    @staticmethod
+    def _scope(doc_ids: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+        return frozenset(doc_ids) if doc_ids else None
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype="float32").ravel()
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return now - entry.created > self.ttl
+
+    def doc_versions(self, doc_ids: Optional[Iterable[str]]) -> Dict[str, str]:
+        """Current content hashes of a scope's documents (empty for unscoped queries)."""
+        scope = self._scope(doc_ids)
+        return self.chunks.content_hashes(sorted(scope)) if scope else {}
+
+    def get_semantic(self, vector, doc_ids: Optional[Iterable[str]], generation: int,
+                     versions: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """
+        Answer of the most similar cached question in the same scope, if close
+        enough. `versions` is the scope's current `doc_versions` (read if omitted).
+        """
+        scope = self._scope(doc_ids)
+        q = self._unit(vector)
+        now = time.time()
+        # Otro worker pudo re-indexar estos documentos: se compara con el chunk store, no con la memoria
+        if versions is None:
+            versions = self.doc_versions(scope)
+        with self._lock:
+            candidates = [
+                e for e in self._entries.values()
+                if e.scope == scope and not self._expired(e, now)
+                and (e.versions == versions if scope is not None else e.generation == generation)
+            ]
+            if candidates:
+                sims = np.stack([e.vector for e in candidates]) @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.similarity:
+                    entry = candidates[best]
+                    self._entries.move_to_end(entry.key)
+                    self.semantic_hits += 1
+                    CACHE_LOOKUPS.inc(cache="answer", result="semantic_hit")
+                    return entry.answer
+        return None
+
+    def exact_key(self, question: str, doc_ids: Optional[Iterable[str]], chunk_ids: Iterable[int]) -> ExactKey:
+        return (normalize_question(question), self._scope(doc_ids), tuple(int(i) for i in chunk_ids))
+
+    def get_exact(self, key: ExactKey) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry, time.time()):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                CACHE_LOOKUPS.inc(cache="answer", result="exact_hit")
+                return entry.answer
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            CACHE_LOOKUPS.inc(cache="answer", result="miss")
+            return None
+
+    def put(self, key: ExactKey, vector, docs: Iterable[str], answer: str, generation: int,
+            versions: Optional[Dict[str, str]] = None) -> None:
+        """
+        Store an answer. `versions` are the scope's `doc_versions` from before
+        retrieval (taken now if omitted): an answer computed from a version
+        that changed meanwhile must not be stamped with the new one.
+        """
+        if versions is None:
+            versions = self.doc_versions(key[1])
+        entry = _Entry(key, key[1], frozenset(docs), self._unit(vector), answer, generation, versions, time.time())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_docs(self, doc_ids: Iterable[str]) -> int:
+        """
+        Drop entries scoped to, or built from chunks of, any of `doc_ids`.
+        Returns how many were removed.
+        """
+        changed = set(doc_ids)
+        with self._lock:
+            stale = [
+                k for k, e in self._entries.items()
+                if (e.scope is not None and e.scope & changed) or e.docs & changed
+            ]
+            for k in stale:
+                del self._entries[k]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "similarity": self.similarity,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
+
+
+answer_cache = AnswerCache()
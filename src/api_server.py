@@ -1,30 +1,47 @@
 import os
-import uuid
+import time
 import json
-import faiss
+import asyncio
 import numpy as np
 import uvicorn
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Dict, List, NamedTuple, Optional
 
 from src.config import (
-    FAISS_INDEX_PATH,
     METADATA_PATH,
-    VECTOR_DIM,
-    TOP_K
+    TOP_K,
+    JOB_EVENTS_POLL_INTERVAL,
+    DOC_REFRESH_INTERVAL,
+    ANSWER_CACHE_ENABLED,
+    UPSTREAM_MODE,
+    CONTEXT_CANDIDATES,
+    JOBS_POLL_INTERVAL
 )
 from src.utils import (
-    scrape_wikipedia_article,
-    save_text_to_file,
-    load_metadata,
-    generate_embedding_nomic,
-    chat_completion_rag,
-    split_text_to_chunks
+    canonical_url,
+    doc_id_for_url,
+    generate_embedding_nomic_async,
+    chat_completion_rag_async,
+    chat_completion_rag_stream,
+    EmbeddingError,
+    CHAT_ERROR_ANSWER,
+    CHAT_PARSE_ERROR_ANSWER
 )
-from src.build_index import build_or_load_faiss_index
+from src.answer_cache import answer_cache
+from src.retrieval_store import retrieval_store
+from src.chunk_store import chunk_store, migrate_from_json
+from src.jobs import job_store, ingestion_queue, writer_lock, FINISHED
+from src.embedding_client import get_embedding_client
+from src.async_upstream import upstreams
+from src.chunker import count_tokens
+from src.context_packing import pack_context
+from src.metrics import registry, span, TimingMiddleware, UPSTREAM_ERRORS, CONTEXT_TOKENS
 
 # ─── 1) Inicializa FastAPI ─────────────────────────────────────
 app = FastAPI(
@@ -33,14 +50,58 @@ app = FastAPI(
     description="Backend + Frontend estático integrado"
 )
 
-# ─── 2) CORS wildcard (acepta cualquier origen) ────────────────
+# ─── 2) CORS wildcard (acepta cualquier origen) + tiempos ──────
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Histograma por endpoint, header Server-Timing y log de requests lentos
+app.add_middleware(TimingMiddleware)
+
+def warm_retrieval_store():
+    # El escritor migra metadatos.json si hace falta; todos cargan el índice una
+    # sola vez y /query lo sirve desde memoria, leyendo los textos del chunk store
+    if writer_lock.acquire():
+        migrate_from_json(chunk_store, METADATA_PATH)
+    retrieval_store.warm()
+
+@app.on_event("startup")
+async def start_fake_upstream():
+    # RAG_UPSTREAM=fake: embeddings y chat locales, para correr sin red
+    if UPSTREAM_MODE == "fake":
+        from src.fake_upstream import ensure_fake_upstream
+        ensure_fake_upstream()
+
+@app.on_event("startup")
+async def start_warmup():
+    # En segundo plano: con scale-to-zero el servidor acepta conexiones sin
+    # esperar al índice; /ready avisa cuando terminó (una /query que llegue
+    # antes espera la misma carga en RetrievalStore)
+    app.state.warmup = asyncio.create_task(asyncio.to_thread(warm_retrieval_store))
+
+async def become_writer():
+    # Con varios workers de uvicorn solo uno corre la cola de ingesta (y escribe
+    # índice y chunk store); los demás esperan por si ese worker muere
+    while not writer_lock.acquire():
+        await asyncio.sleep(JOBS_POLL_INTERVAL)
+    # Retoma los jobs que quedaron en cola o a medias antes de reiniciar, y
+    # después los que encolen los otros workers
+    ingestion_queue.start()
+
+@app.on_event("startup")
+async def start_ingestion_workers():
+    app.state.writer = asyncio.create_task(become_writer())
+
+@app.on_event("shutdown")
+async def stop_background_work():
+    app.state.writer.cancel()
+    await ingestion_queue.stop()
+    writer_lock.release()
+    await upstreams.aclose()
 
 # ─── 3) Modelos Pydantic ───────────────────────────────────────
 class UploadArticleRequest(BaseModel):
@@ -49,104 +110,238 @@ class UploadArticleRequest(BaseModel):
 class UploadArticleResponse(BaseModel):
     status: str
     doc_id: str
+    job_id: Optional[str] = None
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    url: str
+    doc_id: str
+    status: str
+    stage: str
+    progress: float
+    chunks_indexed: Optional[int] = None
+    error: Optional[str] = None
 
 class QueryRequest(BaseModel):
     question: str
+    doc_id: Optional[str] = None           # limita la búsqueda a un artículo
+    doc_ids: Optional[List[str]] = None    # ... o a varios
 
 class QueryResponse(BaseModel):
     answer: str
 
-# ─── 4) POST /upload-article ───────────────────────────────────
-@app.post("/upload-article", response_model=UploadArticleResponse)
-def upload_article(req: UploadArticleRequest):
-    url = req.url.strip()
+# ─── 4) POST /upload-article + GET /jobs/{id} ──────────────────
+@app.post("/upload-article", response_model=UploadArticleResponse, status_code=202)
+async def upload_article(req: UploadArticleRequest):
+    url = canonical_url(req.url)
     if not url.lower().startswith("https://en.wikipedia.org/wiki/"):
         raise HTTPException(400, "URL must start with 'https://en.wikipedia.org/wiki/'.")
-    try:
-        texto = scrape_wikipedia_article(url)
-    except Exception as e:
-        raise HTTPException(500, f"Error scraping article: {e}")
 
-    doc_id = str(uuid.uuid4())
-    filename = f"{doc_id}.txt"
-    try:
-        save_text_to_file(texto, filename)
-    except Exception as e:
-        raise HTTPException(500, f"Error saving file: {e}")
+    # El documento se identifica por su URL canónica: re-subirlo no lo duplica
+    doc_id = doc_id_for_url(url)
+    latest = job_store.latest_for_doc(doc_id)
+    if latest is not None and latest["status"] not in FINISHED:
+        return UploadArticleResponse(status="Article already queued for indexing", doc_id=doc_id,
+                                     job_id=latest["job_id"])
+    doc = chunk_store.document(doc_id)
+    if doc is not None and time.time() - doc["checked_at"] < DOC_REFRESH_INTERVAL:
+        # Revisado hace poco: se responde sin scraping ni embeddings, y sin job que consultar
+        return UploadArticleResponse(status="Article already indexed", doc_id=doc_id, job_id=None)
 
+    # Scraping, chunking, embeddings e indexado corren en la cola de ingesta;
+    # si el artículo ya estaba, el job solo embebe los fragmentos que cambiaron
     try:
-        index = build_or_load_faiss_index(FAISS_INDEX_PATH, VECTOR_DIM)
-        metadatos = load_metadata(METADATA_PATH)
-
-        chunks = split_text_to_chunks(texto)
-        nuevos_vectores, nuevos_metadatos = [], []
-        seen = {(m["doc_id"], m["chunk_id"]) for m in metadatos}
-
-        for idx, frag in enumerate(chunks):
-            key = (doc_id, idx)
-            if key in seen:
-                continue
-            vec = np.array(generate_embedding_nomic(frag), dtype="float32")
-            nuevos_vectores.append(vec)
-            nuevos_metadatos.append({
-                "doc_id": doc_id,
-                "chunk_id": idx,
-                "text": frag
-            })
-            seen.add(key)
-
-        if nuevos_vectores:
-            index.add(np.stack(nuevos_vectores, axis=0))
-            faiss.write_index(index, FAISS_INDEX_PATH)
-            metadatos.extend(nuevos_metadatos)
-            with open(METADATA_PATH, "w", encoding="utf-8") as f:
-                json.dump(metadatos, f, ensure_ascii=False, indent=2)
+        if writer_lock.acquire():
+            job = ingestion_queue.enqueue(url, doc_id)
+        else:
+            # Otro worker es el escritor: lo toma de la tabla de jobs en su próximo sondeo
+            job = job_store.create(url, doc_id)
     except Exception as e:
-        raise HTTPException(500, f"Error indexing article: {e}")
+        raise HTTPException(500, f"Error queuing article: {e}")
 
-    return UploadArticleResponse(status="Article indexed successfully", doc_id=doc_id)
+    return UploadArticleResponse(status="Article queued for indexing", doc_id=doc_id, job_id=job["job_id"])
 
-# ─── 5) POST /query ────────────────────────────────────────────
-@app.post("/query", response_model=QueryResponse)
-def query_article(req: QueryRequest):
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found.")
+    return JobStatusResponse(**job)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    """Server-Sent Events with the job status every time it changes, until it finishes."""
+    if job_store.get(job_id) is None:
+        raise HTTPException(404, "Job not found.")
+
+    async def events():
+        last = None
+        while True:
+            job = job_store.get(job_id)
+            state = (job["status"], job["stage"], job["progress"])
+            if state != last:
+                last = state
+                yield f"data: {json.dumps(JobStatusResponse(**job).dict())}\n\n"
+            if job["status"] in FINISHED:
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# ─── 5) POST /query + POST /query/stream ───────────────────────
+class PreparedQuery(NamedTuple):
+    """Result of everything /query does before calling the LLM."""
+    question: str
+    answer: Optional[str]           # ya resuelta (caché o sin fragmentos): no hace falta el LLM
+    chunks: List[Dict]              # fragmentos elegidos para el contexto
+    context: List[str]              # ... unidos en pasajes: lo que recibe el LLM
+    cache_key: Optional[tuple]
+    vector: Optional[np.ndarray]
+    generation: int                 # del índice sobre el que se respondió
+    versions: Dict[str, str]        # content_hash de los documentos del alcance antes de buscar
+
+async def prepare_query(req: QueryRequest) -> PreparedQuery:
     q = req.question.strip()
     if not q:
         raise HTTPException(400, "Question cannot be empty.")
 
-    if not os.path.exists(FAISS_INDEX_PATH):
-        raise HTTPException(500, "FAISS index not found. Please upload an article first.")
     try:
-        index = faiss.read_index(FAISS_INDEX_PATH)
+        with span("index_load"):
+            snapshot = await run_in_threadpool(retrieval_store.snapshot)
+    except FileNotFoundError:
+        raise HTTPException(500, "FAISS index not found. Please upload an article first.")
     except Exception as e:
         raise HTTPException(500, f"Error loading index: {e}")
+    generation = snapshot.index.generation
+
+    try:
+        vec_q = np.array(await generate_embedding_nomic_async(q), dtype="float32").reshape(1, -1)
+    except EmbeddingError as e:
+        raise HTTPException(502, f"Error generating embedding: {e}")
+    scope = ([req.doc_id] if req.doc_id else []) + (req.doc_ids or [])
+    # Versión de los documentos antes de buscar: con ella se valida y se guarda la respuesta
+    versions = await run_in_threadpool(answer_cache.doc_versions, scope) if ANSWER_CACHE_ENABLED and scope else {}
+
+    # Caché nivel 2: una pregunta casi idéntica en el mismo alcance evita búsqueda y LLM
+    if ANSWER_CACHE_ENABLED:
+        with span("answer_cache"):
+            cached = answer_cache.get_semantic(vec_q, scope, generation, versions)
+        if cached is not None:
+            return PreparedQuery(q, cached, [], [], None, None, generation, versions)
+
+    # Vectorial + BM25 fusionados: reemplaza al filtro por substring sobre el top-k
+    ids = await run_in_threadpool(snapshot.hybrid_search, vec_q, q, max(TOP_K, CONTEXT_CANDIDATES), scope or None)
+    if scope and not ids:
+        raise HTTPException(404, "Document not found or not indexed yet.")
+    with span("lookup"):
+        found = await run_in_threadpool(snapshot.lookup, ids)
+    if not found:
+        return PreparedQuery(q, "No relevant fragments found for your question.", [], [], None, None, generation, versions)
+
+    # Hasta TOP_K fragmentos relevantes y variados (MMR), vecinos unidos, dentro de MAX_TOKENS_CONTEXT
+    with span("context"):
+        chosen, context = await run_in_threadpool(assemble_context, snapshot, found)
+    CONTEXT_TOKENS.observe(sum(count_tokens(text) for text in context))
+
+    # Caché nivel 1: misma pregunta normalizada con los mismos fragmentos
+    key = answer_cache.exact_key(q, scope, [c["id"] for c in chosen])
+    if ANSWER_CACHE_ENABLED:
+        cached = answer_cache.get_exact(key)
+        if cached is not None:
+            return PreparedQuery(q, cached, chosen, context, key, vec_q, generation, versions)
 
-    if not os.path.exists(METADATA_PATH):
-        raise HTTPException(500, "Metadata not found. Please upload an article first.")
-    with open(METADATA_PATH, "r", encoding="utf-8") as f:
-        metadatos = json.load(f)
+    return PreparedQuery(q, None, chosen, context, key, vec_q, generation, versions)
 
-    vec_q = np.array(generate_embedding_nomic(q), dtype="float32").reshape(1, -1)
-    _, ids = index.search(vec_q, TOP_K)
-    chunks = [metadatos[i]["text"] for i in ids[0] if i < len(metadatos)]
+def assemble_context(snapshot, found: List[Dict]):
+    return pack_context(found, snapshot.vectors([c["id"] for c in found]))
 
-    kws = q.lower().split()
-    filtered = [c for c in chunks if any(k in c.lower() for k in kws)]
-    if not filtered:
-        return QueryResponse(answer="No relevant fragments found for your question.")
+def remember_answer(prep: PreparedQuery, answer: str) -> None:
+    if ANSWER_CACHE_ENABLED and answer and answer not in (CHAT_ERROR_ANSWER, CHAT_PARSE_ERROR_ANSWER):
+        answer_cache.put(prep.cache_key, prep.vector, {c["doc_id"] for c in prep.chunks}, answer, prep.generation,
+                         prep.versions)
+
+@app.post("/query", response_model=QueryResponse)
+async def query_article(req: QueryRequest):
+    prep = await prepare_query(req)
+    if prep.answer is not None:
+        return QueryResponse(answer=prep.answer)
 
     try:
-        resp = chat_completion_rag(filtered, q)
+        resp = await chat_completion_rag_async(prep.context, prep.question)
     except Exception as e:
         raise HTTPException(500, f"Error calling LLM: {e}")
 
+    remember_answer(prep, resp)
     return QueryResponse(answer=resp)
 
-# ─── 6) Monta la app de React (al final para no tapar rutas API) ─
+@app.post("/query/stream")
+async def query_article_stream(req: QueryRequest):
+    """
+    Same as /query, but relays the LLM's tokens as Server-Sent Events as they
+    are generated: `{"token": ...}` events, then `{"done": true}` (or
+    `{"error": ...}`). Validation and retrieval errors are plain HTTP errors.
+    """
+    prep = await prepare_query(req)
+
+    async def events():
+        if prep.answer is not None:
+            yield f"data: {json.dumps({'token': prep.answer})}\n\n"
+            yield f"data: {json.dumps({'done': True})}\n\n"
+            return
+        tokens = []
+        try:
+            async for token in chat_completion_rag_stream(prep.context, prep.question):
+                tokens.append(token)
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except Exception as e:
+            print(f"[Chat] Error streaming from LLM: {e!r}")
+            UPSTREAM_ERRORS.inc(upstream="chat", reason="error")
+            yield f"data: {json.dumps({'error': CHAT_ERROR_ANSWER})}\n\n"
+            return
+        remember_answer(prep, "".join(tokens).strip())
+        yield f"data: {json.dumps({'done': True})}\n\n"
+
+    # X-Accel-Buffering: que un proxy delante no junte los eventos
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ─── 6) GET /embedding-cache/stats + /answer-cache/stats + /metrics ─
+@app.get("/embedding-cache/stats")
+def embedding_cache_stats():
+    cache = get_embedding_client().cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@app.get("/answer-cache/stats")
+def answer_cache_stats():
+    return {"enabled": ANSWER_CACHE_ENABLED, **answer_cache.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text format: stage/request latency histograms, upstream errors, cache lookups."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# ─── 7) GET /ready (readiness: índice cargado en memoria) ──────
+@app.get("/ready")
+def ready():
+    warmup = getattr(app.state, "warmup", None)
+    if warmup is None or not warmup.done():
+        return JSONResponse(status_code=503, content={"ready": False, "status": "warming"})
+    if warmup.exception() is not None:
+        return JSONResponse(status_code=503, content={
+            "ready": False, "status": "error", "detail": str(warmup.exception())
+        })
+    # Sin índice todavía también está listo: /upload-article funciona y /query responde 500
+    return {"ready": True, "index": retrieval_store.stats()}
+
+# ─── 8) Monta la app de React (al final para no tapar rutas API) ─
 build_dir = os.path.join(os.path.dirname(__file__), "..", "frontend", "build")
 if os.path.isdir(build_dir):
     app.mount("/", StaticFiles(directory=build_dir, html=True), name="static")
 
-# ─── 7) Arranque (solo local/testing) ──────────────────────────
+# ─── 9) Arranque (solo local/testing) ──────────────────────────
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run("src.api_server:app", host="0.0.0.0", port=port, reload=False)
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    uvicorn.run("src.api_server:app", host="0.0.0.0", port=port, reload=False, workers=workers)
@@ -0,0 +1,97 @@
+import socket
+import asyncio
+import httpx
+
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from src.config import (
+    EMBED_ASYNC_MAX_CONCURRENCY,
+    CHAT_MAX_CONCURRENCY,
+    SCRAPE_MAX_CONCURRENCY,
+    EMBED_TIMEOUT,
+    CHAT_TIMEOUT,
+    SCRAPE_TIMEOUT
+)
+
+# Límite de concurrencia y timeout por servicio externo
+UPSTREAMS = {
+    "embed":  (EMBED_ASYNC_MAX_CONCURRENCY, EMBED_TIMEOUT),
+    "chat":   (CHAT_MAX_CONCURRENCY, CHAT_TIMEOUT),
+    "scrape": (SCRAPE_MAX_CONCURRENCY, SCRAPE_TIMEOUT),
+}
+
+
+class AsyncUpstreams:
+    """
+    One pooled `httpx.AsyncClient` plus a semaphore per upstream service.
+
+    Each pool is sized to its upstream's concurrency limit and requests wait
+    on the semaphore before touching the pool, so httpcore never holds a
+    queue of pending requests (its pool bookkeeping is quadratic in them).
+
+    Clients and semaphores are bound to the event loop that created them and
+    are rebuilt if a request arrives on a different loop (e.g. each
+    `TestClient` call). In production there is a single loop and they live
+    for the whole process.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _ensure(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._clients = {}
+        self._limits = {}
+        for name, (concurrency, _) in UPSTREAMS.items():
+            limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            # TCP_NODELAY: httpx escribe cabeceras y cuerpo por separado; sin esto
+            # Nagle + delayed ACK agregan ~40 ms a cada POST
+            transport = httpx.AsyncHTTPTransport(
+                limits=limits,
+                socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)],
+            )
+            self._clients[name] = httpx.AsyncClient(transport=transport, follow_redirects=True)
+            self._limits[name] = asyncio.Semaphore(concurrency)
+
+    def timeout(self, upstream: str) -> float:
+        return UPSTREAMS[upstream][1]
+
+    @asynccontextmanager
+    async def slot(self, upstream: str):
+        """Hold one of the `upstream`'s concurrency slots for the duration of a call."""
+        self._ensure()
+        async with self._limits[upstream]:
+            yield self._clients[upstream]
+
+    async def get(self, upstream: str, url: str, **kwargs) -> httpx.Response:
+        async with self.slot(upstream) as client:
+            return await client.get(url, timeout=self.timeout(upstream), **kwargs)
+
+    async def post_json(self, upstream: str, url: str, payload: dict, **kwargs) -> httpx.Response:
+        async with self.slot(upstream) as client:
+            return await client.post(url, json=payload, timeout=self.timeout(upstream), **kwargs)
+
+    @asynccontextmanager
+    async def stream_post_json(self, upstream: str, url: str, payload: dict, **kwargs):
+        """POST and yield the response before its body is read (for streamed answers)."""
+        async with self.slot(upstream) as client:
+            async with client.stream("POST", url, json=payload, timeout=self.timeout(upstream), **kwargs) as resp:
+                yield resp
+
+    async def aclose(self) -> None:
+        # Clientes de otro loop (ya cerrado) no se pueden cerrar desde este: se descartan
+        if self._loop is asyncio.get_running_loop():
+            for client in self._clients.values():
+                await client.aclose()
+        self._clients = {}
+        self._limits = {}
+        self._loop = None
+
+
+upstreams = AsyncUpstreams()
@@ -1,22 +1,44 @@
 import os
+import time
+import queue
+import threading
+import multiprocessing as mp
 import numpy as np
 import faiss
-from tqdm import tqdm
-import json
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
 
 from src.config import (
     DOCS_DIR,
     EMBEDDINGS_DIR,
-    FAISS_INDEX_PATH,
     METADATA_PATH,
-    VECTOR_DIM
-)
-from src.utils import (
-    split_text_to_chunks,
-    generate_embedding_nomic,
-    save_metadata,
-    load_metadata
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_CONCURRENCY,
+    BUILD_CHUNK_WORKERS,
+    BUILD_QUEUE_SIZE,
+    BUILD_FLUSH_EVERY,
+    BUILD_PROGRESS_INTERVAL
 )
+from src.utils import generate_embeddings_nomic
+from src.chunker import Chunk, chunk_text
+from src.chunk_store import ChunkStore, chunk_store, migrate_from_json
+from src.segment_index import SegmentedIndex, segmented_index
+from src.ingestion import content_hash, diff_chunks, replace_document_chunks
+from src.metrics import span, stage_summary
+
+# Marca de fin de stream entre etapas
+_END = object()
+
+
+class _Replace(NamedTuple):
+    """A stored document whose chunks no longer match: replaced as a whole at the index stage."""
+    doc_id: str
+    url: str
+    digest: str
+    pieces: List[Chunk]
+    vectors: Dict[int, np.ndarray]   # embeddings de los fragmentos cambiados, por posición
+
 
 def build_or_load_faiss_index(path: str, dim: int) -> faiss.IndexFlatL2:
     if os.path.exists(path):
@@ -27,57 +49,287 @@ def build_or_load_faiss_index(path: str, dim: int) -> faiss.IndexFlatL2:
         print(f"[FAISS] Creando nuevo índice de dimensión {dim}.")
     return index
 
-def main():
-    os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
 
-    index = build_or_load_faiss_index(FAISS_INDEX_PATH, VECTOR_DIM)
+class _Stopped(Exception):
+    """Another stage failed; this one just unwinds."""
 
-    metadatos = load_metadata(METADATA_PATH)
-    existente_ids = {(m["doc_id"], m["chunk_id"]) for m in metadatos}
 
-    archivos = [f for f in os.listdir(DOCS_DIR) if f.lower().endswith(".txt")]
-    print(f"[Index] Encontrados {len(archivos)} archivos en '{DOCS_DIR}'.")
-    nuevos_vectores = []
-    nuevos_metadatos = []
+class Stage:
+    """
+    Counters of one pipeline stage: items produced and how much of its
+    wall time was spent blocked on its input/output queues. The bottleneck
+    is the stage that is almost never blocked.
+    """
+
+    def __init__(self, name: str, unit: str, stop: threading.Event):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.blocked = 0.0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self._stop = stop
+
+    def get(self, q: "queue.Queue"):
+        t0 = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        raise _Stopped()
+        finally:
+            self.blocked += time.perf_counter() - t0
+
+    def put(self, q: "queue.Queue", item) -> None:
+        t0 = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return q.put(item, timeout=0.1)
+                except queue.Full:
+                    if self._stop.is_set():
+                        raise _Stopped()
+        finally:
+            self.blocked += time.perf_counter() - t0
+
+    def close(self, q: "queue.Queue") -> None:
+        """Send the end marker downstream (dropped if the pipeline is stopping and nobody reads)."""
+        try:
+            self.put(q, _END)
+        except _Stopped:
+            pass
+
+    def summary(self) -> str:
+        elapsed = max((self.finished or time.perf_counter()) - self.started, 1e-9)
+        busy = max(elapsed - self.blocked, 0.0) / elapsed
+        return (f"{self.name:>9} | {self.items:>8} {self.unit:<10} | "
+                f"{self.items / elapsed:>9.1f}/s | ocupado {busy:>4.0%}")
+
+
+def _run_stage(stage: Stage, body: Callable[[], None], stop: threading.Event, errors: List[BaseException]) -> None:
+    try:
+        body()
+    except _Stopped:
+        pass
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        stage.finished = time.perf_counter()
 
-    for archivo in archivos:
-        doc_id = os.path.splitext(archivo)[0]
-        ruta_txt = os.path.join(DOCS_DIR, archivo)
-        with open(ruta_txt, "r", encoding="utf-8") as f:
-            texto = f.read()
 
-        chunks = split_text_to_chunks(texto)
-        print(f"[Index] Procesando '{archivo}' → {len(chunks)} fragmentos.")
+def index_documents(paths: List[str], index: SegmentedIndex = segmented_index, chunks: ChunkStore = chunk_store,
+                    embed: Callable[[List[str]], np.ndarray] = generate_embeddings_nomic,
+                    chunk_workers: int = BUILD_CHUNK_WORKERS, queue_size: int = BUILD_QUEUE_SIZE,
+                    batch_size: int = EMBED_BATCH_SIZE * EMBED_MAX_CONCURRENCY,
+                    flush_every: int = BUILD_FLUSH_EVERY,
+                    progress_interval: float = BUILD_PROGRESS_INTERVAL) -> Dict[str, Stage]:
+    """
+    Index the given .txt files through a staged pipeline connected by
+    bounded queues, so memory stays flat however large the corpus is:
 
-        for idx, fragmento in enumerate(tqdm(chunks, desc=f"Chunks {archivo}")):
-            key = (doc_id, idx)
-            if key in existente_ids:
+      read (thread) → chunk (process pool) → embed (thread, batches) → index (caller)
+
+    Every `flush_every` chunks the index stage appends a segment and the
+    chunks' rows (a durable checkpoint). Chunks already in the chunk store
+    with the same text are skipped before embedding, so an interrupted run
+    resumes where it stopped. A document whose stored chunks differ from
+    the new ones (its text or the chunking settings changed, e.g. one
+    migrated from metadatos.json) is replaced as a whole, as an upload
+    would: unchanged chunks keep their vectors, only the rest is embedded. If any stage fails the pipeline stops and the error is raised
+    after the last complete checkpoint. Returns each stage's counters.
+    """
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    stages = {
+        "read": Stage("lectura", "artículos", stop),
+        "chunk": Stage("chunking", "fragmentos", stop),
+        "embed": Stage("embedding", "fragmentos", stop),
+        "index": Stage("indexado", "fragmentos", stop),
+    }
+    to_chunk: "queue.Queue" = queue.Queue(queue_size)
+    to_embed: "queue.Queue" = queue.Queue(queue_size)
+    to_index: "queue.Queue" = queue.Queue(queue_size)
+    skipped = [0]    # fragmentos ya guardados con el mismo texto: no se vuelven a embeber
+    replaced = [0]   # documentos guardados con otros fragmentos, re-fragmentados
+
+    # spawn: los workers solo importan src.chunker (fork con hilos vivos no es seguro)
+    pool = ProcessPoolExecutor(chunk_workers, mp_context=mp.get_context("spawn")) if chunk_workers > 0 else None
+
+    def read() -> None:
+        stage = stages["read"]
+        try:
+            for path in paths:
+                if stop.is_set():
+                    return
+                with span("read"), open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+                doc_id = os.path.splitext(os.path.basename(path))[0]
+                digest = content_hash(text)
+                if pool is not None:
+                    future = pool.submit(chunk_text, text)
+                else:
+                    future = Future()
+                    with span("chunk"):
+                        future.set_result(chunk_text(text))
+                stage.items += 1
+                # Cola acotada: a lo más `queue_size` artículos chunkeándose a la vez
+                stage.put(to_chunk, (doc_id, path, digest, future))
+        finally:
+            stage.close(to_chunk)
+
+    def chunk() -> None:
+        stage = stages["chunk"]
+        try:
+            while True:
+                item = stage.get(to_chunk)
+                if item is _END:
+                    return
+                doc_id, path, digest, future = item
+                pieces = future.result()
+                stage.items += len(pieces)
+                stage.put(to_embed, (doc_id, path, digest, pieces))
+        finally:
+            stage.close(to_embed)
+
+    def embed_batches() -> None:
+        stage = stages["embed"]
+        pending: List[Dict] = []
+
+        def send(batch: List[Dict]) -> None:
+            vectors = embed([r["text"] for r in batch])
+            stage.items += len(batch)
+            stage.put(to_index, (batch, vectors))
+
+        try:
+            while True:
+                item = stage.get(to_embed)
+                if item is _END:
+                    break
+                doc_id, path, digest, pieces = item
+                stored = chunks.doc_chunks(doc_id)
+                if any(r["chunk_id"] >= len(pieces) or pieces[r["chunk_id"]].text != r["text"] for r in stored):
+                    # Ya no coincide fragmento a fragmento: se reemplaza el documento completo
+                    reused, changed, _ = diff_chunks(stored, pieces)
+                    skipped[0] += len(reused)
+                    vectors = embed([pieces[i].text for i in changed]) if changed else []
+                    stage.items += len(changed)
+                    doc = chunks.document(doc_id)
+                    stage.put(to_index, _Replace(doc_id, doc["url"] if doc else path, digest, pieces,
+                                                 dict(zip(changed, vectors))))
+                    continue
+                # Sin cambios o a medias (corrida interrumpida): solo faltan los que no están
+                done = {r["chunk_id"] for r in stored}
+                skipped[0] += len(done)
+                pending.extend(
+                    {"doc_id": doc_id, "chunk_id": i, "text": c.text, "start": c.start, "end": c.end}
+                    for i, c in enumerate(pieces) if i not in done
+                )
+                while len(pending) >= batch_size:
+                    send(pending[:batch_size])
+                    del pending[:batch_size]
+            if pending:
+                send(pending)
+        finally:
+            stage.close(to_index)
+
+    threads = [
+        threading.Thread(target=_run_stage, args=(stages[name], body, stop, errors), name=f"build-{name}", daemon=True)
+        for name, body in (("read", read), ("chunk", chunk), ("embed", embed_batches))
+    ]
+    for t in threads:
+        t.start()
+
+    stage = stages["index"]
+    records: List[Dict] = []
+    vectors: List[np.ndarray] = []
+    last_report = time.perf_counter()
+
+    def flush() -> None:
+        # Checkpoint: un segmento nuevo (WAL + manifest) y luego sus textos
+        with span("index_write"):
+            start_id = index.append(np.concatenate(vectors))
+            chunks.append(start_id, records)
+        stage.items += len(records)
+        records.clear()
+        vectors.clear()
+
+    try:
+        while True:
+            try:
+                item = stage.get(to_index)
+            except _Stopped:
+                break
+            if item is _END:
+                break
+            if isinstance(item, _Replace):
+                # Los pendientes primero: el checkpoint sigue el orden de llegada
+                if records:
+                    flush()
+                with span("index_write"):
+                    stage.items += replace_document_chunks(index, chunks, item.doc_id, item.url, item.digest,
+                                                           item.pieces, item.vectors)
+                replaced[0] += 1
                 continue
+            batch, batch_vectors = item
+            records.extend(batch)
+            vectors.append(batch_vectors)
+            if len(records) >= flush_every:
+                flush()
+            if time.perf_counter() - last_report >= progress_interval:
+                last_report = time.perf_counter()
+                print("[Index] Progreso: " + ", ".join(
+                    f"{s.name} {s.items}" for s in stages.values()) + f" (omitidos {skipped[0]})")
+        # Lo ya embebido se guarda aunque otra etapa haya fallado
+        if records:
+            flush()
+    finally:
+        stage.finished = time.perf_counter()
+        stop.set()  # desbloquea a las demás etapas si esta falló
+        for t in threads:
+            t.join()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    if skipped[0]:
+        print(f"[Index] Reanudado: {skipped[0]} fragmentos ya indexados se omitieron.")
+    if replaced[0]:
+        print(f"[Index] Re-fragmentados {replaced[0]} documentos cuyos fragmentos guardados ya no coincidían "
+              f"(texto o parámetros de chunking distintos).")
+    if errors:
+        raise errors[0]
+    return stages
 
-            vector = generate_embedding_nomic(fragmento)
-            vector_np = np.array(vector, dtype="float32")
 
-            nuevos_vectores.append(vector_np)
-            nuevos_metadatos.append({
-                "doc_id": doc_id,
-                "chunk_id": idx,
-                "text": fragmento
-            })
-            existente_ids.add(key)
+def main():
+    os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
 
-    if nuevos_vectores:
-        all_vecs = np.stack(nuevos_vectores, axis=0)
-        index.add(all_vecs)
-        print(f"[FAISS] Se agregaron {len(nuevos_vectores)} vectores nuevos al índice.")
+    # Migra metadatos.json (formato anterior) si el chunk store está vacío
+    migrate_from_json(chunk_store, METADATA_PATH)
 
-        faiss.write_index(index, FAISS_INDEX_PATH)
-        print(f"[FAISS] Índice guardado en '{FAISS_INDEX_PATH}'.")
+    archivos = sorted(f for f in os.listdir(DOCS_DIR) if f.lower().endswith(".txt"))
+    print(f"[Index] Encontrados {len(archivos)} archivos en '{DOCS_DIR}'.")
 
-        metadatos.extend(nuevos_metadatos)
-        save_metadata(metadatos, METADATA_PATH)
-        print(f"[Index] Metadatos guardados en '{METADATA_PATH}' (total {len(metadatos)}).")
+    t0 = time.perf_counter()
+    stages = index_documents([os.path.join(DOCS_DIR, f) for f in archivos])
+    print(f"[Index] Pipeline terminado en {time.perf_counter() - t0:.1f} s:")
+    for stage in stages.values():
+        print(f"[Index]   {stage.summary()}")
+    print("[Index] Tiempo por operación:")
+    for line in stage_summary():
+        print(f"[Index]   {line}")
+    nuevos = stages["index"].items
+    if nuevos:
+        print(f"[FAISS] Se agregaron {nuevos} vectores nuevos al índice en '{segmented_index.directory}'.")
+        print(f"[Index] Fragmentos guardados en '{chunk_store.path}' (total {len(chunk_store)}).")
     else:
         print("[Index] No se encontraron fragmentos nuevos para indexar.")
 
+    # Proceso corto: compacta en primer plano en vez de dejar un hilo a medias;
+    # así el índice base queda con el tipo (Flat/IVF/HNSW) que le toca a su tamaño
+    segmented_index.compact(wait=True)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,63 @@
+import sys
+import asyncio
+
+from typing import Dict, List
+
+from src.config import SCRAPE_MAX_CONCURRENCY, JOBS_POLL_INTERVAL
+from src.jobs import JobStore, IngestionQueue, job_store, DONE
+from src.async_upstream import upstreams
+from src.utils import canonical_url, doc_id_for_url
+
+
+def read_url_file(path: str) -> List[str]:
+    """
+    Canonical URLs of a text file, one per line; blank lines and `#`
+    comments are skipped, duplicates (after canonicalization) dropped.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return list(dict.fromkeys(canonical_url(line) for line in lines if line and not line.startswith("#")))
+
+
+async def ingest_urls(urls: List[str], store: JobStore = job_store,
+                      workers: int = SCRAPE_MAX_CONCURRENCY,
+                      poll_interval: float = JOBS_POLL_INTERVAL) -> List[Dict]:
+    """
+    Ingest many articles concurrently. Each URL becomes a regular ingestion
+    job (durable: if this process dies the API server resumes them), run by
+    `workers` workers sharing the pooled, rate-limited scraper. This process
+    runs only these jobs, not others queued by a live API server; that
+    server's writer may claim some of these, so it waits (checking the store
+    every `poll_interval` seconds) until all of them have finished. Returns
+    the final job records in input order. Documents are keyed by canonical
+    URL, so re-running a list only embeds what changed since the last run.
+    """
+    queue = IngestionQueue(store, workers=workers, resume=False)
+    queue.start()
+    jobs = [queue.enqueue(url, doc_id_for_url(url)) for url in urls]
+    try:
+        await queue.wait_finished([job["job_id"] for job in jobs], poll_interval)
+    finally:
+        await queue.stop()
+    return [store.get(job["job_id"]) for job in jobs]
+
+
+async def _main(path: str) -> None:
+    urls = read_url_file(path)
+    print(f"[Bulk] {len(urls)} URLs en '{path}'.")
+    try:
+        results = await ingest_urls(urls)
+    finally:
+        await upstreams.aclose()
+    ok = [j for j in results if j["status"] == DONE]
+    for job in results:
+        if job["status"] != DONE:
+            print(f"[Bulk] Falló {job['url']}: {job['error']}")
+    print(f"[Bulk] {len(ok)}/{len(results)} artículos indexados, "
+          f"{sum(j['chunks_indexed'] or 0 for j in ok)} fragmentos nuevos o cambiados.")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("Uso: python -m src.bulk_ingest <archivo_de_urls>")
+    asyncio.run(_main(sys.argv[1]))
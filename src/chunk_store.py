@@ -0,0 +1,291 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from src.config import CHUNK_STORE_PATH, METADATA_PATH, CHUNK_STORE_MMAP_SIZE
+from src.utils import load_metadata
+
+_COLUMNS = ("id", "doc_id", "chunk_id", "text", "start_char", "end_char")
+
+# Palabras que aparecen en casi todos los fragmentos: no aportan a BM25 y
+# alargan las listas de postings que hay que recorrer
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for", "from",
+    "how", "in", "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was",
+    "were", "what", "when", "where", "which", "who", "why", "with"
+}
+
+
+def fts_query(text: str) -> Optional[str]:
+    """FTS5 MATCH expression OR-ing the question's terms, or None if it has none."""
+    terms = [t for t in re.findall(r"\w+", text.lower()) if t not in _STOPWORDS]
+    if not terms:
+        return None
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+def _row(row: Tuple) -> Dict:
+    """Chunk dict from a `_COLUMNS` row; offsets only when known (not for legacy rows)."""
+    record = dict(zip(_COLUMNS[:4], row[:4]))
+    if row[4] is not None:
+        record["start"], record["end"] = row[4], row[5]
+    return record
+
+
+class ChunkStore:
+    """
+    Store of chunk texts, addressed by FAISS id.
+
+    Backed by SQLite: the FAISS id is the table's INTEGER PRIMARY KEY, so
+    looking up the texts for a search result is a rowid seek and appending
+    a document is a single transaction, independent of corpus size. Nothing
+    is held in RAM beyond SQLite's page cache. Each thread gets its own
+    connection, so concurrent queries do not serialize on a lock.
+
+    An FTS5 inverted index over the texts (`chunks_fts`, external content)
+    is kept in sync by triggers inside the same transaction as the append,
+    and serves BM25 lexical search.
+
+    Documents ingested from a URL also get a row in `documents` (content
+    hash of their text and when it was last checked); re-ingesting one
+    replaces its chunks with `replace_document`, keeping the ids of chunks
+    whose text did not change.
+    """
+
+    def __init__(self, path: str = CHUNK_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id INTEGER PRIMARY KEY, doc_id TEXT NOT NULL,"
+            " chunk_id INTEGER NOT NULL, text TEXT NOT NULL,"
+            " start_char INTEGER, end_char INTEGER)"
+        )
+        # Bases anteriores a los offsets: se agregan las columnas (quedan NULL)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+        for col in ("start_char", "end_char"):
+            if col not in columns:
+                conn.execute(f"ALTER TABLE chunks ADD COLUMN {col} INTEGER")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_id, chunk_id)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " doc_id TEXT PRIMARY KEY, url TEXT NOT NULL, content_hash TEXT NOT NULL,"
+            " checked_at REAL NOT NULL)"
+        )
+        self._create_fts(conn)
+
+    def _create_fts(self, conn: sqlite3.Connection) -> None:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'"
+        ).fetchone()
+        if exists:
+            return
+        conn.execute(
+            "CREATE VIRTUAL TABLE chunks_fts USING fts5(text, content='chunks', content_rowid='id',"
+            " tokenize='porter unicode61 remove_diacritics 2')"
+        )
+        conn.execute(
+            "CREATE TRIGGER chunks_ai AFTER INSERT ON chunks BEGIN"
+            " INSERT INTO chunks_fts(rowid, text) VALUES (new.id, new.text); END"
+        )
+        conn.execute(
+            "CREATE TRIGGER chunks_ad AFTER DELETE ON chunks BEGIN"
+            " INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.id, old.text); END"
+        )
+        # Base creada antes del índice invertido: se indexa lo que ya había
+        conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Lecturas por mmap: los workers comparten las páginas en la caché del SO
+            conn.execute(f"PRAGMA mmap_size={CHUNK_STORE_MMAP_SIZE}")
+            # INSERT OR REPLACE debe disparar el trigger de borrado del FTS
+            conn.execute("PRAGMA recursive_triggers=ON")
+            self._local.conn = conn
+        return conn
+
+    def append(self, start_id: int, records: List[Dict]) -> None:
+        """
+        Store `records` (dicts with doc_id, chunk_id, text and optionally the
+        chunk's `start`/`end` character offsets in its article) under
+        consecutive ids starting at `start_id`, which must match the FAISS ids
+        of their vectors.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks(id, doc_id, chunk_id, text, start_char, end_char)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(start_id + i, r["doc_id"], r["chunk_id"], r["text"], r.get("start"), r.get("end"))
+                 for i, r in enumerate(records)]
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def replace_document(self, doc_id: str, url: str, content_hash: str, start_id: int,
+                         records: List[Dict], kept: List[Dict], removed: List[int]) -> None:
+        """
+        Atomically turn a document's stored chunks into its new version:
+        delete the `removed` ids, renumber the `kept` rows (dicts with `id`
+        and their new chunk_id/start/end), store the new `records` under
+        consecutive ids from `start_id` (as `append`) and record the
+        document's content hash.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM chunks WHERE id = ?", [(int(i),) for i in removed])
+            # chunk_id negativos mientras se renumera, para no chocar con el índice único
+            conn.execute("UPDATE chunks SET chunk_id = -1 - chunk_id WHERE doc_id = ?", (doc_id,))
+            conn.executemany(
+                "UPDATE chunks SET chunk_id = ?, start_char = ?, end_char = ? WHERE id = ?",
+                [(r["chunk_id"], r.get("start"), r.get("end"), r["id"]) for r in kept]
+            )
+            conn.executemany(
+                "INSERT INTO chunks(id, doc_id, chunk_id, text, start_char, end_char)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(start_id + i, r["doc_id"], r["chunk_id"], r["text"], r.get("start"), r.get("end"))
+                 for i, r in enumerate(records)]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO documents(doc_id, url, content_hash, checked_at) VALUES (?, ?, ?, ?)",
+                (doc_id, url, content_hash, time.time())
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def document(self, doc_id: str) -> Optional[Dict]:
+        """`documents` row of a document ingested from a URL, or None."""
+        row = self._conn().execute(
+            "SELECT doc_id, url, content_hash, checked_at FROM documents WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        return dict(zip(("doc_id", "url", "content_hash", "checked_at"), row)) if row else None
+
+    def content_hashes(self, doc_ids: List[str]) -> Dict[str, str]:
+        """content_hash of each of `doc_ids` that has a `documents` row."""
+        if not doc_ids:
+            return {}
+        marks = ",".join("?" * len(doc_ids))
+        rows = self._conn().execute(
+            f"SELECT doc_id, content_hash FROM documents WHERE doc_id IN ({marks})", list(doc_ids)
+        )
+        return dict(rows.fetchall())
+
+    def touch_document(self, doc_id: str) -> None:
+        """Record that the document was re-checked and found unchanged."""
+        self._conn().execute("UPDATE documents SET checked_at = ? WHERE doc_id = ?", (time.time(), doc_id))
+
+    def doc_chunks(self, doc_id: str) -> List[Dict]:
+        """Every stored chunk of a document (with its FAISS `id`), in chunk_id order."""
+        rows = self._conn().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM chunks WHERE doc_id = ? ORDER BY chunk_id", (doc_id,)
+        )
+        return [_row(row) for row in rows]
+
+    def get(self, chunk_id: int) -> Optional[Dict]:
+        return self.get_many([chunk_id])[0]
+
+    def get_many(self, ids: List[int]) -> List[Optional[Dict]]:
+        """Fetch chunks by FAISS id, in the given order; unknown ids come back as None."""
+        wanted = [int(i) for i in ids if i >= 0]
+        found = {}
+        if wanted:
+            marks = ",".join("?" * len(wanted))
+            for row in self._conn().execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM chunks WHERE id IN ({marks})", wanted
+            ):
+                found[row[0]] = _row(row)
+        return [found.get(int(i)) for i in ids]
+
+    def chunk_ids(self, doc_id: str) -> Set[int]:
+        """`chunk_id`s already stored for a document."""
+        rows = self._conn().execute("SELECT chunk_id FROM chunks WHERE doc_id = ?", (doc_id,))
+        return {r[0] for r in rows}
+
+    def ids_for_docs(self, doc_ids: List[str]) -> List[int]:
+        """FAISS ids of every chunk of the given documents, ascending."""
+        if not doc_ids:
+            return []
+        marks = ",".join("?" * len(doc_ids))
+        rows = self._conn().execute(
+            f"SELECT id FROM chunks WHERE doc_id IN ({marks}) ORDER BY id", list(doc_ids)
+        )
+        return [r[0] for r in rows]
+
+    def search_bm25(self, question: str, k: int, doc_ids: Optional[List[str]] = None,
+                    max_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k chunk ids by BM25 for the question's terms, best first, as
+        (id, score) with higher = better. Optionally limited to `doc_ids`
+        and to ids below `max_id` (those a given index snapshot knows).
+        """
+        match = fts_query(question)
+        if match is None:
+            return []
+        sql = "SELECT rowid, bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ?"
+        params: List = [match]
+        if max_id is not None:
+            sql += " AND rowid < ?"
+            params.append(max_id)
+        if doc_ids is not None:
+            sql += f" AND rowid IN (SELECT id FROM chunks WHERE doc_id IN ({','.join('?' * len(doc_ids))}))"
+            params.extend(doc_ids)
+        sql += " ORDER BY bm25(chunks_fts) LIMIT ?"
+        params.append(k)
+        # bm25() de FTS5 es negativo: más bajo = más relevante
+        return [(row[0], -row[1]) for row in self._conn().execute(sql, params)]
+
+    def next_id(self) -> int:
+        row = self._conn().execute("SELECT MAX(id) FROM chunks").fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def iter_all(self) -> Iterator[Dict]:
+        """Every chunk in FAISS id order, in the same shape as the old metadata list."""
+        cursor = self._conn().execute(
+            "SELECT doc_id, chunk_id, text FROM chunks ORDER BY id"
+        )
+        for doc_id, chunk_id, text in cursor:
+            yield {"doc_id": doc_id, "chunk_id": chunk_id, "text": text}
+
+
+def migrate_from_json(store: ChunkStore, json_path: str = METADATA_PATH) -> int:
+    """
+    One-shot import of a legacy `metadatos.json` into an empty chunk store.
+    Position i in the JSON list becomes FAISS id i, as it was before.
+    Returns the number of chunks imported (0 if there was nothing to do).
+    """
+    if len(store) or not os.path.exists(json_path):
+        return 0
+    metadatos = load_metadata(json_path)
+    store.append(0, metadatos)
+    print(f"[Chunks] Migrados {len(metadatos)} fragmentos desde '{json_path}' a '{store.path}'.")
+    return len(metadatos)
+
+
+chunk_store = ChunkStore()
+
+
+if __name__ == "__main__":
+    # Uso: python -m src.chunk_store  → convierte metadatos.json al chunk store
+    n = migrate_from_json(chunk_store)
+    if not n:
+        print("[Chunks] Nada que migrar (el chunk store ya tiene datos o no existe el JSON).")
@@ -0,0 +1,132 @@
+import re
+
+from typing import Callable, List, NamedTuple
+
+from src.config import CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_UNIT
+
+# Fin de oración (., ! o ? + comillas/paréntesis de cierre opcionales) seguido de
+# espacio, o salto de línea. Los grupos son el separador: lo que va antes (el
+# cierre) queda dentro de la oración.
+_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*([ \t]+)|(\s*\n\s*)")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_WORD_BREAK = re.compile(r"\s+")
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int   # offset (en caracteres) del primer carácter en el texto original
+    end: int     # offset exclusivo: text == original[start:end]
+
+
+def count_tokens(text: str) -> int:
+    """Cheap token estimate: words and punctuation marks."""
+    return len(_TOKEN.findall(text))
+
+
+def _sizer(unit: str) -> Callable[[str], int]:
+    if unit == "chars":
+        return len
+    if unit == "tokens":
+        return count_tokens
+    raise ValueError(f"Unknown chunk unit: {unit!r}")
+
+
+def _sentences(text: str):
+    """Yield (start, end, ends_paragraph) for each sentence, in one pass."""
+    pos = len(text) - len(text.lstrip())
+    for m in _BOUNDARY.finditer(text):
+        end = m.start(1) if m.group(1) is not None else m.start(2)
+        if end > pos:
+            yield pos, end, m.group(2) is not None and "\n\n" in m.group(2).replace(" ", "")
+        pos = m.end()
+    if pos < len(text) and text[pos:].strip():
+        yield pos, len(text.rstrip()), True
+
+
+def _cut(text: str, start: int, end: int, size: int, measure) -> List[tuple]:
+    """Split a single word longer than `size` into the longest prefixes that fit."""
+    pieces, lo = [], start
+    while lo < end:
+        # Búsqueda binaria del prefijo más largo que cabe (al menos un carácter)
+        a, b = lo + 1, end
+        while a < b:
+            mid = (a + b + 1) // 2
+            if measure(text[lo:mid]) <= size:
+                a = mid
+            else:
+                b = mid - 1
+        pieces.append((lo, a))
+        lo = a
+    return pieces
+
+
+def _hard_split(text: str, start: int, end: int, size: int, measure) -> List[tuple]:
+    """Split a sentence longer than `size` at word boundaries; words that alone don't fit are cut."""
+    pieces, lo = [], start
+    last_fit = None
+    breaks = [(m.start(), m.end()) for m in _WORD_BREAK.finditer(text, start, end)]
+    # El final de la oración cuenta como un corte más: el último trozo también se mide
+    for brk in breaks + [(end, end)]:
+        if measure(text[lo:brk[0]]) > size:
+            if last_fit is not None:
+                pieces.append((lo, last_fit[0]))
+                lo, last_fit = last_fit[1], None
+            if measure(text[lo:brk[0]]) > size:
+                pieces.extend(_cut(text, lo, brk[0], size, measure))
+                lo = brk[1]
+                continue
+        last_fit = brk
+    if lo < end:
+        pieces.append((lo, end))
+    return pieces
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+               unit: str = CHUNK_UNIT) -> List[Chunk]:
+    """
+    Split `text` into chunks of at most ~`chunk_size` (characters or estimated
+    tokens, per `unit`) that end on sentence boundaries, preferring paragraph
+    breaks once a chunk is half full. Consecutive chunks share whole trailing
+    sentences up to `chunk_overlap`. Each chunk carries its character offsets
+    in the original text, so adjacent chunks can be merged back exactly.
+    """
+    measure = _sizer(unit)
+    units = []   # (start, end, size, ends_paragraph)
+    for start, end, para in _sentences(text):
+        size = measure(text[start:end])
+        if size > chunk_size:
+            units.extend((a, b, measure(text[a:b]), False) for a, b in _hard_split(text, start, end, chunk_size, measure))
+            units[-1] = units[-1][:3] + (para,)
+        else:
+            units.append((start, end, size, para))
+
+    def span(first: tuple, last: tuple, tokens: int) -> int:
+        # En caracteres el tamaño es exacto (offsets); en tokens, suma de oraciones
+        return last[1] - first[0] if unit == "chars" else tokens
+
+    def emit(group: List[tuple]) -> None:
+        chunks.append(Chunk(text[group[0][0]:group[-1][1]], group[0][0], group[-1][1]))
+
+    chunks: List[Chunk] = []
+    current: List[tuple] = []
+    tokens = 0
+    for u in units:
+        if current and span(current[0], u, tokens + u[2]) > chunk_size:
+            emit(current)
+            # Solapamiento: oraciones completas del final del chunk anterior,
+            # sin que el chunk nuevo se pase de tamaño
+            carry = []
+            for prev in reversed(current[1:]):
+                if span(prev, current[-1], sum(c[2] for c in carry) + prev[2]) > chunk_overlap \
+                        or span(prev, u, sum(c[2] for c in carry) + prev[2] + u[2]) > chunk_size:
+                    break
+                carry.insert(0, prev)
+            current, tokens = carry, sum(c[2] for c in carry)
+        current.append(u)
+        tokens += u[2]
+        if u[3] and span(current[0], u, tokens) >= chunk_size / 2:
+            emit(current)
+            current, tokens = [], 0
+    if current:
+        emit(current)
+    return chunks
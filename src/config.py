@@ -4,10 +4,12 @@ import os
 BASE_DIR       = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR       = os.path.join(BASE_DIR, "data")
 DOCS_DIR       = os.path.join(DATA_DIR, "docs")
-EMBEDDINGS_DIR = os.path.join(BASE_DIR, "embeddings")
+EMBEDDINGS_DIR = os.getenv("RAG_EMBEDDINGS_DIR", os.path.join(BASE_DIR, "embeddings"))  # estado: índice, SQLite
 
-FAISS_INDEX_PATH = os.path.join(EMBEDDINGS_DIR, "faiss_index.index")
-METADATA_PATH    = os.path.join(EMBEDDINGS_DIR, "metadatos.json")
+INDEX_DIR        = os.path.join(EMBEDDINGS_DIR, "index")   # manifest + segmentos + WAL
+FAISS_INDEX_PATH = os.path.join(EMBEDDINGS_DIR, "faiss_index.index")  # formato anterior, solo para migrar
+CHUNK_STORE_PATH = os.path.join(EMBEDDINGS_DIR, "chunks.sqlite3")
+METADATA_PATH    = os.path.join(EMBEDDINGS_DIR, "metadatos.json")  # formato anterior, solo para migrar
 
 # --- Endpoints y parámetros de la API ---
 EMBED_ENDPOINT   = "https://asteroide.ing.uc.cl/api/embed"
@@ -16,12 +18,105 @@ EMBED_MODEL      = "nomic-embed-text"
 CHAT_ENDPOINT    = "https://asteroide.ing.uc.cl/v1/chat/completions"
 CHAT_MODEL       = "integracion"
 
+# — Servicios falsos locales (tests y benchmarks sin red): RAG_UPSTREAM=fake —
+# Apunta EMBED_ENDPOINT y CHAT_ENDPOINT a src.fake_upstream (vectores deterministas por hash del texto)
+UPSTREAM_MODE      = os.getenv("RAG_UPSTREAM", "live")   # "live" | "fake"
+FAKE_UPSTREAM_PORT = int(os.getenv("RAG_FAKE_UPSTREAM_PORT", "8790"))
+FAKE_UPSTREAM_URL  = f"http://127.0.0.1:{FAKE_UPSTREAM_PORT}"
+FAKE_EMBED_LATENCY = float(os.getenv("RAG_FAKE_EMBED_LATENCY", "0"))   # segundos por POST de embeddings
+FAKE_CHAT_LATENCY  = float(os.getenv("RAG_FAKE_CHAT_LATENCY", "0"))    # segundos hasta el primer token
+FAKE_TOKEN_LATENCY = float(os.getenv("RAG_FAKE_TOKEN_LATENCY", "0"))   # segundos entre tokens
+if UPSTREAM_MODE == "fake":
+    EMBED_ENDPOINT = f"{FAKE_UPSTREAM_URL}/api/embed"
+    CHAT_ENDPOINT  = f"{FAKE_UPSTREAM_URL}/v1/chat/completions"
+
 # — Parámetros FAISS y text-splitting —
 VECTOR_DIM    = 768
 TOP_K         = 6
-CHUNK_SIZE    = 100    
-CHUNK_OVERLAP = 20     
+CHUNK_SIZE    = 350      # tamaño máximo de un fragmento, en CHUNK_UNIT
+CHUNK_OVERLAP = 50       # oraciones completas repetidas del fragmento anterior, hasta este tamaño
+CHUNK_UNIT    = "chars"  # "chars" o "tokens" (estimados: palabras + signos)
 
 
 REQUEST_TIMEOUT     = 30   # segundos
-MAX_TOKENS_CONTEXT  = 512  # Límite de tokens para Llama3.2 (integracion)
+MAX_TOKENS_CONTEXT  = 512  # Límite de tokens (estimados) del contexto que se envía a Llama3.2 (integracion)
+
+# — Cliente de embeddings —
+EMBED_BATCH_SIZE      = 32    # textos por POST a /api/embed
+EMBED_MAX_CONCURRENCY = 4     # POSTs simultáneos (y tamaño del pool de conexiones)
+EMBED_MAX_RETRIES     = 3     # reintentos ante timeout, error de red, 429 o 5xx
+EMBED_RETRY_BACKOFF   = 0.5   # segundos; se duplica en cada reintento
+
+# — Caché persistente de embeddings (clave: hash de EMBED_MODEL + texto) —
+EMBED_CACHE_ENABLED     = UPSTREAM_MODE != "fake"   # los vectores falsos no entran a la caché de los reales
+EMBED_CACHE_PATH        = os.path.join(EMBEDDINGS_DIR, "embedding_cache.sqlite3")
+EMBED_CACHE_MAX_ENTRIES = 100_000   # ~3 KB por vector de 768 floats → ~300 MB en disco
+EMBED_CACHE_TOUCH_INTERVAL = 5.0    # segundos entre escrituras de last_used por hits (no en cada lookup)
+
+# — Clientes HTTP asíncronos (handlers de /query y /upload-article) —
+# Un pool de conexiones por servicio, del tamaño de su límite de concurrencia
+EMBED_ASYNC_MAX_CONCURRENCY = 32  # requests simultáneos a EMBED_ENDPOINT
+CHAT_MAX_CONCURRENCY        = 32  # requests simultáneos a CHAT_ENDPOINT
+SCRAPE_MAX_CONCURRENCY      = 8   # descargas simultáneas desde Wikipedia
+EMBED_TIMEOUT               = REQUEST_TIMEOUT
+CHAT_TIMEOUT                = REQUEST_TIMEOUT
+SCRAPE_TIMEOUT              = REQUEST_TIMEOUT
+
+# — Descarga de artículos: caché de HTML en disco + límite por host —
+HTML_CACHE_ENABLED   = True
+HTML_CACHE_PATH      = os.path.join(EMBEDDINGS_DIR, "html_cache.sqlite3")   # HTML comprimido + ETag/Last-Modified
+SCRAPE_HOST_INTERVAL = 0.1   # segundos mínimos entre requests al mismo host
+SCRAPE_USER_AGENT    = "tarea-3-rag-bot/1.0 (bulk ingestion)"
+
+# — Cola de ingesta en segundo plano (/upload-article) —
+JOBS_DB_PATH   = os.path.join(EMBEDDINGS_DIR, "jobs.sqlite3")
+INGEST_WORKERS = 2   # artículos procesados en paralelo
+JOB_EVENTS_POLL_INTERVAL = 0.5  # segundos entre eventos de /jobs/{id}/events
+DOC_REFRESH_INTERVAL = 3600.0   # re-subir un artículo revisado hace menos que esto no hace ningún request
+
+# — Varios workers de uvicorn (WEB_CONCURRENCY): todos leen el mismo índice y chunk store, escribe uno —
+WRITER_LOCK_PATH      = os.path.join(EMBEDDINGS_DIR, "writer.lock")  # flock del worker que corre la cola de ingesta
+JOBS_POLL_INTERVAL    = 1.0          # segundos entre revisiones de jobs encolados por los otros workers
+CHUNK_STORE_MMAP_SIZE = 256 * 2**20  # bytes del chunk store leídos por mmap (páginas compartidas entre procesos)
+
+# — Indexación masiva (build_index.main): pipeline leer → chunkear → embeber → indexar —
+BUILD_CHUNK_WORKERS     = max(1, (os.cpu_count() or 2) - 1)   # procesos que chunkean
+BUILD_QUEUE_SIZE        = 4       # elementos en vuelo entre etapas (acota la memoria)
+BUILD_FLUSH_EVERY       = 2_000   # fragmentos por checkpoint (segmento + chunk store)
+BUILD_PROGRESS_INTERVAL = 10.0    # segundos entre reportes de progreso
+
+# — Índice segmentado (append incremental + compactación en segundo plano) —
+COMPACT_MAX_SEGMENTS = 8   # sobre esta cantidad de segmentos se fusionan en uno base
+COMPACT_MAX_DELETED  = 5_000  # sobre esta cantidad de vectores borrados (lápidas) también se compacta
+INDEX_MMAP           = True  # leer segmentos con IO_FLAG_MMAP (IVF) y el base flat desde un .npy mapeado: una copia compartida por todos los workers
+
+# — Tipo de índice del segmento base (se elige y re-entrena al compactar) —
+INDEX_TYPE       = "auto"   # "flat" | "ivf" | "hnsw" | "auto" (flat bajo ANN_MIN_VECTORS, ivf sobre)
+ANN_MIN_VECTORS  = 50_000   # bajo esto la búsqueda exacta es suficientemente rápida
+IVF_NPROBE       = 16       # listas visitadas por query (más = mejor recall, más lento)
+HNSW_M           = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH   = 64       # candidatos explorados por query
+
+# — Vectores comprimidos en el segmento base (opt-in, para corpus que no caben en RAM) —
+INDEX_QUANTIZATION = "none"   # "none" | "sq8" (1 byte/dim) | "fp16" (2 bytes/dim) | "pq" (PQ_M bytes/vector)
+PQ_M               = 96       # sub-cuantizadores de PQ (debe dividir VECTOR_DIM)
+PQ_MIN_VECTORS     = 10_000   # bajo esto "pq" usa sq8 (PQ necesita ~39·256 vectores para entrenar)
+RERANK_FACTOR      = 4        # con compresión: re-ordena k·factor candidatos con los vectores exactos del disco (0 = no)
+
+# — Recuperación híbrida (BM25 sobre FTS5 + FAISS, fusionados con RRF) —
+HYBRID_CANDIDATES = 20   # candidatos de cada lista antes de fusionar
+RRF_K             = 60   # constante de reciprocal rank fusion
+
+# — Contexto del LLM: selección MMR entre los candidatos + fusión de fragmentos vecinos, hasta MAX_TOKENS_CONTEXT —
+CONTEXT_CANDIDATES = 12    # fragmentos recuperados entre los que se eligen hasta TOP_K
+MMR_LAMBDA         = 0.7   # 1 = solo relevancia, 0 = solo diversidad
+
+# — Métricas (/metrics, Server-Timing) —
+SLOW_REQUEST_SECONDS = 5.0   # requests más lentos que esto se loguean con sus etapas (0 = no)
+
+# — Caché de respuestas de /query (en memoria, por proceso) —
+ANSWER_CACHE_ENABLED     = True
+ANSWER_CACHE_MAX_ENTRIES = 1_000
+ANSWER_CACHE_TTL         = 3600   # segundos
+ANSWER_CACHE_SIMILARITY  = 0.95   # coseno mínimo entre preguntas para reutilizar una respuesta
@@ -0,0 +1,114 @@
+import numpy as np
+
+from typing import Dict, List, Optional, Tuple
+
+from src.config import MAX_TOKENS_CONTEXT, MMR_LAMBDA, TOP_K
+from src.chunker import count_tokens
+
+# Solapamiento mínimo (caracteres) para unir fragmentos sin offsets por su texto
+_MIN_TEXT_OVERLAP = 10
+
+
+def mmr_order(relevance: np.ndarray, vectors: np.ndarray, lambda_: float = MMR_LAMBDA) -> List[int]:
+    """
+    Candidate positions in maximal marginal relevance order: each step takes
+    the one maximizing λ·relevance − (1−λ)·(max cosine to those already
+    taken). The pairwise similarities are computed once, as a matrix.
+    """
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    sim = unit @ unit.T
+    remaining = np.ones(len(relevance), dtype=bool)
+    redundancy = np.zeros(len(relevance), dtype="float32")
+    order = []
+    for _ in range(len(relevance)):
+        scores = np.where(remaining, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        pick = int(np.argmax(scores))
+        order.append(pick)
+        remaining[pick] = False
+        redundancy = np.maximum(redundancy, sim[pick])
+    return order
+
+
+def _text_overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b` (0 if shorter than _MIN_TEXT_OVERLAP)."""
+    for k in range(min(len(a), len(b)), _MIN_TEXT_OVERLAP - 1, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+def _follows(passage: Dict, chunk: Dict) -> bool:
+    if chunk["chunk_id"] == passage["last_chunk_id"] + 1:
+        return True
+    return passage["end"] is not None and chunk.get("start") is not None and chunk["start"] <= passage["end"]
+
+
+def _extend(passage: Dict, chunk: Dict) -> None:
+    start, end = chunk.get("start"), chunk.get("end")
+    if passage["end"] is not None and start is not None:
+        # Offsets en el artículo: lo compartido es exactamente [start, passage.end)
+        shared = passage["end"] - start
+        if shared < 0:
+            passage["text"] += " " + chunk["text"]
+        elif shared < len(chunk["text"]):
+            passage["text"] += chunk["text"][shared:]
+        passage["end"] = max(passage["end"], end)
+    else:
+        passage["text"] += " " + chunk["text"][_text_overlap(passage["text"], chunk["text"]):].lstrip()
+        passage["end"] = None
+    passage["ids"].append(chunk["id"])
+    passage["last_chunk_id"] = max(passage["last_chunk_id"], chunk["chunk_id"])
+
+
+def merge_adjacent(chunks: List[Dict]) -> List[Dict]:
+    """
+    Join chunks of the same document that are consecutive (`chunk_id`) or
+    overlap (`start`/`end` offsets) into one passage in document order,
+    keeping the text they share once. Passages ({"doc_id", "ids", "text"})
+    come out in the order of their earliest chunk in `chunks`.
+    """
+    rank = {c["id"]: r for r, c in enumerate(chunks)}
+    by_doc: Dict[str, List[Dict]] = {}
+    for c in chunks:
+        by_doc.setdefault(c["doc_id"], []).append(c)
+
+    passages = []
+    for doc_id, doc_chunks in by_doc.items():
+        current: Optional[Dict] = None
+        for c in sorted(doc_chunks, key=lambda c: c["chunk_id"]):
+            if current is not None and _follows(current, c):
+                _extend(current, c)
+                continue
+            current = {"doc_id": doc_id, "ids": [c["id"]], "text": c["text"],
+                       "last_chunk_id": c["chunk_id"], "end": c.get("end")}
+            passages.append(current)
+    passages.sort(key=lambda p: min(rank[i] for i in p["ids"]))
+    return [{"doc_id": p["doc_id"], "ids": p["ids"], "text": p["text"]} for p in passages]
+
+
+def context_tokens(passages: List[Dict]) -> int:
+    return sum(count_tokens(p["text"]) for p in passages)
+
+
+def pack_context(chunks: List[Dict], vectors: np.ndarray, budget: int = MAX_TOKENS_CONTEXT,
+                 max_chunks: int = TOP_K, lambda_: float = MMR_LAMBDA) -> Tuple[List[Dict], List[str]]:
+    """
+    Choose the prompt context among retrieved `chunks` (best first, with
+    their embeddings in `vectors`): candidates are taken in MMR order, with
+    relevance decaying linearly with the retrieval rank, and each is kept
+    only if the merged passages still fit in `budget` estimated tokens; at
+    most `max_chunks` are kept. The best chunk is always included.
+    Returns (chosen chunks, passage texts).
+    """
+    if not chunks:
+        return [], []
+    relevance = 1.0 - np.arange(len(chunks), dtype="float32") / len(chunks)
+    chosen: List[Dict] = []
+    for i in mmr_order(relevance, vectors, lambda_):
+        if len(chosen) == max_chunks:
+            break
+        # Un vecino de algo ya elegido cuesta solo su texto nuevo
+        if chosen and context_tokens(merge_adjacent(chosen + [chunks[i]])) > budget:
+            continue
+        chosen.append(chunks[i])
+    return chosen, [p["text"] for p in merge_adjacent(chosen)]
@@ -0,0 +1,150 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+from typing import Callable, Dict, List, Optional, Set
+
+from src.config import (
+    EMBED_MODEL,
+    VECTOR_DIM,
+    EMBED_CACHE_PATH,
+    EMBED_CACHE_MAX_ENTRIES,
+    EMBED_CACHE_TOUCH_INTERVAL
+)
+from src.metrics import CACHE_LOOKUPS
+
+
+def cache_key(text: str, model: str = EMBED_MODEL) -> bytes:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed, content-addressed cache of embedding vectors.
+
+    Rows are keyed by sha256(model, text) and hold the raw float32 bytes of
+    the vector (3 KB for 768-d). Hits refresh a logical clock kept in the
+    table itself (MAX(last_used) + 1), so every process sharing the file
+    (uvicorn workers) orders rows on the same clock. Hits are written in
+    batches, at most every `touch_interval` seconds or with the next insert,
+    so lookups don't queue on SQLite's write lock. When an insert leaves
+    more than `max_entries` rows, the least recently used are evicted in
+    the same transaction. `hits` / `misses` count lookups made by this process.
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH,
+                 max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+                 model: str = EMBED_MODEL,
+                 dim: int = VECTOR_DIM,
+                 touch_interval: float = EMBED_CACHE_TOUCH_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.model = model
+        self.dim = dim
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched: Set[bytes] = set()   # hits aún no escritos en last_used
+        self._last_touch = time.monotonic()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up several texts at once; misses come back as None."""
+        keys = [cache_key(t, self.model) for t in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            # SQLite limita la cantidad de parámetros por sentencia
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                marks = ",".join("?" * len(part))
+                for key, blob in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", part
+                ):
+                    found[key] = np.frombuffer(blob, dtype="float32")
+            self._touched.update(found)
+            if self._touched and time.monotonic() - self._last_touch >= self.touch_interval:
+                self._write()
+            result = [found.get(k) for k in keys]
+            hits = sum(v is not None for v in result)
+            self.hits += hits
+            self.misses += len(result) - hits
+        CACHE_LOOKUPS.inc(hits, cache="embedding", result="hit")
+        CACHE_LOOKUPS.inc(len(result) - hits, cache="embedding", result="miss")
+        return result
+
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        vectors = np.asarray(vectors, dtype="float32")
+
+        def insert(clock: int) -> None:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings(key, vector, last_used) VALUES (?, ?, ?)",
+                [(cache_key(t, self.model), vectors[i].tobytes(), clock) for i, t in enumerate(texts)]
+            )
+            # Conteo de la tabla compartida, no de este proceso: los otros workers también insertan
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                # Deja un margen del 10% para no evictar en cada inserción
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (count - int(self.max_entries * 0.9),)
+                )
+
+        with self._lock:
+            self._write(insert)
+
+    def _write(self, body: Optional[Callable[[int], None]] = None) -> None:
+        """
+        One write transaction: pending hits get the next tick of the shared
+        clock, then `body(clock)` runs with that same tick. Caller holds `_lock`.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            clock = self._conn.execute("SELECT COALESCE(MAX(last_used), 0) + 1 FROM embeddings").fetchone()[0]
+            if self._touched:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(clock, k) for k in self._touched]
+                )
+            if body is not None:
+                body(clock)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        self._touched.clear()
+        self._last_touch = time.monotonic()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._touched:
+                self._write()
+            self._conn.close()
@@ -0,0 +1,272 @@
+import time
+import asyncio
+import threading
+import httpx
+import requests
+import numpy as np
+
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from src.config import (
+    EMBED_ENDPOINT,
+    EMBED_MODEL,
+    VECTOR_DIM,
+    REQUEST_TIMEOUT,
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_CONCURRENCY,
+    EMBED_MAX_RETRIES,
+    EMBED_RETRY_BACKOFF,
+    EMBED_CACHE_ENABLED
+)
+from src.embedding_cache import EmbeddingCache
+from src.async_upstream import upstreams
+from src.metrics import UPSTREAM_ERRORS
+
+
+class EmbeddingError(RuntimeError):
+    """Raised when the embedding service cannot produce vectors for a batch."""
+
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def _parse_embeddings(data, expected: int, dim: int) -> List[List[float]]:
+    embeddings = data.get("embeddings") if isinstance(data, dict) else None
+    if not isinstance(embeddings, list):
+        raise EmbeddingError(f"[Embedding] Unexpected response format: {data}")
+    if len(embeddings) != expected:
+        raise EmbeddingError(
+            f"[Embedding] Expected {expected} embeddings, got {len(embeddings)}"
+        )
+    for vec in embeddings:
+        if len(vec) != dim:
+            raise EmbeddingError(
+                f"[Embedding] Expected dimension {dim}, got {len(vec)}"
+            )
+    return embeddings
+
+
+class EmbeddingClient:
+    """
+    Client for the `/api/embed` endpoint.
+
+    Texts are sent in batches of `batch_size` per POST over a keep-alive
+    `requests.Session`; up to `max_concurrency` batches are in flight at once.
+    Transient failures (network errors, timeouts, 429/5xx) are retried with
+    exponential backoff; once retries are exhausted an `EmbeddingError` is
+    raised instead of returning placeholder vectors.
+
+    If a `cache` is given, `embed()` only sends the texts it does not
+    already hold and stores the new vectors afterwards.
+    """
+
+    def __init__(self,
+                 endpoint: str = EMBED_ENDPOINT,
+                 model: str = EMBED_MODEL,
+                 batch_size: int = EMBED_BATCH_SIZE,
+                 max_concurrency: int = EMBED_MAX_CONCURRENCY,
+                 max_retries: int = EMBED_MAX_RETRIES,
+                 retry_backoff: float = EMBED_RETRY_BACKOFF,
+                 timeout: float = REQUEST_TIMEOUT,
+                 dim: int = VECTOR_DIM,
+                 cache: Optional[EmbeddingCache] = None):
+        self.endpoint = endpoint
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.dim = dim
+        self.cache = cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="embed"
+                )
+            return self._executor
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed a single batch with one POST (plus retries)."""
+        payload = {"model": self.model, "input": list(texts)}
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+                UPSTREAM_ERRORS.inc(upstream="embed", reason="retry")
+            try:
+                resp = self.session.post(self.endpoint, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                last_error = e
+                continue
+            if resp.status_code in _RETRY_STATUS:
+                last_error = f"HTTP {resp.status_code}"
+                continue
+            try:
+                resp.raise_for_status()
+                data = resp.json()
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(upstream="embed", reason="bad_response")
+                raise EmbeddingError(f"[Embedding] Request failed: {e}") from e
+            return _parse_embeddings(data, len(texts), self.dim)
+
+        UPSTREAM_ERRORS.inc(upstream="embed", reason="gave_up")
+        raise EmbeddingError(
+            f"[Embedding] Giving up after {self.max_retries + 1} attempts "
+            f"({len(texts)} texts): {last_error}"
+        )
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed any number of texts, returning a float32 array of shape (len(texts), dim)
+        in the same order as the input.
+        """
+        if not texts:
+            return np.empty((0, self.dim), dtype="float32")
+        if self.cache is None:
+            return self._embed_remote(texts)
+
+        cached = self.cache.get_many(texts)
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        missing = {}
+        for i, (t, v) in enumerate(zip(texts, cached)):
+            if v is None:
+                missing.setdefault(t, []).append(i)
+            else:
+                out[i] = v
+        if missing:
+            pending = list(missing)
+            vectors = self._embed_remote(pending)
+            self.cache.put_many(pending, vectors)
+            for t, v in zip(pending, vectors):
+                out[missing[t]] = v
+        return out
+
+    def _embed_remote(self, texts: List[str]) -> np.ndarray:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            results = [self.embed_batch(batches[0])]
+        else:
+            results = list(self._pool().map(self.embed_batch, batches))
+        return np.asarray([v for batch in results for v in batch], dtype="float32")
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+class AsyncEmbeddingClient:
+    """
+    Async counterpart of `EmbeddingClient` for the request handlers.
+
+    Requests go through the shared httpx pool in `src.async_upstream`, so the
+    `embed` concurrency limit applies across all in-flight requests of the
+    process. Batching, retries and cache semantics match the sync client.
+    """
+
+    def __init__(self,
+                 endpoint: str = EMBED_ENDPOINT,
+                 model: str = EMBED_MODEL,
+                 batch_size: int = EMBED_BATCH_SIZE,
+                 max_retries: int = EMBED_MAX_RETRIES,
+                 retry_backoff: float = EMBED_RETRY_BACKOFF,
+                 dim: int = VECTOR_DIM,
+                 cache: Optional[EmbeddingCache] = None):
+        self.endpoint = endpoint
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.dim = dim
+        self.cache = cache
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        payload = {"model": self.model, "input": list(texts)}
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+                UPSTREAM_ERRORS.inc(upstream="embed", reason="retry")
+            try:
+                resp = await upstreams.post_json("embed", self.endpoint, payload)
+            except httpx.HTTPError as e:
+                last_error = e
+                continue
+            if resp.status_code in _RETRY_STATUS:
+                last_error = f"HTTP {resp.status_code}"
+                continue
+            try:
+                resp.raise_for_status()
+                data = resp.json()
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(upstream="embed", reason="bad_response")
+                raise EmbeddingError(f"[Embedding] Request failed: {e}") from e
+            return _parse_embeddings(data, len(texts), self.dim)
+
+        UPSTREAM_ERRORS.inc(upstream="embed", reason="gave_up")
+        raise EmbeddingError(
+            f"[Embedding] Giving up after {self.max_retries + 1} attempts "
+            f"({len(texts)} texts): {last_error!r}"
+        )
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dim), dtype="float32")
+
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        missing = {}
+        cached = await asyncio.to_thread(self.cache.get_many, texts) if self.cache else [None] * len(texts)
+        for i, (t, v) in enumerate(zip(texts, cached)):
+            if v is None:
+                missing.setdefault(t, []).append(i)
+            else:
+                out[i] = v
+        if missing:
+            pending = list(missing)
+            batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            results = await asyncio.gather(*(self.embed_batch(b) for b in batches))
+            vectors = np.asarray([v for batch in results for v in batch], dtype="float32")
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put_many, pending, vectors)
+            for t, v in zip(pending, vectors):
+                out[missing[t]] = v
+        return out
+
+
+_default_client: Optional[EmbeddingClient] = None
+_default_async_client: Optional[AsyncEmbeddingClient] = None
+_default_lock = threading.Lock()
+
+
+def get_embedding_client() -> EmbeddingClient:
+    """Process-wide client, so every caller shares the same connection pool."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            cache = EmbeddingCache() if EMBED_CACHE_ENABLED else None
+            _default_client = EmbeddingClient(cache=cache)
+        return _default_client
+
+
+def get_async_embedding_client() -> AsyncEmbeddingClient:
+    """Process-wide async client; shares the on-disk cache with the sync one."""
+    global _default_async_client
+    cache = get_embedding_client().cache
+    with _default_lock:
+        if _default_async_client is None:
+            _default_async_client = AsyncEmbeddingClient(cache=cache)
+        return _default_async_client
@@ -0,0 +1,214 @@
+import re
+import json
+import time
+import socket
+import hashlib
+import threading
+import numpy as np
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+from urllib.parse import unquote
+
+from src.config import (
+    VECTOR_DIM,
+    FAKE_UPSTREAM_PORT,
+    FAKE_EMBED_LATENCY,
+    FAKE_CHAT_LATENCY,
+    FAKE_TOKEN_LATENCY
+)
+
+_WORDS = ("river mountain history city science music language empire species energy "
+          "market island theory festival railway climate village protein galaxy harbor").split()
+
+
+def fake_embedding(text: str, dim: int = VECTOR_DIM) -> List[float]:
+    """Deterministic unit vector derived from a hash of the text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype("float32")
+    return (vec / np.linalg.norm(vec)).tolist()
+
+
+def fake_article(title: str, paragraphs: int = 40) -> str:
+    """Deterministic Wikipedia-like HTML page (#bodyContent with `paragraphs` <p>) for `title`."""
+    seed = int.from_bytes(hashlib.sha256(title.encode("utf-8")).digest()[:8], "little")
+    rng = np.random.default_rng(seed)
+    body = []
+    for _ in range(paragraphs):
+        sentences = [f"{title} {' '.join(rng.choice(_WORDS, rng.integers(6, 14)))}."
+                     for _ in range(rng.integers(2, 5))]
+        body.append(f"<p>{' '.join(sentences)}[{rng.integers(1, 99)}]</p>")
+    return (f"<html><body><div id='mw-navigation'><p>Main menu</p></div>"
+            f"<div id='bodyContent'>{''.join(body)}</div></body></html>")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para que los clientes puedan reutilizar la conexión (keep-alive)
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # Los tokens en streaming son writes pequeños: sin Nagle salen de inmediato
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send_json(self, status: int, body: dict) -> None:
+        self._send(status, json.dumps(body).encode("utf-8"), "application/json")
+
+    def _send(self, status: int, raw: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(raw)))
+        # Cabeceras y cuerpo en un solo write: evita la espera de Nagle + delayed ACK
+        self._headers_buffer.append(b"\r\n")
+        self._headers_buffer.append(raw)
+        self.flush_headers()
+
+    def do_POST(self):
+        srv = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        with srv.lock:
+            srv.requests += 1
+            fail = srv.fail_next > 0
+            if fail:
+                srv.fail_next -= 1
+        if fail:
+            self._send_json(503, {"error": "injected failure"})
+            return
+
+        if self.path == "/api/embed":
+            inputs = payload.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            time.sleep(srv.latency + srv.per_item_latency * len(inputs))
+            self._send_json(200, {
+                "model": payload.get("model"),
+                "embeddings": [fake_embedding(t, srv.dim) for t in inputs],
+            })
+        elif self.path == "/v1/chat/completions":
+            tokens = re.findall(r"\S+\s*", srv.answer)
+            if payload.get("stream"):
+                self._stream_tokens(tokens)
+                return
+            # Sin streaming la respuesta sale recién cuando se generó el último token
+            time.sleep(srv.chat_delay + srv.token_latency * len(tokens))
+            self._send_json(200, {
+                "choices": [{"message": {"role": "assistant", "content": srv.answer}}],
+            })
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_GET(self):
+        srv = self.server
+        if not self.path.startswith("/wiki/"):
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        with srv.lock:
+            srv.requests += 1
+        title = unquote(self.path[len("/wiki/"):]).replace("_", " ")
+        self._send(200, fake_article(title, srv.article_paragraphs).encode("utf-8"), "text/html; charset=utf-8")
+
+    def _stream_tokens(self, tokens: List[str]) -> None:
+        """OpenAI-style `stream: true` response: one SSE chunk per token, then [DONE]."""
+        srv = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(data: str) -> None:
+            raw = data.encode("utf-8")
+            self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+            self.wfile.flush()
+
+        time.sleep(srv.chat_delay)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(srv.token_latency)
+            delta = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            chunk(f"data: {json.dumps(delta)}\n\n")
+        chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the embedding (`/api/embed`) and chat
+    (`/v1/chat/completions`) services, with configurable latency and
+    failure injection (`fail_next` requests answer 503). The chat answer
+    is "generated" at `token_latency` seconds per token after
+    `chat_latency` (default: `latency`), and is streamed token by token
+    when the request asks for `stream`. `GET /wiki/<title>` serves a
+    deterministic article page, so ingestion can run offline too.
+    """
+    daemon_threads = True
+    # El backlog por defecto (5) descarta conexiones bajo carga concurrente
+    request_queue_size = 256
+
+    def __init__(self, port: int = 0, latency: float = 0.0, per_item_latency: float = 0.0,
+                 dim: int = VECTOR_DIM, answer: str = "This is a fake answer.",
+                 token_latency: float = 0.0, chat_latency: Optional[float] = None,
+                 article_paragraphs: int = 40):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.dim = dim
+        self.answer = answer
+        self.token_latency = token_latency
+        self.chat_latency = chat_latency
+        self.article_paragraphs = article_paragraphs
+        self.fail_next = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def chat_delay(self) -> float:
+        return self.latency if self.chat_latency is None else self.chat_latency
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_upstream(**kwargs) -> Tuple[FakeUpstreamServer, str]:
+    """Start a fake upstream in a daemon thread; returns (server, base_url)."""
+    server = FakeUpstreamServer(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.base_url
+
+
+_shared: Optional[FakeUpstreamServer] = None
+_shared_lock = threading.Lock()
+
+
+def ensure_fake_upstream() -> None:
+    """
+    Serve the fake upstream on FAKE_UPSTREAM_PORT (where RAG_UPSTREAM=fake
+    points the endpoints) from a daemon thread of this process, unless it
+    is already running here or another process is listening on that port.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is not None:
+            return
+        try:
+            _shared = FakeUpstreamServer(port=FAKE_UPSTREAM_PORT, latency=FAKE_EMBED_LATENCY,
+                                         chat_latency=FAKE_CHAT_LATENCY, token_latency=FAKE_TOKEN_LATENCY)
+        except OSError:
+            # Puerto ocupado: ya hay uno corriendo aparte (python -m src.fake_upstream)
+            return
+        threading.Thread(target=_shared.serve_forever, daemon=True).start()
+    print(f"[Fake] Embeddings y chat falsos en {_shared.base_url}")
+
+
+if __name__ == "__main__":
+    server = FakeUpstreamServer(port=FAKE_UPSTREAM_PORT, latency=FAKE_EMBED_LATENCY,
+                                chat_latency=FAKE_CHAT_LATENCY, token_latency=FAKE_TOKEN_LATENCY)
+    print(f"[Fake] Embeddings y chat falsos en {server.base_url} (Ctrl+C para salir)")
+    server.serve_forever()
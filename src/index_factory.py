@@ -0,0 +1,192 @@
+import math
+import faiss
+import numpy as np
+
+from typing import Optional
+
+from src.config import (
+    INDEX_TYPE,
+    ANN_MIN_VECTORS,
+    IVF_NPROBE,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    INDEX_QUANTIZATION,
+    PQ_M,
+    PQ_MIN_VECTORS
+)
+
+FLAT, IVF, HNSW = "flat", "ivf", "hnsw"
+NONE, SQ8, FP16, PQ = "none", "sq8", "fp16", "pq"
+
+# Vectores de entrenamiento por lista IVF (FAISS advierte bajo 39)
+_TRAIN_PER_LIST = 50
+# Muestra para entrenar SQ8/PQ (PQ: 256 centroides por sub-cuantizador)
+_TRAIN_QUANTIZER = 20_000
+_ADD_BLOCK = 65_536
+
+
+def choose_index_type(n: int, index_type: str = INDEX_TYPE) -> str:
+    """Index kind for a base segment holding `n` vectors."""
+    if index_type != "auto":
+        return index_type
+    return FLAT if n < ANN_MIN_VECTORS else IVF
+
+
+def choose_quantization(n: int, quantization: str = INDEX_QUANTIZATION) -> str:
+    """Vector encoding for a base of `n` vectors; PQ falls back to SQ8 below PQ_MIN_VECTORS."""
+    if quantization == PQ and n < PQ_MIN_VECTORS:
+        return SQ8
+    return quantization
+
+
+def ivf_nlist(n: int) -> int:
+    return max(1, int(math.sqrt(n)))
+
+
+def unwrap(index: faiss.Index) -> faiss.Index:
+    """The index that stores the vectors, under an IndexIDMap2 wrapper if there is one."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_kind(index: faiss.Index) -> str:
+    index = unwrap(index)
+    if isinstance(index, faiss.IndexIVF):
+        return IVF
+    if isinstance(index, faiss.IndexHNSW):
+        return HNSW
+    return FLAT
+
+
+def index_quantization(index: faiss.Index) -> str:
+    index = unwrap(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return FP16 if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else SQ8
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return PQ
+    return NONE
+
+
+def _encoding(quantization: str) -> str:
+    """Encoding part of a faiss factory string."""
+    if quantization == PQ:
+        # "np": sin entrenamiento polisémico (no se usa y multiplica el tiempo de entrenar)
+        return f"PQ{PQ_M}np"
+    return {SQ8: "SQ8", FP16: "SQfp16"}[quantization]
+
+
+def new_index(kind: str, dim: int, n: int, quantization: str = NONE) -> faiss.Index:
+    """
+    Empty (possibly untrained) index of the given kind sized for `n`
+    vectors, storing them raw or compressed per `quantization`.
+    """
+    if quantization != NONE:
+        encoding = _encoding(quantization)
+        if kind == IVF:
+            return faiss.index_factory(dim, f"IVF{ivf_nlist(n)},{encoding}")
+        if kind == HNSW:
+            index = faiss.index_factory(dim, f"HNSW{HNSW_M}_{encoding}")
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            return index
+        return faiss.index_factory(dim, encoding)
+    if kind == IVF:
+        return faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, ivf_nlist(n))
+    if kind == HNSW:
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+    return faiss.IndexFlatL2(dim)
+
+
+def needs_retrain(index: faiss.Index, n: int, index_type: str = INDEX_TYPE,
+                  quantization: str = INDEX_QUANTIZATION) -> bool:
+    """
+    Whether a base index cannot simply be extended to `n` vectors: the tier
+    or the encoding changed, or IVF lists trained for a much smaller corpus
+    (nlist ∝ √n, so doubling nlist means the corpus grew ~4x) would get too long.
+    """
+    if index_kind(index) != choose_index_type(n, index_type):
+        return True
+    if index_quantization(index) != choose_quantization(n, quantization):
+        return True
+    return index_kind(index) == IVF and ivf_nlist(n) >= 2 * unwrap(index).nlist
+
+
+def configure(index: faiss.Index) -> faiss.Index:
+    """Apply the runtime search knobs from config to a loaded index."""
+    kind, inner = index_kind(index), unwrap(index)
+    if kind == IVF:
+        inner.nprobe = IVF_NPROBE
+    elif kind == HNSW:
+        inner.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def build_base(view, previous: Optional[faiss.Index] = None, index_type: str = INDEX_TYPE,
+               quantization: str = INDEX_QUANTIZATION) -> faiss.Index:
+    """
+    Build the index for a compacted base segment holding every live vector
+    of `view` (an IndexView whose ids start at 0), i.e. without the ids it
+    marks as deleted.
+
+    If `previous` (the current base, first part of the view) is still the
+    right tier and encoding it is cloned, deleted vectors are dropped with
+    `remove_ids` (IVF/HNSW: refilled with the same training) and only the
+    newer vectors are added; otherwise a new index
+    is created and, for IVF and SQ8/PQ, trained on a random sample. Once ids
+    have holes the base is an IndexIDMap2, so search results and
+    reconstruction keep using the ids the chunk store knows. Vectors are
+    read with `view.reconstruct_ids`, i.e. at full precision even when the
+    previous base is compressed.
+    """
+    live = view.live_ids()
+    n = len(live)
+    holes = n < view.ntotal
+    if previous is not None and not needs_retrain(previous, n, index_type, quantization):
+        base = faiss.clone_index(previous)
+        kept = view.part_ids(0)
+        gone = np.intersect1d(kept, view.deleted)
+        mapped = isinstance(base, faiss.IndexIDMap)
+        if (holes and not mapped) or (len(gone) and index_kind(base) != FLAT):
+            # Sin mapa de ids, o IVF/HNSW (no compactan sus ids internos al
+            # borrar): se vacía y se vuelve a llenar, conservando el entrenamiento
+            base.reset()
+            kept = kept[:0]
+        elif len(gone):
+            base.remove_ids(faiss.IDSelectorBatch(gone))
+        todo = live[np.searchsorted(live, kept[-1], side="right"):] if len(kept) else live
+        if holes and not isinstance(base, faiss.IndexIDMap):
+            base = faiss.IndexIDMap2(base)
+    else:
+        kind = choose_index_type(n, index_type)
+        encoding = choose_quantization(n, quantization)
+        base = new_index(kind, view.dim, n, encoding)
+        todo = live
+        if not base.is_trained:
+            size = _TRAIN_PER_LIST * base.nlist if kind == IVF else 0
+            if encoding in (SQ8, PQ):
+                size = max(size, _TRAIN_QUANTIZER)
+            size = min(n, size)
+            sample = np.sort(np.random.default_rng(0).choice(live, size, replace=False))
+            base.train(view.reconstruct_ids(sample))
+            nlist = f" nlist={base.nlist}" if kind == IVF else ""
+            print(f"[Index] Entrenado {kind}/{encoding}{nlist} con {size} vectores.")
+        if holes:
+            base = faiss.IndexIDMap2(base)
+
+    # Por bloques, para no tener todos los vectores en memoria a la vez
+    for lo in range(0, len(todo), _ADD_BLOCK):
+        ids = todo[lo:lo + _ADD_BLOCK]
+        if isinstance(base, faiss.IndexIDMap):
+            base.add_with_ids(view.reconstruct_ids(ids), ids)
+        else:
+            base.add(view.reconstruct_ids(ids))
+
+    if index_kind(base) == IVF:
+        # reconstruct_n (búsqueda por documento, compactaciones) necesita el mapa directo
+        unwrap(base).make_direct_map()
+    return base
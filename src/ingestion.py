@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import threading
+import numpy as np
+
+from typing import Callable, Dict, List, Tuple
+
+from src.config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNK_UNIT,
+    EMBED_BATCH_SIZE,
+    EMBED_ASYNC_MAX_CONCURRENCY
+)
+from src.utils import (
+    scrape_wikipedia_article_async,
+    save_text_to_file,
+    generate_embeddings_nomic_async
+)
+from src.chunker import Chunk, chunk_text
+from src.segment_index import SegmentedIndex, segmented_index
+from src.retrieval_store import retrieval_store
+from src.chunk_store import ChunkStore, chunk_store
+from src.answer_cache import answer_cache
+from src.metrics import span
+
+# Serializa el diff contra los fragmentos guardados + append/borrado entre workers
+_index_write_lock = threading.Lock()
+
+ProgressFn = Callable[[str, float], None]
+
+
+def content_hash(text: str) -> str:
+    """Hash of an article's text and the chunking settings (changing them must re-chunk it)."""
+    key = f"{CHUNK_UNIT}:{CHUNK_SIZE}:{CHUNK_OVERLAP}\n{text}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _chunk_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def diff_chunks(stored: List[Dict], chunks: List[Chunk]) -> Tuple[Dict[int, int], List[int], List[int]]:
+    """
+    Match a document's new chunks against its stored ones by content hash.
+    Returns (reused: chunk position -> stored id, positions that need an
+    embedding, stored ids no longer present). Repeated texts pair up one to one.
+    """
+    by_hash: Dict[str, List[int]] = {}
+    for row in stored:
+        by_hash.setdefault(_chunk_hash(row["text"]), []).append(row["id"])
+    reused, changed = {}, []
+    for i, c in enumerate(chunks):
+        ids = by_hash.get(_chunk_hash(c.text))
+        if ids:
+            reused[i] = ids.pop(0)
+        else:
+            changed.append(i)
+    stale = sorted(i for ids in by_hash.values() for i in ids)
+    return reused, changed, stale
+
+
+def replace_document_chunks(index: SegmentedIndex, store: ChunkStore, doc_id: str, url: str, digest: str,
+                            chunks: List[Chunk], vectors: Dict[int, np.ndarray]) -> int:
+    """
+    Make the version of a document stored in `index`/`store` match `chunks`.
+    Chunks whose text is already stored keep their id and vector; `vectors`
+    (by chunk position) are appended for the changed ones and vectors of
+    chunks that disappeared are deleted from the index. Returns the number
+    of chunks added.
+    """
+    with _index_write_lock:
+        # Se recalcula con el lock: otro job pudo cambiar el documento mientras se embebía
+        reused, changed, stale = diff_chunks(store.doc_chunks(doc_id), chunks)
+        if any(i not in vectors for i in changed):
+            raise RuntimeError("Article changed while it was being embedded; retry the upload.")
+
+        # Primero el índice (un segmento nuevo, O(fragmentos cambiados)): si el
+        # proceso muere antes de guardar los textos, quedan vectores huérfanos
+        # (se ignoran al buscar) y el job se reintenta
+        start_id = index.append(np.array([vectors[i] for i in changed], dtype="float32"))
+        store.replace_document(
+            doc_id, url, digest, start_id,
+            [{"doc_id": doc_id, "chunk_id": i, "text": chunks[i].text,
+              "start": chunks[i].start, "end": chunks[i].end} for i in changed],
+            [{"id": reused[i], "chunk_id": i, "start": chunks[i].start, "end": chunks[i].end} for i in reused],
+            stale
+        )
+        # Después los borrados: sus textos ya no están, así que aunque el proceso
+        # muera aquí ninguna búsqueda devuelve la versión vieja
+        index.remove(stale)
+    return len(changed)
+
+
+def update_document(doc_id: str, url: str, digest: str, chunks: List[Chunk],
+                    vectors: Dict[int, np.ndarray]) -> int:
+    """`replace_document_chunks` on the served index, then refresh what depends on it."""
+    added = replace_document_chunks(segmented_index, chunk_store, doc_id, url, digest, chunks, vectors)
+    # Carga solo el segmento nuevo para que la próxima query no espere
+    retrieval_store.snapshot()
+    # Las respuestas cacheadas sobre este documento ya no reflejan su contenido
+    answer_cache.invalidate_docs([doc_id])
+    return added
+
+
+async def ingest_article(url: str, doc_id: str, report: ProgressFn) -> int:
+    """
+    Full upload pipeline: scrape → chunk → embed → index.
+    `report(stage, fraction)` is called as the job advances.
+
+    Re-ingesting a document is incremental: if its text did not change it
+    stops right after scraping (no embedding calls), otherwise only the
+    chunks whose text changed are embedded. Returns the chunks added.
+    """
+    report("scraping", 0.0)
+    try:
+        texto = await scrape_wikipedia_article_async(url)
+    except Exception as e:
+        raise RuntimeError(f"Error scraping article: {e}")
+    digest = content_hash(texto)
+    doc = await asyncio.to_thread(chunk_store.document, doc_id)
+    if doc is not None and doc["content_hash"] == digest:
+        await asyncio.to_thread(chunk_store.touch_document, doc_id)
+        return 0
+    try:
+        await asyncio.to_thread(save_text_to_file, texto, f"{doc_id}.txt")
+    except Exception as e:
+        raise RuntimeError(f"Error saving file: {e}")
+
+    report("chunking", 0.0)
+    with span("chunk"):
+        chunks = await asyncio.to_thread(chunk_text, texto)
+        stored = await asyncio.to_thread(chunk_store.doc_chunks, doc_id)
+        _, changed, _ = diff_chunks(stored, chunks)
+
+    report("embedding", 0.0)
+    step = EMBED_BATCH_SIZE * EMBED_ASYNC_MAX_CONCURRENCY
+    vectors: Dict[int, np.ndarray] = {}
+    for i in range(0, len(changed), step):
+        batch = changed[i:i + step]
+        vectors.update(zip(batch, await generate_embeddings_nomic_async([chunks[j].text for j in batch])))
+        report("embedding", min(1.0, (i + step) / len(changed)))
+
+    report("indexing", 0.0)
+    try:
+        with span("index_write"):
+            return await asyncio.to_thread(update_document, doc_id, url, digest, chunks, vectors)
+    except Exception as e:
+        raise RuntimeError(f"Error indexing article: {e}")
@@ -0,0 +1,262 @@
+import os
+import time
+import uuid
+import fcntl
+import asyncio
+import sqlite3
+import threading
+
+from typing import Dict, List, Optional, Set
+
+from src.config import JOBS_DB_PATH, INGEST_WORKERS, WRITER_LOCK_PATH, JOBS_POLL_INTERVAL
+from src.ingestion import ingest_article
+
+# Estados de un job de ingesta
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+_COLUMNS = ("job_id", "url", "doc_id", "status", "stage", "progress",
+            "chunks_indexed", "error", "created_at", "updated_at")
+
+
+class JobStore:
+    """
+    SQLite-backed record of ingestion jobs.
+    Queued jobs are durable, so they survive a process restart.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, url TEXT NOT NULL, doc_id TEXT NOT NULL,"
+            " status TEXT NOT NULL, stage TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0,"
+            " chunks_indexed INTEGER, error TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_doc ON jobs(doc_id, created_at)")
+
+    def create(self, url: str, doc_id: str) -> Dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs(job_id, url, doc_id, status, stage, progress, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, 0, ?, ?)",
+                (job_id, url, doc_id, QUEUED, QUEUED, now, now)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    def update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        sets = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {sets} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def latest_for_doc(self, doc_id: str) -> Optional[Dict]:
+        """Most recent job for a document, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE doc_id = ? ORDER BY created_at DESC LIMIT 1",
+                (doc_id,)
+            ).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    def claim(self, job_id: str) -> bool:
+        """Mark a queued job as running; False if it is not queued (e.g. another process took it)."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                (RUNNING, time.time(), job_id, QUEUED)
+            )
+        return cur.rowcount == 1
+
+    def queued(self) -> List[str]:
+        """Ids of queued jobs, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def requeue_interrupted(self) -> List[str]:
+        """
+        Put jobs left `running` by a previous process back in the queue and
+        return every pending job id, oldest first.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, progress = 0 WHERE status = ?",
+                (QUEUED, QUEUED, RUNNING)
+            )
+        return self.queued()
+
+
+class WriterLock:
+    """
+    Elects the single writer among processes sharing the index (uvicorn
+    workers): whoever holds this flock runs the ingestion queue, the rest
+    only record jobs and serve queries. Held until `release` or process
+    exit, so if the writer dies another process can take over.
+    """
+
+    def __init__(self, path: str = WRITER_LOCK_PATH):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        """Try to become the writer without blocking; True if this process is it."""
+        with self._lock:
+            if self._file is not None:
+                return True
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            f = open(self.path, "a+")
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                return False
+            self._file = f
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()  # libera el flock
+                self._file = None
+
+
+class IngestionQueue:
+    """
+    Pool of asyncio workers that run `ingest_article` for queued jobs.
+
+    Workers live on the event loop that started them; if `enqueue` is
+    called from a different loop they are restarted there, picking up every
+    job still marked as queued in the store (unless `resume` is off, e.g. a
+    bulk run that must only process its own jobs). With `poll_interval`
+    the store is also checked periodically for jobs other processes
+    queued. A job runs only once: it is claimed in the store before running.
+    """
+
+    def __init__(self, store: JobStore, workers: int = INGEST_WORKERS, resume: bool = True,
+                 poll_interval: float = 0.0):
+        self.store = store
+        self.workers = workers
+        self.resume = resume
+        self.poll_interval = poll_interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Set[str] = set()
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._pending = set()
+        if self.resume:
+            for job_id in self.store.requeue_interrupted():
+                self._put(job_id)
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        if self.poll_interval:
+            self._tasks.append(loop.create_task(self._poll()))
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    def enqueue(self, url: str, doc_id: str) -> Dict:
+        job = self.store.create(url, doc_id)
+        restarted = self._loop is not asyncio.get_running_loop()
+        if restarted:
+            self.start()
+        if not (restarted and self.resume):
+            # Al reiniciar con resume, start() ya encoló los pendientes, incluido este
+            self._put(job["job_id"])
+        return job
+
+    def _put(self, job_id: str) -> None:
+        if job_id not in self._pending:
+            self._pending.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for job_id in await asyncio.to_thread(self.store.queued):
+                self._put(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._pending.discard(job_id)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None or not self.store.claim(job_id):
+            return
+
+        def report(stage: str, progress: float) -> None:
+            self.store.update(job_id, stage=stage, progress=round(progress, 3))
+
+        try:
+            added = await ingest_article(job["url"], job["doc_id"], report)
+        except asyncio.CancelledError:
+            # El proceso se está apagando: el job queda "running" y se reencola al reiniciar
+            raise
+        except Exception as e:
+            print(f"[Jobs] Job {job_id} falló: {e}")
+            self.store.update(job_id, status=FAILED, error=str(e))
+            return
+        self.store.update(job_id, status=DONE, stage=DONE, progress=1.0, chunks_indexed=added)
+
+    async def wait_idle(self) -> None:
+        """Block until every queued job has been processed (for tests and scripts)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def wait_finished(self, job_ids: List[str], poll_interval: float = JOBS_POLL_INTERVAL) -> None:
+        """
+        Block until each of `job_ids` is done or failed in the store, whoever
+        ran it: a queue polling the same store (the API writer) may have
+        claimed some, and those are still running when this one goes idle.
+        """
+        await self.wait_idle()
+        while True:
+            jobs = await asyncio.to_thread(lambda: [self.store.get(j) for j in job_ids])
+            if all(job["status"] in FINISHED for job in jobs):
+                return
+            await asyncio.sleep(poll_interval)
+
+
+job_store = JobStore()
+writer_lock = WriterLock()
+ingestion_queue = IngestionQueue(job_store, poll_interval=JOBS_POLL_INTERVAL)
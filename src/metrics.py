@@ -0,0 +1,230 @@
+import time
+import threading
+import contextvars
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from src.config import SLOW_REQUEST_SECONDS
+
+# Límites de los buckets de latencia (segundos), de ~ms (búsqueda) a decenas de s (LLM, scraping)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter, one series per combination of label values."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[n]) for n in self.labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics), one series per label combination."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Por serie: conteo por bucket (no acumulado), suma y cantidad
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[n]) for n in self.labels))
+        return series[2] if series else 0
+
+    def sum(self, **labels) -> float:
+        series = self._series.get(tuple(str(labels[n]) for n in self.labels))
+        return series[1] if series else 0.0
+
+    def series(self) -> List[Tuple[str, ...]]:
+        return sorted(self._series)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    le = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {n}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {n}")
+        return lines
+
+
+class Registry:
+    """Metrics of this process, rendered in Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for m in self._metrics for line in m.render()) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "rag_stage_seconds", "Time spent in each stage of queries, ingestion and index builds.", ("stage",))
+REQUEST_SECONDS = registry.histogram(
+    "rag_http_request_seconds", "HTTP request duration, until the last byte of the body.",
+    ("method", "route", "status"))
+SLOW_REQUESTS = registry.counter(
+    "rag_slow_requests_total", "Requests slower than SLOW_REQUEST_SECONDS.", ("route",))
+UPSTREAM_ERRORS = registry.counter(
+    "rag_upstream_errors_total",
+    "Failed calls to upstreams (embed/chat/scrape); `retry` counts attempts that were retried.",
+    ("upstream", "reason"))
+CONTEXT_TOKENS = registry.histogram(
+    "rag_context_tokens", "Estimated tokens of the context sent to the LLM.",
+    buckets=(64, 128, 256, 384, 512, 768, 1024, 2048))
+CACHE_LOOKUPS = registry.counter(
+    "rag_cache_lookups_total", "Embedding and answer cache lookups by result.", ("cache", "result"))
+
+
+# ─── Spans por request ─────────────────────────────────────────
+
+class RequestTimer:
+    """Stages timed while serving one request, for its Server-Timing header and the slow log."""
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+        self.open = True
+
+    def server_timing(self, total: float) -> str:
+        parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.spans]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+# Las tareas y hilos que lanza un request heredan su timer (contextvars)
+_current: contextvars.ContextVar[Optional[RequestTimer]] = contextvars.ContextVar("request_timer", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a block as `stage`: observed in `rag_stage_seconds` and, inside an
+    HTTP request, added to that request's Server-Timing header. Works in
+    sync and async code (`with span("search"): await ...`).
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timer = _current.get()
+        # Un job lanzado desde el request lo sobrevive: no sigue agregando spans
+        if timer is not None and timer.open:
+            timer.spans.append((stage, elapsed))
+
+
+def stage_summary() -> List[str]:
+    """One line per stage seen by this process: count, total and mean time."""
+    lines = []
+    for (stage,) in STAGE_SECONDS.series():
+        n, total = STAGE_SECONDS.count(stage=stage), STAGE_SECONDS.sum(stage=stage)
+        lines.append(f"{stage:>14} | {n:>7} veces | total {total:>8.2f} s | media {total / n * 1000:>8.1f} ms")
+    return lines
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware: times every HTTP request into `rag_http_request_seconds`
+    (labelled by endpoint function, not raw path), adds a `Server-Timing`
+    header with the spans recorded before the response started, and logs
+    requests slower than SLOW_REQUEST_SECONDS with their spans (0 disables it).
+    For streamed responses the duration runs until the last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timer = RequestTimer()
+        token = _current.set(timer)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                header = timer.server_timing(time.perf_counter() - t0).encode("latin-1")
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            timer.open = False
+            elapsed = time.perf_counter() - t0
+            # El router deja en el scope la función que atendió el request
+            endpoint = scope.get("endpoint")
+            route = getattr(endpoint, "__name__", "other")
+            REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route, status=status[0])
+            if SLOW_REQUEST_SECONDS and elapsed >= SLOW_REQUEST_SECONDS:
+                SLOW_REQUESTS.inc(route=route)
+                stages = ", ".join(f"{s} {d * 1000:.0f} ms" for s, d in timer.spans) or "sin spans"
+                print(f"[Slow] {scope['method']} {scope['path']} → {status[0]} en {elapsed * 1000:.0f} ms ({stages})")
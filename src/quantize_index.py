@@ -0,0 +1,64 @@
+import os
+import sys
+
+from typing import Dict
+
+from src.config import INDEX_DIR, FAISS_INDEX_PATH, INDEX_QUANTIZATION
+from src.index_factory import NONE, SQ8, FP16, PQ
+from src.segment_index import SegmentedIndex
+
+QUANTIZATIONS = (NONE, SQ8, FP16, PQ)
+
+
+def index_memory(index: SegmentedIndex) -> Dict:
+    """
+    Bytes per vector the loaded index takes, by where they live:
+      ram     .index files a reader loads on its heap (one copy per process)
+      mapped  .npy of a flat base that readers search directly ("search_raw"):
+              memory-mapped, so it sits in the page cache shared by all workers
+      disk    .npy raw vectors of a compressed base, read only to re-rank
+    """
+    manifest = index.read_manifest()
+    ram = mapped = disk = 0
+    for s in manifest["segments"]:
+        if index.mmap and s.get("search_raw"):
+            # El .index de esta base no se carga nunca
+            mapped += os.path.getsize(index._path(s["raw"]))
+            continue
+        ram += os.path.getsize(index._path(s["file"]))
+        if s.get("raw"):
+            disk += os.path.getsize(index._path(s["raw"]))
+    n = max(manifest["ntotal"], 1)
+    return {"ntotal": manifest["ntotal"], "ram_per_vector": ram / n,
+            "mapped_per_vector": mapped / n, "disk_per_vector": disk / n}
+
+
+def main(quantization: str = INDEX_QUANTIZATION, directory: str = INDEX_DIR,
+         legacy_path: str = FAISS_INDEX_PATH) -> None:
+    """
+    Rebuild the base segment with the given encoding. An existing
+    `faiss_index.index` (legacy flat file) is imported first, so this is
+    also the migration path for deployments that still have one.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}")
+    index = SegmentedIndex(directory, legacy_path=legacy_path, quantization=quantization)
+    if not index.exists():
+        print(f"[Index] No hay índice en '{directory}' ni en '{legacy_path}'.")
+        return
+
+    before = index_memory(index)
+    index.compact(wait=True)
+    after = index_memory(index)
+    print(f"[Index] {after['ntotal']} vectores: {before['ram_per_vector']:.0f} → "
+          f"{after['ram_per_vector']:.0f} bytes/vector en RAM, "
+          f"{after['mapped_per_vector']:.0f} mapeados (compartidos entre workers), "
+          f"+{after['disk_per_vector']:.0f} exactos en disco.")
+    if quantization != INDEX_QUANTIZATION:
+        # El servidor compacta con la configuración: sin esto, la próxima compactación lo revierte
+        print(f"[Index] Ajusta INDEX_QUANTIZATION = \"{quantization}\" en src/config.py "
+              f"(hoy \"{INDEX_QUANTIZATION}\") para que se mantenga.")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
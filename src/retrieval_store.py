@@ -0,0 +1,140 @@
+import threading
+import numpy as np
+
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+
+from src.config import HYBRID_CANDIDATES, RRF_K
+from src.chunk_store import ChunkStore, chunk_store
+from src.segment_index import SegmentedIndex, IndexView, segmented_index
+from src.metrics import span
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], limit: int, k: int = RRF_K) -> List[int]:
+    """Merge ranked id lists: score(id) = Σ 1 / (k + rank). Ties keep first-seen order."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking):
+            scores[i] = scores.get(i, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:limit]
+
+
+@dataclass(frozen=True)
+class RetrievalSnapshot:
+    """
+    Immutable view of the index at a given generation.
+    A query grabs one snapshot and uses it end to end. Chunk ids are never
+    reused, so an id this index returns resolves to the same text or, if a
+    re-ingestion replaced that chunk meanwhile, to nothing (and is skipped).
+    """
+    index: IndexView
+    chunks: ChunkStore
+    generation: int
+
+    def search(self, x, k: int, doc_ids: Optional[List[str]] = None):
+        """
+        Top-k over the whole index, or only over the chunks of `doc_ids`.
+        A scoped search reads just those documents' vectors: O(doc size).
+        """
+        if doc_ids is None:
+            return self.index.search(x, k)
+        return self.index.search_subset(x, k, self.chunks.ids_for_docs(doc_ids))
+
+    def hybrid_search(self, x, question: str, k: int, doc_ids: Optional[List[str]] = None,
+                      candidates: int = HYBRID_CANDIDATES) -> List[int]:
+        """
+        Ids of the k best chunks fusing vector search with BM25 over the
+        question's terms, so chunks that match lexically are found anywhere
+        in the corpus (or in `doc_ids`), not only among the vector top-k.
+        """
+        with span("vector_search"):
+            _, ids = self.search(x, max(k, candidates), doc_ids)
+        vector = [int(i) for i in ids[0] if i >= 0]
+        with span("keyword_search"):
+            lexical = [i for i, _ in self.chunks.search_bm25(question, max(k, candidates), doc_ids,
+                                                             self.index.ntotal)]
+        return reciprocal_rank_fusion([vector, lexical], k)
+
+    def vectors(self, ids) -> np.ndarray:
+        """Stored vectors of `ids`, in the given order."""
+        ids = np.asarray(ids, dtype="int64")
+        order = np.argsort(ids)
+        out = np.empty((len(ids), self.index.dim), dtype="float32")
+        out[order] = self.index.reconstruct_ids(ids[order])
+        return out
+
+    def lookup(self, ids) -> List[Dict]:
+        """Chunks for the ids returned by `index.search`, skipping -1 and unknown ids."""
+        ids = [int(i) for i in ids if 0 <= i < self.index.ntotal]
+        return [c for c in self.chunks.get_many(ids) if c is not None]
+
+
+class RetrievalStore:
+    """
+    Process-wide holder of the FAISS index.
+
+    The segmented index is loaded once and served from memory; texts are
+    looked up in the chunk store on demand. Every call to `snapshot()`
+    compares the manifest's signature with the one it loaded; when a writer
+    (this process or another one, e.g. `build_index.main`) commits a new
+    generation, only the segments that are not already in memory are read.
+    """
+
+    def __init__(self, index: SegmentedIndex = segmented_index, chunks: ChunkStore = chunk_store):
+        self.index = index
+        self.chunks = chunks
+        self._lock = threading.Lock()
+        self._snapshot: Optional[RetrievalSnapshot] = None
+        self._signature = None
+
+    def _load(self, signature) -> RetrievalSnapshot:
+        previous = self._snapshot.index if self._snapshot else None
+        view = self.index.open_view(previous)
+        self._snapshot = RetrievalSnapshot(view, self.chunks, view.generation)
+        self._signature = signature
+        print(f"[Store] Índice cargado en memoria (generación {view.generation}, "
+              f"{len(view.parts)} segmentos, {view.ntotal} vectores).")
+        return self._snapshot
+
+    def snapshot(self) -> RetrievalSnapshot:
+        """
+        Return the current snapshot, reloading it first if the index on disk changed.
+        Raises FileNotFoundError if the index does not exist yet.
+        """
+        signature = self.index.signature()
+        snap = self._snapshot
+        if snap is not None and signature == self._signature:
+            return snap
+
+        with self._lock:
+            # Otro hilo pudo haber recargado mientras esperábamos el lock
+            signature = self.index.signature()
+            if self._snapshot is not None and signature == self._signature:
+                return self._snapshot
+            if not self.index.exists():
+                raise FileNotFoundError(self.index.directory)
+            return self._load(self.index.signature())
+
+    def warm(self) -> bool:
+        """Load the snapshot if the index exists; return whether the store is ready."""
+        try:
+            self.snapshot()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def stats(self) -> Dict:
+        """What is currently loaded in memory (without touching the disk)."""
+        snap = self._snapshot
+        if snap is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "generation": snap.generation,
+            "segments": len(snap.index.parts),
+            "ntotal": snap.index.ntotal,
+            "deleted": len(snap.index.deleted),
+        }
+
+
+retrieval_store = RetrievalStore()
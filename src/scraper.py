@@ -0,0 +1,157 @@
+import os
+import time
+import zlib
+import asyncio
+import sqlite3
+import threading
+
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from src.config import (
+    HTML_CACHE_ENABLED,
+    HTML_CACHE_PATH,
+    SCRAPE_HOST_INTERVAL,
+    SCRAPE_USER_AGENT
+)
+from src.async_upstream import upstreams
+from src.metrics import UPSTREAM_ERRORS
+
+
+class HtmlCache:
+    """
+    SQLite cache of downloaded pages, keyed by URL.
+
+    Stores the zlib-compressed HTML together with the response's `ETag` and
+    `Last-Modified` headers, so the page can be re-fetched conditionally
+    (a 304 costs no body and no parse of a new version).
+    """
+
+    def __init__(self, path: str = HTML_CACHE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY, html BLOB NOT NULL, etag TEXT, last_modified TEXT,"
+            " fetched_at REAL NOT NULL)"
+        )
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT html, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"html": zlib.decompress(row[0]).decode("utf-8"), "etag": row[1],
+                "last_modified": row[2], "fetched_at": row[3]}
+
+    def put(self, url: str, html: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        blob = zlib.compress(html.encode("utf-8"), 6)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages(url, html, etag, last_modified, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?)", (url, blob, etag, last_modified, time.time())
+            )
+
+    def touch(self, url: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class HostRateLimiter:
+    """
+    Spaces requests to the same host at least `interval` seconds apart.
+    Each caller reserves the next free slot for its host and sleeps until
+    then, so concurrent downloads from different hosts are not delayed.
+    """
+
+    def __init__(self, interval: float = SCRAPE_HOST_INTERVAL):
+        self.interval = interval
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    async def wait(self, host: str) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, 0.0))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class Scraper:
+    """
+    Page downloader shared by /upload-article jobs and bulk ingestion.
+
+    Requests go through the pooled "scrape" upstream (bounded by
+    SCRAPE_MAX_CONCURRENCY) after waiting for the host's rate-limit slot.
+    With a cache, a known page is re-fetched with If-None-Match /
+    If-Modified-Since and a 304 is served from disk. `fetched`,
+    `not_modified` count responses seen by this process.
+    """
+
+    def __init__(self, cache: Optional[HtmlCache] = None, limiter: Optional[HostRateLimiter] = None):
+        self.cache = cache
+        self.limiter = limiter or HostRateLimiter()
+        self.fetched = 0
+        self.not_modified = 0
+
+    async def fetch(self, url: str) -> str:
+        """HTML of `url`, revalidating the cached copy if there is one."""
+        cached = self.cache.get(url) if self.cache is not None else None
+        headers = {"User-Agent": SCRAPE_USER_AGENT}
+        if cached is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        await self.limiter.wait(urlsplit(url).netloc)
+        try:
+            resp = await upstreams.get("scrape", url, headers=headers)
+            if resp.status_code == 304 and cached is not None:
+                self.not_modified += 1
+                self.cache.touch(url)
+                return cached["html"]
+            resp.raise_for_status()
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(upstream="scrape", reason="error")
+            raise RuntimeError(f"[Scraping] Error downloading URL: {e}")
+
+        self.fetched += 1
+        if self.cache is not None:
+            self.cache.put(url, resp.text, resp.headers.get("etag"), resp.headers.get("last-modified"))
+        return resp.text
+
+    def stats(self) -> Dict:
+        return {
+            "fetched": self.fetched,
+            "not_modified": self.not_modified,
+            "cached_pages": len(self.cache) if self.cache is not None else 0,
+        }
+
+
+_default_scraper: Optional[Scraper] = None
+_default_lock = threading.Lock()
+
+
+def get_scraper() -> Scraper:
+    """Process-wide scraper (one HTML cache and one rate limiter per process)."""
+    global _default_scraper
+    with _default_lock:
+        if _default_scraper is None:
+            _default_scraper = Scraper(HtmlCache() if HTML_CACHE_ENABLED else None)
+        return _default_scraper
@@ -0,0 +1,624 @@
+import os
+import json
+import uuid
+import zlib
+import fcntl
+import struct
+import threading
+import faiss
+import numpy as np
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from src.config import (
+    INDEX_DIR,
+    FAISS_INDEX_PATH,
+    VECTOR_DIM,
+    COMPACT_MAX_SEGMENTS,
+    COMPACT_MAX_DELETED,
+    INDEX_TYPE,
+    INDEX_MMAP,
+    INDEX_QUANTIZATION,
+    RERANK_FACTOR
+)
+from src.index_factory import NONE, build_base, configure, index_kind, index_quantization, needs_retrain, unwrap
+
+MANIFEST = "manifest.json"
+WAL = "wal.log"
+LOCK = "writer.lock"
+COMPACT_LOCK = "compact.lock"
+
+# Registro del WAL: magic, id inicial, cantidad de vectores, crc32 de los datos
+_WAL_HEADER = struct.Struct("<4sqqI")
+_WAL_MAGIC = b"WAL1"
+
+# Vectores por bloque al copiar/decodificar un base completo
+_BLOCK = 65_536
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _atomic_write_index(index: faiss.Index, path: str) -> None:
+    tmp = f"{path}.tmp"
+    faiss.write_index(index, tmp)
+    with open(tmp, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _atomic_write_json(data: Dict, path: str) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _rerank(x: np.ndarray, candidates: np.ndarray, raw: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact L2 top-k among each query's candidate ids, read from the full-precision `raw`."""
+    n, m = len(x), min(k, candidates.shape[1])
+    D = np.full((n, m), np.inf, dtype="float32")
+    I = np.full((n, m), -1, dtype="int64")
+    for q in range(n):
+        # Ordenados: lecturas del memmap en orden de archivo
+        ids = np.sort(candidates[q][candidates[q] >= 0])
+        if not len(ids):
+            continue
+        dist = ((raw[ids] - x[q]) ** 2).sum(1)
+        top = np.argsort(dist, kind="stable")[:m]
+        D[q, :len(top)] = dist[top]
+        I[q, :len(top)] = ids[top]
+    return D, I
+
+
+def _flat_from(vectors: np.ndarray, dim: int) -> faiss.Index:
+    index = faiss.IndexFlatL2(dim)
+    if len(vectors):
+        index.add(np.ascontiguousarray(vectors, dtype="float32"))
+    return index
+
+
+class _MappedFlat:
+    """
+    Read-only stand-in for the IndexFlatL2 of a base: exact L2 search over
+    its vectors memory-mapped from the .npy (row = position), so every
+    process serving the index shares one copy of them in the page cache.
+    """
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.ntotal, self.d = vectors.shape
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return faiss.knn(x, self.vectors, k)
+
+    def reconstruct_n(self, i: int, n: int) -> np.ndarray:
+        return np.array(self.vectors[i:i + n])
+
+
+def _read_rows(index: faiss.Index, rows: np.ndarray) -> np.ndarray:
+    """Vectors at sorted positions `rows` of `index`, one `reconstruct_n` per run of consecutive rows."""
+    out = np.empty((len(rows), index.d), dtype="float32")
+    # Cortes donde termina una corrida de posiciones consecutivas
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    pos = 0
+    for run in np.split(rows, breaks):
+        out[pos:pos + len(run)] = index.reconstruct_n(int(run[0]), len(run))
+        pos += len(run)
+    return out
+
+
+class IndexView:
+    """
+    Immutable, searchable view of one manifest generation.
+
+    Holds the loaded segment indexes with their starting id; `search` runs
+    on every segment and merges the per-segment top-k by distance, so ids
+    and results match a single index holding all vectors in order.
+
+    A compressed part (SQ8/fp16/PQ base) may come with its full-precision
+    vectors in `raw` (file name -> array memory-mapped from disk): `search`
+    then re-ranks its `k * rerank` best candidates by exact distance, and
+    `reconstruct_ids` reads them instead of decoding lossy codes.
+
+    `deleted` are ids removed since the last compaction (tombstones): each
+    part over-fetches by the tombstones in its range and drops them. A base
+    compacted after deletions is an IndexIDMap2 whose ids have holes; `ntotal`
+    is the size of the id space (the next id to assign), not the live count.
+    """
+
+    def __init__(self, generation: int, parts: Tuple[Tuple[str, int, faiss.Index], ...], dim: int,
+                 raw: Optional[Dict[str, np.ndarray]] = None, rerank: int = 0,
+                 deleted=(), ntotal: Optional[int] = None):
+        self.generation = generation
+        self.parts = parts
+        self.dim = dim
+        self.raw = raw or {}
+        self.rerank = rerank
+        self.deleted = np.unique(np.asarray(deleted, dtype="int64"))
+        self.ntotal = ntotal if ntotal is not None else sum(idx.ntotal for _, _, idx in parts)
+        # Rango de ids de cada parte: hasta donde empieza la siguiente
+        self._ends = [start for _, start, _ in parts[1:]] + [self.ntotal]
+        self._id_maps = {
+            name: faiss.vector_to_array(idx.id_map)
+            for name, _, idx in parts if isinstance(idx, faiss.IndexIDMap)
+        }
+
+    def part_ids(self, i: int) -> np.ndarray:
+        """Ids stored in part `i` (tombstones included), ascending."""
+        name, start, idx = self.parts[i]
+        if name in self._id_maps:
+            return self._id_maps[name]
+        return np.arange(start, start + idx.ntotal, dtype="int64")
+
+    def live_ids(self) -> np.ndarray:
+        """Every id this view can return, ascending."""
+        if not self.parts:
+            return np.empty(0, dtype="int64")
+        ids = np.concatenate([self.part_ids(i) for i in range(len(self.parts))])
+        return ids[~np.isin(ids, self.deleted)]
+
+    def live_mask(self, ids: np.ndarray) -> np.ndarray:
+        """Which of `ids` are live vectors of this view."""
+        mask = (ids >= 0) & (ids < self.ntotal) & ~np.isin(ids, self.deleted)
+        for (name, start, _), end in zip(self.parts, self._ends):
+            if name in self._id_maps:
+                mask &= (ids < start) | (ids >= end) | np.isin(ids, self._id_maps[name])
+        return mask
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        x = np.ascontiguousarray(x, dtype="float32")
+        n = x.shape[0]
+        if not self.parts:
+            return (np.full((n, k), np.inf, dtype="float32"), np.full((n, k), -1, dtype="int64"))
+        dists, labels = [], []
+        for (name, start, idx), end in zip(self.parts, self._ends):
+            if idx.ntotal == 0:
+                continue
+            # Lápidas en el rango de la parte: se piden de más y se descartan
+            dead = self.deleted[np.searchsorted(self.deleted, start):np.searchsorted(self.deleted, end)]
+            raw = self.raw.get(name)
+            if raw is not None and self.rerank > 1 and not isinstance(idx, _MappedFlat):
+                _, C = idx.search(x, min(k * self.rerank + len(dead), idx.ntotal))
+                if len(dead):
+                    C = np.where(np.isin(C + start, dead), -1, C)
+                D, I = _rerank(x, C, raw, k)
+            else:
+                D, I = idx.search(x, min(k + len(dead), idx.ntotal))
+                if len(dead):
+                    D = np.where(np.isin(I + start, dead), np.inf, D)
+                    I = np.where(np.isin(I + start, dead), -1, I)
+            dists.append(D)
+            labels.append(np.where(I >= 0, I + start, -1))
+        if len(dists) == 1 and dists[0].shape[1] == k and not len(self.deleted):
+            return dists[0], labels[0]
+        D = np.concatenate(dists, axis=1)
+        I = np.concatenate(labels, axis=1)
+        order = np.argsort(D, axis=1, kind="stable")[:, :k]
+        D, I = np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+        if D.shape[1] < k:
+            pad = k - D.shape[1]
+            D = np.hstack([D, np.full((n, pad), np.inf, dtype="float32")])
+            I = np.hstack([I, np.full((n, pad), -1, dtype="int64")])
+        return D, I
+
+
+    def reconstruct_ids(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Vectors for sorted, live `ids`, read per contiguous run with
+        `reconstruct_n`, so the cost is O(len(ids)) regardless of the index size.
+        """
+        out = np.empty((len(ids), self.dim), dtype="float32")
+        for (name, start, idx), end in zip(self.parts, self._ends):
+            lo, hi = np.searchsorted(ids, [start, end])
+            if lo == hi:
+                continue
+            sel = ids[lo:hi]
+            raw = self.raw.get(name)
+            if raw is not None:
+                out[lo:hi] = raw[sel - start]
+            elif name in self._id_maps:
+                # Ids con huecos: la posición en el índice interno sale del mapa (ordenado)
+                out[lo:hi] = _read_rows(unwrap(idx), np.searchsorted(self._id_maps[name], sel))
+            else:
+                out[lo:hi] = _read_rows(idx, sel - start)
+        return out
+
+    def search_subset(self, x: np.ndarray, k: int, ids) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact L2 search restricted to `ids` (e.g. one document's chunks).
+        Same output shape and distance metric as `search`; ids outside this
+        generation or deleted are ignored.
+        """
+        x = np.ascontiguousarray(x, dtype="float32")
+        ids = np.unique(np.asarray(ids, dtype="int64"))
+        ids = ids[self.live_mask(ids)]
+        n = x.shape[0]
+        D = np.full((n, k), np.inf, dtype="float32")
+        I = np.full((n, k), -1, dtype="int64")
+        if not len(ids):
+            return D, I
+        vecs = self.reconstruct_ids(ids)
+        # ||x - v||² = ||x||² - 2·x·v + ||v||², igual que IndexFlatL2
+        dist = (x * x).sum(1)[:, None] - 2 * x @ vecs.T + (vecs * vecs).sum(1)[None, :]
+        m = min(k, len(ids))
+        top = np.argpartition(dist, m - 1, axis=1)[:, :m]
+        order = np.take_along_axis(dist, top, axis=1).argsort(axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        D[:, :m] = np.take_along_axis(dist, top, axis=1)
+        I[:, :m] = ids[top]
+        return D, I
+
+
+def _atomic_write_vectors(view: IndexView, path: str) -> None:
+    """
+    Every live vector of `view` at full precision, as a .npy readers can
+    memory-map. Row = id; rows of deleted ids stay zero.
+    """
+    tmp = f"{path}.tmp"
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype="float32", shape=(view.ntotal, view.dim))
+    live = view.live_ids()
+    for lo in range(0, len(live), _BLOCK):
+        ids = live[lo:lo + _BLOCK]
+        out[ids] = view.reconstruct_ids(ids)
+    out.flush()
+    del out
+    with open(tmp, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class SegmentedIndex:
+    """
+    Crash-safe, incremental on-disk FAISS index.
+
+    Layout of `directory`:
+      manifest.json  generation + ordered list of segment files and id ranges,
+                     and the ids deleted since the last compaction
+      seg-*.index    small immutable IndexFlatL2 per append
+      base-*.index   result of merging segments (compaction)
+      base-*.npy     full-precision vectors of a compressed base (INDEX_QUANTIZATION)
+                     or, with `mmap`, of a flat base ("search_raw": readers search it)
+      wal.log        vectors acknowledged but not yet covered by the manifest
+      writer.lock    flock held by the single writer (across processes)
+      compact.lock   flock held by the single compactor (across processes)
+
+    An append costs O(batch): the vectors are fsynced to the WAL, written as
+    a new segment and published by atomically replacing the manifest. After a
+    crash the WAL is replayed on the next write. Readers only ever see files
+    that were fully written and renamed into place.
+
+    With `mmap`, readers map segment files instead of reading them (faiss
+    supports it for IVF inverted lists, so a large base loads in
+    milliseconds and pages in on demand). faiss reads a flat index in full
+    even then, so a flat base is also published as a .npy that readers map
+    and search with `faiss.knn`: several worker processes share one copy.
+    Compaction always reads in full, since mapped indexes cannot be cloned
+    or extended.
+
+    With `quantization` the base is stored compressed (SQ8, fp16 or PQ) and
+    its raw vectors stay on disk next to it, memory-mapped: RAM holds only
+    the codes, searches re-rank `rerank`x candidates exactly, and later
+    compactions rebuild from the exact vectors.
+    """
+
+    def __init__(self, directory: str = INDEX_DIR, dim: int = VECTOR_DIM,
+                 legacy_path: Optional[str] = FAISS_INDEX_PATH,
+                 compact_max_segments: int = COMPACT_MAX_SEGMENTS,
+                 index_type: str = INDEX_TYPE,
+                 mmap: bool = INDEX_MMAP,
+                 quantization: str = INDEX_QUANTIZATION,
+                 rerank: int = RERANK_FACTOR):
+        self.directory = directory
+        self.dim = dim
+        self.legacy_path = legacy_path
+        self.compact_max_segments = compact_max_segments
+        self.index_type = index_type
+        self.mmap = mmap
+        self.quantization = quantization
+        self.rerank = rerank
+        self._thread_lock = threading.RLock()
+        self._compacting = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    # ─── Lectura ────────────────────────────────────────────────
+
+    def exists(self) -> bool:
+        if os.path.exists(self._path(MANIFEST)):
+            return True
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            # Índice de un solo archivo (formato anterior): se importa como base
+            with self.writer():
+                pass
+            return True
+        return False
+
+    def signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self._path(MANIFEST))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def read_manifest(self) -> Dict:
+        try:
+            with open(self._path(MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"generation": 0, "dim": self.dim, "ntotal": 0, "segments": []}
+
+    def _read_segment(self, name: str) -> faiss.Index:
+        # Los archivos nunca se modifican en el lugar: mapearlos es seguro y, si
+        # una compactación los borra, el mapeo sigue válido hasta soltar el índice
+        flags = faiss.IO_FLAG_MMAP if self.mmap else 0
+        return configure(faiss.read_index(self._path(name), flags))
+
+    def _read_raw(self, name: str) -> np.ndarray:
+        return np.load(self._path(name), mmap_mode="r")
+
+    def open_view(self, previous: Optional[IndexView] = None) -> IndexView:
+        """
+        Load the current generation, reusing segments already loaded in `previous`
+        so only new files are read. Raises FileNotFoundError if there is no index.
+        """
+        if not self.exists():
+            raise FileNotFoundError(self._path(MANIFEST))
+        loaded = {name: idx for name, _, idx in previous.parts} if previous else {}
+        loaded_raw = previous.raw if previous else {}
+        for _ in range(3):
+            manifest = self.read_manifest()
+            try:
+                parts = tuple(
+                    (s["file"], s["start"], loaded[s["file"]] if s["file"] in loaded
+                     else _MappedFlat(self._read_raw(s["raw"])) if self.mmap and s.get("search_raw")
+                     else self._read_segment(s["file"]))
+                    for s in manifest["segments"]
+                )
+                raw = {
+                    s["file"]: loaded_raw[s["file"]] if s["file"] in loaded_raw else self._read_raw(s["raw"])
+                    for s in manifest["segments"] if s.get("raw")
+                }
+            except (RuntimeError, FileNotFoundError):
+                # Una compactación borró un segmento entre leer el manifest y abrirlo
+                continue
+            return IndexView(manifest["generation"], parts, manifest.get("dim", self.dim), raw, self.rerank,
+                             manifest.get("deleted", ()), manifest["ntotal"])
+        raise RuntimeError("[Index] Could not read a consistent manifest.")
+
+    # ─── Escritura ──────────────────────────────────────────────
+
+    @contextmanager
+    def writer(self):
+        """
+        Hold the single-writer lock (threads and processes). A non-empty WAL
+        means the previous holder died mid-append, so it is replayed first.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._thread_lock:
+            with open(self._path(LOCK), "a+") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    self._import_legacy()
+                    if os.path.exists(self._path(WAL)) and os.path.getsize(self._path(WAL)):
+                        self._replay_wal()
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def append(self, vectors: np.ndarray) -> int:
+        """
+        Durably add `vectors` and return the id assigned to the first one.
+        Ids are consecutive and never reused.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype="float32").reshape(-1, self.dim)
+        with self.writer():
+            manifest = self.read_manifest()
+            start = manifest["ntotal"]
+            if len(vectors) == 0:
+                return start
+            self._wal_append(start, vectors)
+            self._commit_segment(manifest, start, vectors)
+            self._wal_truncate()
+        if self.needs_compaction():
+            self.compact_in_background()
+        return start
+
+    def remove(self, ids) -> int:
+        """
+        Delete vectors by id. The ids are recorded in the manifest (readers
+        skip them from the next generation on) and the vectors are dropped
+        from disk at the next compaction; ids are never reused. Returns how
+        many ids were newly deleted.
+        """
+        ids = {int(i) for i in ids}
+        if not ids:
+            return 0
+        with self.writer():
+            manifest = self.read_manifest()
+            deleted = set(manifest.get("deleted", []))
+            nuevos = {i for i in ids if 0 <= i < manifest["ntotal"]} - deleted
+            if not nuevos:
+                return 0
+            manifest["deleted"] = sorted(deleted | nuevos)
+            manifest["generation"] += 1
+            _atomic_write_json(manifest, self._path(MANIFEST))
+            _fsync_dir(self.directory)
+        if self.needs_compaction():
+            self.compact_in_background()
+        return len(nuevos)
+
+    def _commit_segment(self, manifest: Dict, start: int, vectors: np.ndarray) -> None:
+        name = f"seg-{start:012d}-{len(vectors)}.index"
+        _atomic_write_index(_flat_from(vectors, self.dim), self._path(name))
+        manifest["segments"].append({"file": name, "start": start, "count": len(vectors)})
+        manifest["ntotal"] = start + len(vectors)
+        manifest["generation"] += 1
+        manifest["dim"] = self.dim
+        _atomic_write_json(manifest, self._path(MANIFEST))
+        _fsync_dir(self.directory)
+
+    def _import_legacy(self) -> None:
+        if os.path.exists(self._path(MANIFEST)) or not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        legacy = faiss.read_index(self.legacy_path)
+        name = f"base-{legacy.ntotal:012d}-{uuid.uuid4().hex[:8]}.index"
+        _atomic_write_index(legacy, self._path(name))
+        manifest = {"generation": 1, "dim": legacy.d, "ntotal": legacy.ntotal,
+                    "segments": [{"file": name, "start": 0, "count": legacy.ntotal}]}
+        _atomic_write_json(manifest, self._path(MANIFEST))
+        _fsync_dir(self.directory)
+        print(f"[Index] Importado '{self.legacy_path}' ({legacy.ntotal} vectores) como segmento base.")
+
+    # ─── WAL ────────────────────────────────────────────────────
+
+    def _wal_append(self, start: int, vectors: np.ndarray) -> None:
+        data = vectors.tobytes()
+        with open(self._path(WAL), "ab") as f:
+            f.write(_WAL_HEADER.pack(_WAL_MAGIC, start, len(vectors), zlib.crc32(data)))
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _wal_truncate(self) -> None:
+        with open(self._path(WAL), "wb") as f:
+            os.fsync(f.fileno())
+
+    def _wal_records(self) -> List[Tuple[int, np.ndarray]]:
+        records = []
+        try:
+            with open(self._path(WAL), "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return records
+        pos = 0
+        while pos + _WAL_HEADER.size <= len(raw):
+            magic, start, count, crc = _WAL_HEADER.unpack_from(raw, pos)
+            end = pos + _WAL_HEADER.size + count * self.dim * 4
+            data = raw[pos + _WAL_HEADER.size:end]
+            # Registro truncado o corrupto: el proceso murió escribiéndolo
+            if magic != _WAL_MAGIC or end > len(raw) or zlib.crc32(data) != crc:
+                break
+            records.append((start, np.frombuffer(data, dtype="float32").reshape(count, self.dim)))
+            pos = end
+        return records
+
+    def _replay_wal(self) -> None:
+        manifest = self.read_manifest()
+        replayed = 0
+        for start, vectors in self._wal_records():
+            if start == manifest["ntotal"]:
+                self._commit_segment(manifest, start, vectors)
+                replayed += len(vectors)
+        self._wal_truncate()
+        self._remove_unreferenced(manifest, prefix="seg-")
+        if replayed:
+            print(f"[Index] Recuperados {replayed} vectores desde el WAL.")
+
+    def _remove_unreferenced(self, manifest: Dict, prefix: str) -> None:
+        """Delete `prefix*` files left by a crashed writer/compactor (caller holds its lock)."""
+        referenced = {s["file"] for s in manifest["segments"]} | {s["raw"] for s in manifest["segments"] if s.get("raw")}
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name not in referenced:
+                os.remove(self._path(name))
+
+    # ─── Compactación ───────────────────────────────────────────
+
+    def needs_compaction(self) -> bool:
+        manifest = self.read_manifest()
+        return (len(manifest["segments"]) > self.compact_max_segments
+                or len(manifest.get("deleted", [])) > COMPACT_MAX_DELETED)
+
+    def compact(self, wait: bool = False) -> bool:
+        """
+        Merge every current segment into a single base segment, built by
+        `index_factory.build_base` (Flat, IVF or HNSW depending on size; a lone
+        base is rebuilt only if it needs retraining, a different encoding or
+        has deleted vectors to drop).
+        A compressed base (or, with mmap, a flat one) is published together with its raw vectors. Appends may continue
+        meanwhile; segments added after the merge started are kept after the
+        new base. If another compaction is running, return immediately unless
+        `wait`. Returns whether a new base was published.
+        """
+        if not self._compacting.acquire(blocking=wait):
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(self._path(COMPACT_LOCK), "a+")
+        try:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return False  # otro proceso está compactando
+            manifest = self.read_manifest()
+            merged_entries = manifest["segments"]
+            if not merged_entries:
+                return False
+            self._remove_unreferenced(manifest, prefix="base-")
+
+            # Se arma fuera del lock de escritura: los segmentos son inmutables
+            view = IndexView(manifest["generation"], tuple(
+                (s["file"], s["start"], faiss.read_index(self._path(s["file"]))) for s in merged_entries
+            ), self.dim, {s["file"]: self._read_raw(s["raw"]) for s in merged_entries if s.get("raw")},
+                deleted=manifest.get("deleted", ()), ntotal=manifest["ntotal"])
+            end = view.ntotal
+            applied = set(view.deleted.tolist())
+            first = view.parts[0][2] if merged_entries[0]["file"].startswith("base-") else None
+            if len(merged_entries) == 1 and not applied and not needs_retrain(
+                    view.parts[0][2], view.ntotal, self.index_type, self.quantization):
+                return False
+            base = build_base(view, previous=first, index_type=self.index_type, quantization=self.quantization)
+            name = f"base-{end:012d}-{uuid.uuid4().hex[:8]}.index"
+            entry = {"file": name, "start": 0, "count": end}
+            # Base flat sin huecos: los lectores buscan directo sobre el .npy mapeado
+            shared = self.mmap and isinstance(base, faiss.IndexFlat)
+            if index_quantization(base) != NONE or shared:
+                entry["raw"] = name.replace(".index", ".npy")
+                _atomic_write_vectors(view, self._path(entry["raw"]))
+                if shared:
+                    entry["search_raw"] = True
+            del view
+            _atomic_write_index(base, self._path(name))
+
+            with self.writer():
+                current = self.read_manifest()
+                n = len(merged_entries)
+                if current["segments"][:n] != merged_entries:
+                    # El manifest cambió por otra vía; descartamos este resultado
+                    os.remove(self._path(name))
+                    if entry.get("raw"):
+                        os.remove(self._path(entry["raw"]))
+                    return False
+                current["segments"] = [entry] + current["segments"][n:]
+                # Las lápidas aplicadas ya no están en el base; quedan las de borrados posteriores
+                current["deleted"] = [i for i in current.get("deleted", []) if i not in applied]
+                current["generation"] += 1
+                _atomic_write_json(current, self._path(MANIFEST))
+                _fsync_dir(self.directory)
+                for s in merged_entries:
+                    os.remove(self._path(s["file"]))
+                    if s.get("raw"):
+                        os.remove(self._path(s["raw"]))
+            print(f"[Index] Compactados {n} segmentos en '{name}' "
+                  f"({index_kind(base)}/{index_quantization(base)}, {base.ntotal} vectores"
+                  f"{f', {len(applied)} borrados' if applied else ''}).")
+            return True
+        finally:
+            lock_file.close()  # libera el flock
+            self._compacting.release()
+
+    def compact_in_background(self) -> None:
+        if self._compacting.locked():
+            return
+        threading.Thread(target=self.compact, name="index-compaction", daemon=True).start()
+
+
+segmented_index = SegmentedIndex()
@@ -1,26 +1,52 @@
 import os
 import json
 import re
+import uuid
+import asyncio
 import requests
 import numpy as np
 
-from typing import List, Dict
-from bs4 import BeautifulSoup
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import AsyncIterator, List, Dict, Optional
+from urllib.parse import quote, unquote, urlsplit, urlunsplit
 
 from src.config import (
     DOCS_DIR,
-    EMBED_ENDPOINT,
-    EMBED_MODEL,
     CHAT_ENDPOINT,
     CHAT_MODEL,
-    VECTOR_DIM,
     CHUNK_SIZE,
     CHUNK_OVERLAP,
+    CHUNK_UNIT,
     REQUEST_TIMEOUT
 )
+from src.embedding_client import (
+    get_embedding_client,
+    get_async_embedding_client,
+    EmbeddingError
+)
+from src.async_upstream import upstreams
+from src.metrics import span, UPSTREAM_ERRORS
+from src.scraper import get_scraper
+from src.chunker import chunk_text
 
 # 1. Scraping de Wikipedia
+_REF_PATTERN = re.compile(r"\[\d+\]")
+
+def extract_article_text(html: str) -> str:
+    """
+    Return the text of all <p> tags within the #bodyContent div of a Wikipedia page,
+    removing reference markers like [1], [2], etc.
+    """
+    # Import diferido: bs4/lxml solo hacen falta al ingerir, no para servir /query
+    from bs4 import BeautifulSoup, SoupStrainer
+    # Solo se construye el árbol de #bodyContent (sin cabecera, menús ni navboxes)
+    soup = BeautifulSoup(html, "lxml", parse_only=SoupStrainer("div", id="bodyContent"))
+    content_div = soup.find("div", id="bodyContent")
+    if not content_div:
+        raise RuntimeError("[Scraping] 'bodyContent' container not found.")
+
+    paragraphs = [_REF_PATTERN.sub("", p.get_text()) for p in content_div.find_all("p")]
+    return "\n\n".join(paragraphs).strip()
+
 def scrape_wikipedia_article(url: str) -> str:
     """
     Given a Wikipedia article URL in English, scrape and return the text of all <p> tags
@@ -31,19 +57,40 @@ def scrape_wikipedia_article(url: str) -> str:
         resp.raise_for_status()
     except Exception as e:
         raise RuntimeError(f"[Scraping] Error downloading URL: {e}")
+    return extract_article_text(resp.text)
 
-    soup = BeautifulSoup(resp.text, "lxml")
-    content_div = soup.find("div", id="bodyContent")
-    if not content_div:
-        raise RuntimeError("[Scraping] 'bodyContent' container not found.")
+async def scrape_wikipedia_article_async(url: str) -> str:
+    """
+    Async variant of `scrape_wikipedia_article`, through the shared scraper
+    (HTML cache with conditional re-fetch, per-host rate limit); HTML
+    parsing runs in a worker thread.
+    """
+    with span("scrape_fetch"):
+        html = await get_scraper().fetch(url)
+    with span("scrape_parse"):
+        return await asyncio.to_thread(extract_article_text, html)
 
-    text = ""
-    ref_pattern = re.compile(r"\[\d+\]")
-    for p in content_div.find_all("p"):
-        paragraph = p.get_text()
-        paragraph = ref_pattern.sub("", paragraph)
-        text += paragraph + "\n\n"
-    return text.strip()
+_MOBILE_HOST = re.compile(r"^(\w+)\.m\.(wikipedia\.org)$")
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def canonical_url(url: str) -> str:
+    """
+    Normalized form of an article URL, used as the document's identity:
+    lower-case host without the mobile `m.` subdomain or a default port,
+    path percent-encoded one consistent way with spaces as underscores,
+    and no #fragment.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = _MOBILE_HOST.sub(r"\1.\2", parts.hostname or "")
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host += f":{parts.port}"
+    path = quote(unquote(parts.path).replace(" ", "_"), safe="/:@!$&'()*+,;=-._~")
+    return urlunsplit((scheme, host, path, parts.query, ""))
+
+def doc_id_for_url(url: str) -> str:
+    """Stable doc_id of an article: every spelling of the same canonical URL gets the same one."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, canonical_url(url)))
 
 # 2. Guardar texto en .txt
 def save_text_to_file(text: str, filename: str) -> None:
@@ -55,30 +102,37 @@ def save_text_to_file(text: str, filename: str) -> None:
 # 3. Dividir texto en fragmentos
 def split_text_to_chunks(text: str, 
                          chunk_size: int = CHUNK_SIZE, 
-                         chunk_overlap: int = CHUNK_OVERLAP
+                         chunk_overlap: int = CHUNK_OVERLAP,
+                         unit: str = CHUNK_UNIT
                         ) -> List[str]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len
-    )
-    return splitter.split_text(text)
+    """Chunk texts on sentence/paragraph boundaries (see `chunker.chunk_text` for offsets)."""
+    return [c.text for c in chunk_text(text, chunk_size, chunk_overlap, unit)]
 
-# 4. Generar embedding con nomic-embed-text
+# 4. Generar embeddings con nomic-embed-text
 def generate_embedding_nomic(text: str) -> List[float]:
-    payload = {"model": EMBED_MODEL, "input": text}
-    try:
-        resp = requests.post(EMBED_ENDPOINT, json=payload, timeout=REQUEST_TIMEOUT)
-        resp.raise_for_status()
-    except Exception as e:
-        print(f"[Embedding] Error generating embedding: {e}")
-        return [0.0] * VECTOR_DIM
+    """
+    Embed a single text, going through the persistent embedding cache.
+    Raises EmbeddingError if the service keeps failing after retries,
+    instead of returning a zero vector that would pollute the index.
+    """
+    with span("embed"):
+        return get_embedding_client().embed([text])[0].tolist()
 
-    data = resp.json()
-    if "embeddings" in data and isinstance(data["embeddings"], list):
-        return data["embeddings"][0]
-    else:
-        raise RuntimeError(f"[Embedding] Unexpected response format: {data}")
+def generate_embeddings_nomic(texts: List[str]) -> np.ndarray:
+    """
+    Embed many texts with batched, concurrent requests over pooled connections.
+    Returns a float32 array of shape (len(texts), VECTOR_DIM) in input order.
+    """
+    with span("embed"):
+        return get_embedding_client().embed(texts)
+
+async def generate_embedding_nomic_async(text: str) -> List[float]:
+    with span("embed"):
+        return (await get_async_embedding_client().embed([text]))[0].tolist()
+
+async def generate_embeddings_nomic_async(texts: List[str]) -> np.ndarray:
+    with span("embed"):
+        return await get_async_embedding_client().embed(texts)
 
 # 5. Guardar/Cargar metadatos
 def save_metadata(metadata: List[Dict], path: str) -> None:
@@ -92,9 +146,9 @@ def load_metadata(path: str) -> List[Dict]:
         return json.load(f)
 
 # 6. Llamar a LLM con RAG context
-def chat_completion_rag(context_chunks: List[str], question: str) -> str:
+def build_rag_payload(context_chunks: List[str], question: str) -> Dict:
     """
-    Send the retrieved context chunks and user question to the LLM and return the generated answer.
+    Build the chat-completions payload for the retrieved context chunks and user question.
     The model is instructed to answer strictly using only the provided context fragments.
     """
     context = "\n\n---\n\n".join(context_chunks)
@@ -109,7 +163,7 @@ def chat_completion_rag(context_chunks: List[str], question: str) -> str:
         "Answer concisely:"
     )
 
-    payload = {
+    return {
         "model": CHAT_MODEL,
         "messages": [
             {"role": "system", "content": system_prompt},
@@ -119,15 +173,69 @@ def chat_completion_rag(context_chunks: List[str], question: str) -> str:
         "max_tokens": 512
     }
 
-    try:
-        resp = requests.post(CHAT_ENDPOINT, json=payload, timeout=REQUEST_TIMEOUT)
-        resp.raise_for_status()
-    except Exception as e:
-        print(f"[Chat] Error calling LLM: {e}")
-        return "Sorry, there was an error querying the language model."
+# Respuestas que indican una falla del LLM (no se deben cachear)
+CHAT_ERROR_ANSWER = "Sorry, there was an error querying the language model."
+CHAT_PARSE_ERROR_ANSWER = "Unable to extract a valid response from the language model."
 
-    data = resp.json()
+def parse_chat_response(data: Dict) -> str:
     if "choices" in data and isinstance(data["choices"], list):
         return data["choices"][0]["message"]["content"].strip()
     else:
-        return "Unable to extract a valid response from the language model."
+        return CHAT_PARSE_ERROR_ANSWER
+
+def chat_completion_rag(context_chunks: List[str], question: str) -> str:
+    """
+    Send the retrieved context chunks and user question to the LLM and return the generated answer.
+    The model is instructed to answer strictly using only the provided context fragments.
+    """
+    payload = build_rag_payload(context_chunks, question)
+    try:
+        with span("llm"):
+            resp = requests.post(CHAT_ENDPOINT, json=payload, timeout=REQUEST_TIMEOUT)
+            resp.raise_for_status()
+    except Exception as e:
+        print(f"[Chat] Error calling LLM: {e}")
+        UPSTREAM_ERRORS.inc(upstream="chat", reason="error")
+        return CHAT_ERROR_ANSWER
+
+    return parse_chat_response(resp.json())
+
+def parse_chat_stream_line(line: str) -> Optional[str]:
+    """Token carried by one line of an OpenAI-style `stream: true` response, if any."""
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if not data or data == "[DONE]":
+        return None
+    choices = json.loads(data).get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or None
+
+async def chat_completion_rag_stream(context_chunks: List[str], question: str) -> AsyncIterator[str]:
+    """
+    Streaming variant of `chat_completion_rag_async`: yields the answer's tokens
+    as the LLM generates them. Errors are raised, since part of the answer
+    may already have been sent.
+    """
+    payload = build_rag_payload(context_chunks, question)
+    payload["stream"] = True
+    with span("llm"):
+        async with upstreams.stream_post_json("chat", CHAT_ENDPOINT, payload) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                token = parse_chat_stream_line(line)
+                if token:
+                    yield token
+
+async def chat_completion_rag_async(context_chunks: List[str], question: str) -> str:
+    """Async variant of `chat_completion_rag` over the shared connection pool."""
+    payload = build_rag_payload(context_chunks, question)
+    try:
+        with span("llm"):
+            resp = await upstreams.post_json("chat", CHAT_ENDPOINT, payload)
+            resp.raise_for_status()
+    except Exception as e:
+        print(f"[Chat] Error calling LLM: {e!r}")
+        UPSTREAM_ERRORS.inc(upstream="chat", reason="error")
+        return CHAT_ERROR_ANSWER
+
+    return parse_chat_response(resp.json())
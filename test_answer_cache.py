@@ -0,0 +1,113 @@
+# test_answer_cache.py
+
+import numpy as np
+
+import src.answer_cache as answer_cache_module
+from src.answer_cache import AnswerCache, normalize_question
+from src.chunk_store import ChunkStore
+from src.segment_index import SegmentedIndex
+
+
+def _unit(seed, dim=16):
+    v = np.random.default_rng(seed).standard_normal(dim).astype("float32")
+    return v / np.linalg.norm(v)
+
+
+def test_exact_key_normalizes_question():
+    cache = AnswerCache()
+    key = cache.exact_key("What is a Banana?", ["d"], [3, 1])
+    cache.put(key, _unit(0), {"d"}, "A berry.", generation=10)
+
+    assert normalize_question("  what IS a banana ") == "what is a banana"
+    assert cache.get_exact(cache.exact_key("what is a banana", ["d"], [3, 1])) == "A berry."
+    # Otros fragmentos recuperados u otro alcance: no es la misma respuesta
+    assert cache.get_exact(cache.exact_key("what is a banana", ["d"], [3, 2])) is None
+    assert cache.get_exact(cache.exact_key("what is a banana", None, [3, 1])) is None
+
+
+def test_semantic_hit_within_threshold_and_scope():
+    cache = AnswerCache(similarity=0.9)
+    v = _unit(1)
+    cache.put(cache.exact_key("q", ["d"], [0]), v, {"d"}, "answer", generation=5)
+
+    near = v + 0.05 * _unit(2)
+    assert cache.get_semantic(near, ["d"], generation=5) == "answer"
+    assert cache.get_semantic(_unit(3), ["d"], generation=5) is None
+    assert cache.get_semantic(near, ["other"], generation=5) is None
+
+
+def test_unscoped_semantic_entries_follow_index_generation(tmp_path):
+    cache = AnswerCache(similarity=0.9)
+    v = _unit(4)
+    key = cache.exact_key("q", None, [0, 1])
+    index = SegmentedIndex(str(tmp_path / "index"), dim=16, legacy_path=None)
+    index.append(np.stack([_unit(10), _unit(11), _unit(12)]))
+    before = index.read_manifest()
+    cache.put(key, v, {"d"}, "answer", generation=before["generation"])
+    assert cache.get_semantic(v, None, generation=before["generation"]) == "answer"
+
+    # Otro worker borra fragmentos viejos: el tamaño del índice no cambia, la generación sí
+    index.remove([0])
+    after = index.read_manifest()
+    assert after["ntotal"] == before["ntotal"]
+    assert cache.get_semantic(v, None, generation=after["generation"]) is None
+    # La clave exacta (mismos fragmentos recuperados) sigue valiendo
+    assert cache.get_exact(key) == "answer"
+
+
+def test_invalidation_is_scoped_to_changed_documents():
+    cache = AnswerCache()
+    a = cache.exact_key("q", ["a"], [0])
+    b = cache.exact_key("q", ["b"], [1])
+    g = cache.exact_key("q", None, [0])
+    cache.put(a, _unit(5), {"a"}, "A", generation=2)
+    cache.put(b, _unit(6), {"b"}, "B", generation=2)
+    cache.put(g, _unit(7), {"a"}, "G", generation=2)
+
+    assert cache.invalidate_docs(["a"]) == 2
+    assert cache.get_exact(b) == "B"
+    assert cache.get_exact(a) is None and cache.get_exact(g) is None
+
+
+def test_reingest_in_one_worker_invalidates_the_others(tmp_path):
+    # Dos workers: cada uno con su caché y su conexión al mismo chunk store
+    path = str(tmp_path / "chunks.sqlite3")
+    writer, reader = ChunkStore(path), ChunkStore(path)
+    writer_cache, reader_cache = AnswerCache(similarity=0.9, chunks=writer), AnswerCache(similarity=0.9, chunks=reader)
+    record = {"doc_id": "d", "chunk_id": 0, "text": "Bananas are berries."}
+    writer.replace_document("d", "https://en.wikipedia.org/wiki/Banana", "v1", 0, [record], [], [])
+
+    v = _unit(8)
+    key = reader_cache.exact_key("q", ["d"], [0])
+    before = reader_cache.doc_versions(["d"])
+    reader_cache.put(key, v, {"d"}, "Berries.", generation=1, versions=before)
+    assert reader_cache.get_semantic(v, ["d"], generation=1) == "Berries."
+
+    # El writer re-indexa el documento: solo invalida su propia caché
+    writer.replace_document("d", "https://en.wikipedia.org/wiki/Banana", "v2", 1,
+                            [{**record, "text": "Bananas are herbs."}], [], [0])
+    writer_cache.invalidate_docs(["d"])
+    assert reader_cache.get_semantic(v, ["d"], generation=2) is None
+
+    # Una respuesta calculada con la versión anterior no queda marcada con la nueva
+    reader_cache.put(reader_cache.exact_key("q2", ["d"], [0]), v, {"d"}, "Old.", generation=1, versions=before)
+    assert reader_cache.get_semantic(v, ["d"], generation=2) is None
+    reader_cache.put(reader_cache.exact_key("q", ["d"], [1]), v, {"d"}, "Herbs.", generation=2)
+    assert reader_cache.get_semantic(v, ["d"], generation=2) == "Herbs."
+
+
+def test_lru_and_ttl_eviction(monkeypatch):
+    cache = AnswerCache(max_entries=2, ttl=10)
+    keys = [cache.exact_key(f"q{i}", None, [i]) for i in range(3)]
+    cache.put(keys[0], _unit(0), set(), "0", generation=1)
+    cache.put(keys[1], _unit(1), set(), "1", generation=1)
+    cache.get_exact(keys[0])                 # keys[0] pasa a ser el más reciente
+    cache.put(keys[2], _unit(2), set(), "2", generation=1)
+
+    assert cache.get_exact(keys[1]) is None
+    assert cache.get_exact(keys[0]) == "0"
+
+    now = answer_cache_module.time.time()
+    monkeypatch.setattr(answer_cache_module.time, "time", lambda: now + 11)
+    assert cache.get_exact(keys[0]) is None
+    assert cache.get_semantic(_unit(2), None, generation=1) is None
@@ -0,0 +1,158 @@
+# test_async_api.py
+
+import json
+import time
+import asyncio
+import httpx
+import numpy as np
+import pytest
+from starlette.testclient import TestClient
+
+import src.api_server as api_server
+import src.utils as utils
+from src.retrieval_store import RetrievalStore
+from src.segment_index import SegmentedIndex
+from src.answer_cache import AnswerCache
+from src.chunk_store import ChunkStore
+from src.embedding_client import get_async_embedding_client
+from src.fake_upstream import start_fake_upstream, fake_embedding
+
+TEXTS = ["apple orange banana", "car bus train", "apple pie recipe"]
+
+
+@pytest.fixture
+def fake_backend(tmp_path, monkeypatch):
+    server, base_url = start_fake_upstream(answer="Bananas are yellow.")
+
+    segmented = SegmentedIndex(str(tmp_path / "index"), legacy_path=None)
+    segmented.append(np.array([fake_embedding(t) for t in TEXTS], dtype="float32"))
+    chunks = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+    chunks.append(0, [{"doc_id": f"d{i % 2}", "chunk_id": i, "text": t} for i, t in enumerate(TEXTS)])
+
+    monkeypatch.setattr(api_server, "retrieval_store", RetrievalStore(segmented, chunks))
+    monkeypatch.setattr(api_server, "answer_cache", AnswerCache())
+    monkeypatch.setattr(utils, "CHAT_ENDPOINT", f"{base_url}/v1/chat/completions")
+    monkeypatch.setattr(get_async_embedding_client(), "endpoint", f"{base_url}/api/embed")
+    monkeypatch.setattr(get_async_embedding_client(), "cache", None)
+    yield server
+    server.shutdown()
+
+
+def test_query_uses_fake_upstreams(fake_backend):
+    resp = TestClient(api_server.app).post("/query", json={"question": "apple orange banana"})
+    assert resp.status_code == 200
+    assert resp.json()["answer"] == "Bananas are yellow."
+    # Un POST de embedding + uno de chat
+    assert fake_backend.requests == 2
+
+
+def test_repeated_query_is_answered_from_cache(fake_backend):
+    client = TestClient(api_server.app)
+    for question in ("Apple orange banana?", "apple, orange  banana"):
+        resp = client.post("/query", json={"question": question})
+        assert resp.json()["answer"] == "Bananas are yellow."
+    # La segunda pregunta solo necesitó su embedding: sin búsqueda ni LLM
+    assert fake_backend.requests == 3
+    stats = client.get("/answer-cache/stats").json()
+    assert stats["entries"] == 1 and stats["exact_hits"] + stats["semantic_hits"] == 1
+
+
+def _sse(text):
+    return [json.loads(line[len("data: "):]) for line in text.splitlines() if line.startswith("data: ")]
+
+
+def test_stream_relays_tokens_and_caches_answer(fake_backend, monkeypatch):
+    client = TestClient(api_server.app)
+    resp = client.post("/query/stream", json={"question": "apple orange banana"})
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _sse(resp.text)
+    tokens = [e["token"] for e in events if "token" in e]
+    assert len(tokens) == 3 and "".join(tokens) == "Bananas are yellow."
+    assert events[-1] == {"done": True}
+
+    # La respuesta completa quedó en caché y la ruta sin streaming la reutiliza (solo embedding)
+    assert client.post("/query", json={"question": "apple orange banana"}).json()["answer"] == "Bananas are yellow."
+    assert fake_backend.requests == 3
+
+    monkeypatch.setattr(utils, "CHAT_ENDPOINT", utils.CHAT_ENDPOINT.replace("/v1/", "/v2/"))
+    events = _sse(client.post("/query/stream", json={"question": "car bus"}).text)
+    assert events == [{"error": utils.CHAT_ERROR_ANSWER}]
+    assert client.post("/query/stream", json={"question": " "}).status_code == 400
+
+
+def test_query_scoped_to_document(fake_backend, monkeypatch):
+    seen = []
+
+    async def fake_chat(chunks, question):
+        seen.append(chunks)
+        return "ok"
+
+    monkeypatch.setattr(api_server, "chat_completion_rag_async", fake_chat)
+    client = TestClient(api_server.app)
+
+    # d0 tiene los ids 0 y 2 ("apple ..."), d1 solo el 1
+    assert client.post("/query", json={"question": "apple", "doc_id": "d0"}).status_code == 200
+    assert sorted(seen[-1]) == ["apple orange banana", "apple pie recipe"]
+    assert client.post("/query", json={"question": "apple", "doc_id": "d1"}).status_code == 200
+    assert seen[-1] == ["car bus train"]
+    assert client.post("/query", json={"question": "bus", "doc_ids": ["d0", "d1"]}).status_code == 200
+    # La coincidencia léxica queda primera aunque el vector de la pregunta no se le parezca
+    assert seen[-1][0] == "car bus train"
+    assert client.post("/query", json={"question": "apple", "doc_id": "missing"}).status_code == 404
+
+
+def test_concurrent_queries_do_not_serialize(fake_backend):
+    fake_backend.latency = 0.2
+    n = 20
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api_server.app), base_url="http://test") as client:
+            t0 = time.perf_counter()
+            resps = await asyncio.gather(*(
+                client.post("/query", json={"question": f"apple {i}"}) for i in range(n)
+            ))
+            return time.perf_counter() - t0, resps
+
+    elapsed, resps = asyncio.run(run())
+    assert all(r.status_code == 200 for r in resps)
+    # En serie serían n * 2 * 0.2s = 8s; en paralelo ~0.4s
+    assert elapsed < 2.0
+
+
+def test_ready_reports_warm_index(fake_backend, monkeypatch, tmp_path):
+    from src.jobs import JobStore, IngestionQueue
+    monkeypatch.setattr(api_server, "migrate_from_json", lambda store, path: 0)
+    monkeypatch.setattr(api_server, "ingestion_queue", IngestionQueue(JobStore(str(tmp_path / "jobs.sqlite3"))))
+
+    with TestClient(api_server.app) as client:
+        deadline = time.time() + 10
+        resp = client.get("/ready")
+        while resp.status_code == 503 and time.time() < deadline:
+            assert resp.json()["status"] == "warming"
+            time.sleep(0.02)
+            resp = client.get("/ready")
+        assert resp.status_code == 200
+        assert resp.json() == {"ready": True, "index": {"loaded": True, "generation": 1, "segments": 1, "ntotal": 3, "deleted": 0}}
+
+
+def test_query_reports_stage_timings_and_metrics(fake_backend, monkeypatch, capsys):
+    import src.metrics as metrics
+    client = TestClient(api_server.app)
+    resp = client.post("/query", json={"question": "apple orange banana"})
+    stages = [part.split(";")[0] for part in resp.headers["server-timing"].split(", ")]
+    assert stages == ["index_load", "embed", "answer_cache", "vector_search", "keyword_search",
+                      "lookup", "context", "llm", "total"]
+
+    monkeypatch.setattr(utils, "CHAT_ENDPOINT", utils.CHAT_ENDPOINT.replace("/v1/", "/v2/"))
+    client.post("/query", json={"question": "car bus"})
+    text = client.get("/metrics").text
+    assert 'rag_stage_seconds_count{stage="llm"}' in text
+    assert 'rag_http_request_seconds_bucket{method="POST",route="query_article",status="200",le="+Inf"}' in text
+    assert 'rag_upstream_errors_total{upstream="chat",reason="error"}' in text
+    assert 'rag_cache_lookups_total{cache="answer",result="miss"}' in text
+
+    # Log de requests lentos, con sus etapas
+    monkeypatch.setattr(metrics, "SLOW_REQUEST_SECONDS", 1e-9)
+    client.post("/query", json={"question": "train"})
+    out = capsys.readouterr().out
+    assert "[Slow] POST /query → 200" in out and "vector_search" in out
@@ -0,0 +1,90 @@
+# test_build_index.py
+
+import os
+import numpy as np
+import pytest
+
+from src.build_index import index_documents
+from src.chunker import chunk_text
+from src.chunk_store import ChunkStore
+from src.segment_index import SegmentedIndex
+from src.fake_upstream import fake_embedding
+
+
+def _docs(tmp_path, n=6):
+    paths = []
+    for d in range(n):
+        path = tmp_path / f"doc{d}.txt"
+        path.write_text("\n\n".join(f"Doc {d} paragraph {p} talks about fruit number {p * d}." for p in range(60)))
+        paths.append(str(path))
+    return paths
+
+
+def test_interrupted_run_resumes_from_checkpoint(tmp_path, capsys):
+    paths = _docs(tmp_path)
+    per_doc = {os.path.basename(p)[:-4]: len(chunk_text(open(p).read())) for p in paths}
+    total = sum(per_doc.values())
+    index = SegmentedIndex(str(tmp_path / "index"), legacy_path=None, compact_max_segments=100)
+    chunks = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+    embedded = []
+
+    def embed(texts, fail_after=None):
+        if fail_after is not None and len(embedded) >= fail_after:
+            raise RuntimeError("embedding service down")
+        embedded.extend(texts)
+        return np.array([fake_embedding(t) for t in texts], dtype="float32")
+
+    options = dict(queue_size=2, batch_size=8, flush_every=16)
+    with pytest.raises(RuntimeError, match="down"):
+        index_documents(paths, index, chunks, embed=lambda t: embed(t, fail_after=40), chunk_workers=0, **options)
+    saved = len(chunks)
+    # Lo embebido antes de la falla quedó guardado y alineado con el índice
+    assert 16 <= saved <= 40 < total and index.read_manifest()["ntotal"] == saved
+
+    embedded.clear()
+    capsys.readouterr()
+    stages = index_documents(paths, index, chunks, embed=embed, chunk_workers=1, **options)
+    assert f"Reanudado: {saved} fragmentos" in capsys.readouterr().out
+
+    # Solo se embebió lo que faltaba
+    assert len(embedded) == stages["index"].items == total - saved
+    assert stages["read"].items == len(paths) and stages["chunk"].items == total
+    assert len(chunks) == index.read_manifest()["ntotal"] == total
+    for doc_id, n in per_doc.items():
+        assert chunks.chunk_ids(doc_id) == set(range(n))
+    view = index.open_view()
+    for i in (0, saved, total - 1):
+        assert np.allclose(view.reconstruct_ids(np.array([i]))[0], fake_embedding(chunks.get(i)["text"]))
+
+    # Un artículo que cambió: se reemplaza, y solo se embebe el fragmento distinto
+    with open(paths[0], "a", encoding="utf-8") as f:
+        f.write(" Extra words.")
+    embedded.clear()
+    index_documents(paths, index, chunks, embed=embed, chunk_workers=0, **options)
+    out = capsys.readouterr().out
+    assert len(embedded) == 1 and embedded[0].endswith("Extra words.")
+    assert f"Reanudado: {total - 1} fragmentos" in out and "Re-fragmentados 1 documentos" in out
+    assert [c["text"] for c in chunks.doc_chunks("doc0")] == [c.text for c in chunk_text(open(paths[0]).read())]
+
+
+def test_documents_migrated_with_old_chunking_are_rechunked(tmp_path):
+    paths = _docs(tmp_path, n=2)
+    index = SegmentedIndex(str(tmp_path / "index"), legacy_path=None)
+    chunks = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+    # Como quedan tras migrate_from_json: fragmentos de 100/20 sin offsets
+    legacy = [{"doc_id": os.path.basename(p)[:-4], "chunk_id": i, "text": c.text}
+              for p in paths for i, c in enumerate(chunk_text(open(p).read(), 100, 20))]
+    chunks.append(index.append(np.array([fake_embedding(r["text"]) for r in legacy], dtype="float32")), legacy)
+
+    embed = lambda texts: np.array([fake_embedding(t) for t in texts], dtype="float32")
+    index_documents(paths, index, chunks, embed=embed, chunk_workers=0)
+    for p in paths:
+        current = chunk_text(open(p).read())
+        assert [(c["text"], c["start"]) for c in chunks.doc_chunks(os.path.basename(p)[:-4])] == \
+               [(c.text, c.start) for c in current]
+    view = index.open_view()
+    assert view.ntotal - len(view.deleted) == len(chunks)
+
+    # La siguiente corrida ya no tiene nada que hacer
+    again = index_documents(paths, index, chunks, embed=embed, chunk_workers=0)
+    assert again["index"].items == 0 and again["embed"].items == 0
@@ -0,0 +1,79 @@
+# test_chunk_store.py
+
+import json
+import threading
+
+from src.chunk_store import ChunkStore, migrate_from_json
+from src.utils import load_metadata
+
+
+def _records(doc_id, n):
+    return [{"doc_id": doc_id, "chunk_id": i, "text": f"{doc_id} texto {i}"} for i in range(n)]
+
+
+def test_append_and_lookup_by_faiss_id(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+    store.append(0, _records("a", 3))
+    store.append(store.next_id(), _records("b", 2))
+
+    assert len(store) == 5 and store.next_id() == 5
+    got = store.get_many([4, 0, 99, -1])
+    assert got[0]["doc_id"] == "b" and got[0]["chunk_id"] == 1
+    assert got[1]["text"] == "a texto 0"
+    assert got[2] is None and got[3] is None
+    assert store.chunk_ids("a") == {0, 1, 2}
+
+
+def test_reads_from_other_threads(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+    store.append(0, _records("a", 2))
+    result = []
+    t = threading.Thread(target=lambda: result.append(store.get(1)))
+    t.start()
+    t.join()
+    assert result[0]["text"] == "a texto 1"
+
+
+def test_migrate_from_json_keeps_positions(tmp_path):
+    json_path = str(tmp_path / "metadatos.json")
+    metadatos = _records("a", 3) + _records("b", 2)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(metadatos, f)
+    store = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+
+    assert migrate_from_json(store, json_path) == 5
+    # Idempotente: con datos ya migrados no vuelve a importar
+    assert migrate_from_json(store, json_path) == 0
+    assert list(store.iter_all()) == load_metadata(json_path)
+    assert store.get(3) == {"id": 3, **metadatos[3]}
+
+
+def test_bm25_index_follows_appends_and_replaces(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+    store.append(0, [
+        {"doc_id": "a", "chunk_id": 0, "text": "Bananas are berries botanically."},
+        {"doc_id": "a", "chunk_id": 1, "text": "The banana plant is a herb; banana fruit grows in clusters."},
+        {"doc_id": "b", "chunk_id": 0, "text": "Trains run on rails."},
+    ])
+
+    # Stemming: "banana" también encuentra "Bananas"
+    hits = store.search_bm25("What is a banana?", 5)
+    assert sorted(i for i, _ in hits) == [0, 1] and hits[0][1] >= hits[1][1] > 0
+    assert store.search_bm25("banana", 5, doc_ids=["b"]) == []
+    assert [i for i, _ in store.search_bm25("banana", 5, max_id=1)] == [0]
+    assert store.search_bm25("what is the", 5) == []
+
+    # Reintento que reescribe el mismo fragmento: el índice invertido no queda con el texto viejo
+    store.append(1, [{"doc_id": "a", "chunk_id": 1, "text": "Plantains are cooked."}])
+    assert [i for i, _ in store.search_bm25("banana", 5)] == [0]
+    assert [i for i, _ in store.search_bm25("plantain", 5)] == [1]
+
+
+def test_offsets_round_trip(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+    store.append(0, [
+        {"doc_id": "a", "chunk_id": 0, "text": "One.", "start": 0, "end": 4},
+        {"doc_id": "a", "chunk_id": 1, "text": "Two."},
+    ])
+    assert store.get(0) == {"id": 0, "doc_id": "a", "chunk_id": 0, "text": "One.", "start": 0, "end": 4}
+    assert "start" not in store.get(1)
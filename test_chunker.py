@@ -0,0 +1,72 @@
+# test_chunker.py
+
+import pytest
+
+from src.chunker import chunk_text, count_tokens
+
+ARTICLE = (
+    "Bananas are berries. The plant is a herb! Is it a tree? No.\n\n"
+    "Cavendish bananas dominate exports. They are clones, so disease spreads fast.\n\n"
+    + "A very long sentence without any stop that keeps going " * 6
+)
+
+
+def test_offsets_reproduce_original_text():
+    chunks = chunk_text(ARTICLE, 80, 30)
+    assert chunks
+    for c in chunks:
+        assert ARTICLE[c.start:c.end] == c.text
+        assert len(c.text) <= 80
+        assert c.text == c.text.strip()
+
+
+def test_splits_on_sentence_and_paragraph_boundaries():
+    chunks = chunk_text(ARTICLE, 80, 0)
+    # Ningún chunk cruza el corte de párrafo cuando ya tiene la mitad del tamaño
+    assert chunks[0].text == "Bananas are berries. The plant is a herb! Is it a tree? No."
+    assert chunks[1].text.startswith("Cavendish") and chunks[1].text.endswith("spreads fast.")
+    # Una oración más larga que el tamaño se corta entre palabras
+    assert all(len(c.text) <= 80 for c in chunks[2:]) and len(chunks) > 3
+
+
+def test_closing_quotes_stay_with_their_sentence():
+    text = 'He said "Hi." Then he left (quickly.) The end.'
+    chunks = chunk_text(text, 25, 0)
+    assert [c.text for c in chunks] == ['He said "Hi."', "Then he left (quickly.)", "The end."]
+    assert " ".join(c.text for c in chunks) == text
+
+
+@pytest.mark.parametrize("text", [
+    "one two three four five six seven eight nine ten eleven twelve",
+    "x" * 50 + " word",
+    "Short. " + "y" * 45 + ". Then " + "z" * 21,
+])
+def test_no_chunk_exceeds_size_at_the_boundary(text):
+    chunks = chunk_text(text, 20, 5)
+    assert all(len(c.text) <= 20 and text[c.start:c.end] == c.text for c in chunks)
+    # Sin solapamiento no se pierde ni se repite nada
+    assert "".join(c.text for c in chunk_text(text, 20, 0)).replace(" ", "") == "".join(text.split())
+
+
+def test_overlap_repeats_whole_sentences():
+    text = "One is first. Two is second. Three is third. Four is fourth."
+    chunks = chunk_text(text, 31, 15)
+    assert [c.text for c in chunks] == [
+        "One is first. Two is second.",
+        "Two is second. Three is third.",
+        "Three is third. Four is fourth.",
+    ]
+    assert all(b.start < a.end for a, b in zip(chunks, chunks[1:]))
+
+
+def test_token_unit():
+    assert count_tokens("Hello, world!") == 4
+    chunks = chunk_text(ARTICLE, 12, 0, unit="tokens")
+    assert all(count_tokens(c.text) <= 12 for c in chunks)
+    with pytest.raises(ValueError):
+        chunk_text(ARTICLE, 12, 0, unit="words")
+
+
+def test_empty_text():
+    assert chunk_text("", 100, 10) == []
+    assert chunk_text("  \n\n ", 100, 10) == []
@@ -0,0 +1,46 @@
+# test_context_packing.py
+
+import numpy as np
+
+from src.chunker import chunk_text, count_tokens
+from src.context_packing import merge_adjacent, mmr_order, pack_context
+
+ARTICLE = " ".join(f"Sentence number {i} is about bananas and their history." for i in range(40))
+
+
+def _records(doc_id, chunks, first_id=0):
+    return [{"id": first_id + i, "doc_id": doc_id, "chunk_id": i, "text": c.text, "start": c.start, "end": c.end}
+            for i, c in enumerate(chunks)]
+
+
+def test_adjacent_chunks_merge_without_repeating_overlap():
+    records = _records("a", chunk_text(ARTICLE, 200, 60))
+    assert records[1]["start"] < records[0]["end"]
+    # Orden de relevancia: 3, 1, 2 (1-2-3 son vecinos), 6 aparte, y uno de otro documento
+    other = {"id": 99, "doc_id": "b", "chunk_id": 2, "text": "Unrelated.", "start": None, "end": None}
+    passages = merge_adjacent([records[3], other, records[1], records[6], records[2]])
+    assert [p["ids"] for p in passages] == [[1, 2, 3], [99], [6]]
+    assert passages[0]["text"] == ARTICLE[records[1]["start"]:records[3]["end"]]
+
+    # Sin offsets (metadatos migrados) el solapamiento se detecta por el texto
+    legacy = [{**r, "start": None, "end": None} for r in records[:2]]
+    assert merge_adjacent(legacy)[0]["text"] == ARTICLE[records[0]["start"]:records[1]["end"]]
+
+
+def test_mmr_prefers_diverse_candidates():
+    rng = np.random.default_rng(0)
+    a, b = rng.standard_normal((2, 16)).astype("float32")
+    vectors = np.stack([a, a + 0.01, b])
+    relevance = np.array([1.0, 0.9, 0.8], dtype="float32")
+    assert mmr_order(relevance, vectors, lambda_=0.5) == [0, 2, 1]
+    assert mmr_order(relevance, vectors, lambda_=1.0) == [0, 1, 2]
+
+
+def test_pack_context_respects_token_budget():
+    records = _records("a", chunk_text(ARTICLE, 200, 60))
+    vectors = np.random.default_rng(1).standard_normal((len(records), 16)).astype("float32")
+    chosen, context = pack_context(records, vectors, budget=120, max_chunks=6)
+    assert chosen[0] is records[0]
+    assert sum(count_tokens(t) for t in context) <= 120 and 1 < len(chosen) < 6
+    assert len(pack_context(records, vectors, budget=10_000, max_chunks=4)[0]) == 4
+    assert pack_context([], vectors[:0]) == ([], [])
@@ -0,0 +1,85 @@
+# test_embedding_cache.py
+
+import numpy as np
+
+from src.embedding_cache import EmbeddingCache
+from src.embedding_client import EmbeddingClient
+from src.fake_upstream import start_fake_upstream
+
+
+def _vecs(n, dim=8):
+    return np.random.rand(n, dim).astype("float32")
+
+
+def test_hits_and_misses(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "c.sqlite3"), dim=8)
+    v = _vecs(2)
+    cache.put_many(["a", "b"], v)
+
+    got = cache.get_many(["a", "x", "b"])
+
+    assert np.array_equal(got[0], v[0]) and got[1] is None and np.array_equal(got[2], v[1])
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    v = _vecs(1)
+    EmbeddingCache(path, dim=8).put_many(["hola"], v)
+
+    again = EmbeddingCache(path, dim=8)
+    assert len(again) == 1
+    assert np.array_equal(again.get_many(["hola"])[0], v[0])
+
+
+def test_key_includes_model(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    EmbeddingCache(path, model="m1", dim=8).put_many(["hola"], _vecs(1))
+    assert EmbeddingCache(path, model="m2", dim=8).get_many(["hola"]) == [None]
+
+
+def test_lru_eviction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "c.sqlite3"), max_entries=10, dim=8)
+    cache.put_many([f"t{i}" for i in range(10)], _vecs(10))
+    # "t0" se vuelve el más reciente; "t1" pasa a ser el menos usado
+    cache.get_many(["t0"])
+    cache.put_many(["nuevo"], _vecs(1))
+
+    assert len(cache) <= 10
+    assert cache.get_many(["t0"])[0] is not None
+    assert cache.get_many(["t1"])[0] is None
+
+
+def test_workers_share_clock_and_count(tmp_path):
+    # Dos workers abren la caché antes de que ninguno inserte
+    path = str(tmp_path / "c.sqlite3")
+    a = EmbeddingCache(path, max_entries=10, dim=8, touch_interval=3600)
+    b = EmbeddingCache(path, max_entries=10, dim=8, touch_interval=3600)
+    a.put_many([f"a{i}" for i in range(6)], _vecs(6))
+    b.put_many([f"b{i}" for i in range(3)], _vecs(3))
+
+    # El hit de "a0" en A se escribe con su próxima inserción, en el reloj común
+    assert a.get_many(["a0"])[0] is not None
+    a.put_many(["a6"], _vecs(1))
+    b.put_many(["b3", "b4"], _vecs(2))
+
+    assert len(a) == len(b) <= 10
+    assert a.get_many(["a0"])[0] is not None and b.get_many(["b4"])[0] is not None
+    assert a.get_many(["a1"])[0] is None
+
+
+def test_client_skips_remote_on_hit(tmp_path):
+    server, base_url = start_fake_upstream()
+    try:
+        cache = EmbeddingCache(str(tmp_path / "c.sqlite3"))
+        client = EmbeddingClient(endpoint=f"{base_url}/api/embed", cache=cache)
+
+        first = client.embed(["uno", "dos", "uno"])
+        assert server.requests == 1
+        second = client.embed(["dos", "uno"])
+
+        assert server.requests == 1
+        assert np.array_equal(first[1], second[0]) and np.array_equal(first[0], second[1])
+        assert np.array_equal(first[0], first[2])
+    finally:
+        server.shutdown()
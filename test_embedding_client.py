@@ -0,0 +1,58 @@
+# test_embedding_client.py
+
+import numpy as np
+import pytest
+
+from src.embedding_client import EmbeddingClient, EmbeddingError
+from src.fake_upstream import start_fake_upstream, fake_embedding
+
+
+@pytest.fixture
+def upstream():
+    server, base_url = start_fake_upstream()
+    yield server, f"{base_url}/api/embed"
+    server.shutdown()
+
+
+def test_batches_preserve_order(upstream):
+    server, endpoint = upstream
+    client = EmbeddingClient(endpoint=endpoint, batch_size=4, max_concurrency=3)
+    texts = [f"texto {i}" for i in range(10)]
+
+    vecs = client.embed(texts)
+
+    assert vecs.shape == (10, 768) and vecs.dtype == np.float32
+    for t, v in zip(texts, vecs):
+        assert np.allclose(v, fake_embedding(t))
+    # 10 textos en lotes de 4 → 3 POSTs, no 10
+    assert server.requests == 3
+
+
+def test_retries_transient_failures(upstream):
+    server, endpoint = upstream
+    server.fail_next = 2
+    client = EmbeddingClient(endpoint=endpoint, max_retries=3, retry_backoff=0.0)
+
+    vec = client.embed_batch(["hola"])[0]
+
+    assert np.allclose(vec, fake_embedding("hola"))
+    assert server.requests == 3
+
+
+def test_exhausted_retries_raise(upstream):
+    server, endpoint = upstream
+    server.fail_next = 10
+    client = EmbeddingClient(endpoint=endpoint, max_retries=2, retry_backoff=0.0)
+
+    with pytest.raises(EmbeddingError):
+        client.embed(["a", "b"])
+    assert server.requests == 3
+
+
+def test_dimension_mismatch_is_reported(upstream):
+    server, endpoint = upstream
+    server.dim = 16
+    client = EmbeddingClient(endpoint=endpoint)
+
+    with pytest.raises(EmbeddingError, match="dimension"):
+        client.embed(["a"])
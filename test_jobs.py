@@ -0,0 +1,216 @@
+# test_jobs.py
+
+import time
+import asyncio
+import numpy as np
+import pytest
+from starlette.testclient import TestClient
+
+import src.api_server as api_server
+import src.ingestion as ingestion
+from src.jobs import JobStore, IngestionQueue, QUEUED, RUNNING, DONE, FAILED
+from src.retrieval_store import RetrievalStore
+from src.segment_index import SegmentedIndex
+from src.chunk_store import ChunkStore
+from src.embedding_client import get_async_embedding_client
+from src.fake_upstream import start_fake_upstream, fake_embedding
+from src.chunker import chunk_text
+from src.utils import doc_id_for_url
+
+ARTICLE = "Bananas are berries. " * 40
+URL = "https://en.wikipedia.org/wiki/Banana"
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    server, base_url = start_fake_upstream()
+    segmented = SegmentedIndex(str(tmp_path / "index"), legacy_path=None)
+    chunks = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+
+    async def fake_scrape(url):
+        if "Missing" in url:
+            raise RuntimeError("404 Not Found")
+        return ARTICLE
+
+    monkeypatch.setattr(ingestion, "scrape_wikipedia_article_async", fake_scrape)
+    monkeypatch.setattr(ingestion, "save_text_to_file", lambda text, filename: None)
+    monkeypatch.setattr(ingestion, "segmented_index", segmented)
+    monkeypatch.setattr(ingestion, "chunk_store", chunks)
+    monkeypatch.setattr(ingestion, "retrieval_store", RetrievalStore(segmented, chunks))
+    monkeypatch.setattr(get_async_embedding_client(), "endpoint", f"{base_url}/api/embed")
+    monkeypatch.setattr(get_async_embedding_client(), "cache", None)
+
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store, segmented
+    server.shutdown()
+
+
+def test_store_requeues_interrupted_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path)
+    a = store.create(URL, "doc-a")
+    b = store.create(URL, "doc-b")
+    store.update(b["job_id"], status=RUNNING, stage="embedding", progress=0.5)
+
+    # Otro proceso (reinicio) abre la misma base
+    pending = JobStore(path).requeue_interrupted()
+
+    assert pending == [a["job_id"], b["job_id"]]
+    assert store.get(b["job_id"])["status"] == QUEUED
+
+
+def test_upload_returns_job_and_indexes_in_background(pipeline, monkeypatch):
+    store, segmented = pipeline
+    monkeypatch.setattr(api_server, "job_store", store)
+    monkeypatch.setattr(api_server, "ingestion_queue", IngestionQueue(store))
+    monkeypatch.setattr(api_server, "chunk_store", ingestion.chunk_store)
+    monkeypatch.setattr(api_server, "migrate_from_json", lambda store, path: 0)
+
+    with TestClient(api_server.app) as client:
+        resp = client.post("/upload-article", json={"url": URL})
+        assert resp.status_code == 202
+        job_id = resp.json()["job_id"]
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] in (DONE, FAILED):
+                break
+            time.sleep(0.05)
+
+        assert job["status"] == DONE, job
+        assert job["doc_id"] == resp.json()["doc_id"]
+        assert job["chunks_indexed"] == segmented.read_manifest()["ntotal"] > 0
+
+        events = client.get(f"/jobs/{job_id}/events").text
+        assert '"status": "done"' in events
+
+        # Misma URL escrita de otra forma: mismo documento, recién revisado → sin job nuevo
+        again = client.post("/upload-article", json={"url": "https://en.m.wikipedia.org/wiki/Banana#Etymology"})
+        assert again.json() == {"status": "Article already indexed", "doc_id": job["doc_id"], "job_id": None}
+
+    assert TestClient(api_server.app).get("/jobs/nope").status_code == 404
+
+
+def test_queued_jobs_survive_restart(pipeline):
+    store, segmented = pipeline
+    # Jobs encolados por un proceso que murió antes de procesarlos
+    ok = store.create(URL, "doc-ok")
+    bad = store.create("https://en.wikipedia.org/wiki/Missing", "doc-bad")
+
+    async def restart():
+        queue = IngestionQueue(store, workers=1)
+        queue.start()
+        await queue.wait_idle()
+        await queue.stop()
+
+    asyncio.run(restart())
+
+    assert store.get(ok["job_id"])["status"] == DONE
+    failed = store.get(bad["job_id"])
+    assert failed["status"] == FAILED and "404" in failed["error"]
+    assert segmented.read_manifest()["ntotal"] == store.get(ok["job_id"])["chunks_indexed"]
+
+
+def test_reupload_embeds_only_changed_chunks(pipeline, monkeypatch):
+    store, segmented = pipeline
+    paragraphs = [f"Paragraph {p} is about fruit number {p}. " * 5 for p in range(12)]
+    page = {"text": "\n\n".join(paragraphs)}
+    embedded = []
+
+    async def scrape(url):
+        return page["text"]
+
+    async def embed(texts):
+        embedded.append(len(texts))
+        return np.array([fake_embedding(t) for t in texts], dtype="float32")
+
+    monkeypatch.setattr(ingestion, "scrape_wikipedia_article_async", scrape)
+    monkeypatch.setattr(ingestion, "generate_embeddings_nomic_async", embed)
+    doc_id = doc_id_for_url(URL)
+
+    def ingest():
+        embedded.clear()
+        return asyncio.run(ingestion.ingest_article(URL, doc_id, lambda stage, progress: None))
+
+    first = ingest()
+    assert first == len(chunk_text(page["text"])) and sum(embedded) == first
+
+    # Sin cambios: ni un embedding
+    assert ingest() == 0 and embedded == []
+
+    paragraphs[5] = "A completely new paragraph about kiwis. " * 5
+    page["text"] = "\n\n".join(paragraphs)
+    added = ingest()
+    assert 0 < added < first and sum(embedded) == added
+
+    stored = ingestion.chunk_store.doc_chunks(doc_id)
+    assert [c["text"] for c in stored] == [c.text for c in chunk_text(page["text"])]
+    assert [c["chunk_id"] for c in stored] == list(range(len(stored)))
+    # Los vectores viejos de los fragmentos reemplazados se borraron del índice
+    manifest = segmented.read_manifest()
+    assert manifest["ntotal"] == first + added and len(manifest["deleted"]) == first + added - len(stored)
+    view = segmented.open_view()
+    ids = np.array([c["id"] for c in stored])
+    assert np.allclose(view.reconstruct_ids(ids), [fake_embedding(c["text"]) for c in stored])
+    _, I = view.search(np.array([fake_embedding(c["text"]) for c in stored]), 1)
+    assert list(I[:, 0]) == list(ids)
+
+
+def test_single_writer_runs_jobs_queued_by_other_workers(pipeline, tmp_path):
+    from src.jobs import WriterLock
+    store, segmented = pipeline
+    lock_path = str(tmp_path / "writer.lock")
+    writer, reader = WriterLock(lock_path), WriterLock(lock_path)
+    assert writer.acquire() and not reader.acquire()
+
+    async def run():
+        queue = IngestionQueue(store, workers=1, poll_interval=0.02)
+        queue.start()
+        # Otro worker (sin la cola) solo registra los jobs en la base compartida
+        jobs = [JobStore(store.path).create(URL, doc_id_for_url(URL)) for _ in range(3)]
+        deadline = time.time() + 10
+        while any(store.get(j["job_id"])["status"] == QUEUED for j in jobs) and time.time() < deadline:
+            await asyncio.sleep(0.02)
+        await queue.wait_idle()
+        await queue.stop()
+        return [store.get(j["job_id"]) for j in jobs]
+
+    jobs = asyncio.run(run())
+    assert [j["status"] for j in jobs] == [DONE] * 3
+    # Cada job corrió una sola vez: solo el primero indexó, los otros vieron el mismo contenido
+    assert sorted(j["chunks_indexed"] for j in jobs) == [0, 0, len(chunk_text(ARTICLE))]
+    assert segmented.read_manifest()["ntotal"] == len(chunk_text(ARTICLE))
+    assert not store.claim(jobs[0]["job_id"])
+
+    # Si el escritor se va, otro worker toma su lugar
+    writer.release()
+    assert reader.acquire()
+    reader.release()
+
+
+def test_bulk_run_waits_for_its_jobs_claimed_by_the_api_writer(pipeline, monkeypatch):
+    from src.bulk_ingest import ingest_urls
+    store, segmented = pipeline
+    scrape = ingestion.scrape_wikipedia_article_async
+
+    async def slow_scrape(url):
+        # El primero lo toma el proceso bulk; mientras, el writer reclama el resto (más lentos)
+        await asyncio.sleep(0.2 if url.endswith("_0") else 0.5)
+        return await scrape(url)
+
+    monkeypatch.setattr(ingestion, "scrape_wikipedia_article_async", slow_scrape)
+    urls = [f"https://en.wikipedia.org/wiki/Banana_{i}" for i in range(4)]
+
+    async def run():
+        # El writer de la API revisa la base compartida y toma jobs del proceso bulk
+        server = IngestionQueue(JobStore(store.path), workers=4, poll_interval=0.02)
+        server.start()
+        try:
+            return await ingest_urls(urls, store, workers=1, poll_interval=0.02)
+        finally:
+            await server.stop()
+
+    jobs = asyncio.run(run())
+    assert [j["status"] for j in jobs] == [DONE] * 4
+    assert segmented.read_manifest()["ntotal"] == 4 * len(chunk_text(ARTICLE))
@@ -0,0 +1,90 @@
+# test_retrieval_store.py
+
+import faiss
+import numpy as np
+import pytest
+
+from src.chunk_store import ChunkStore
+from src.retrieval_store import RetrievalStore, reciprocal_rank_fusion
+from src.segment_index import SegmentedIndex
+
+
+def _vectors(n, dim=8):
+    return np.random.rand(n, dim).astype("float32")
+
+
+@pytest.fixture
+def segmented(tmp_path):
+    return SegmentedIndex(str(tmp_path / "index"), dim=8, legacy_path=None)
+
+
+@pytest.fixture
+def chunks(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+    store.append(0, [{"doc_id": "d", "chunk_id": i, "text": f"chunk {i}"} for i in range(7)])
+    return store
+
+
+def test_snapshot_is_loaded_once(segmented, chunks):
+    segmented.append(_vectors(5))
+    store = RetrievalStore(segmented, chunks)
+
+    s1 = store.snapshot()
+    s2 = store.snapshot()
+    # Sin cambios en disco se reutiliza el mismo objeto en memoria
+    assert s1 is s2
+    assert s1.index.ntotal == 5
+
+
+def test_reload_on_external_write_keeps_old_snapshot(segmented, chunks):
+    segmented.append(_vectors(5))
+    store = RetrievalStore(segmented, chunks)
+    old = store.snapshot()
+
+    # Otro proceso escribe en el mismo directorio
+    SegmentedIndex(segmented.directory, dim=8, legacy_path=None).append(_vectors(2))
+    new = store.snapshot()
+
+    assert new.generation == old.generation + 1
+    assert new.index.ntotal == 7
+    # El segmento que ya estaba cargado se reutiliza, solo se lee el nuevo
+    assert new.index.parts[0][2] is old.index.parts[0][2]
+    # Una query en curso con el snapshot viejo solo resuelve ids de su generación
+    assert [c["text"] for c in old.lookup([4, 6, -1])] == ["chunk 4"]
+    assert [c["text"] for c in new.lookup([4, 6, -1])] == ["chunk 4", "chunk 6"]
+
+
+def test_legacy_index_is_imported(tmp_path, chunks):
+    legacy_path = str(tmp_path / "store.index")
+    index = faiss.IndexFlatL2(8)
+    index.add(_vectors(3))
+    faiss.write_index(index, legacy_path)
+    store = RetrievalStore(SegmentedIndex(str(tmp_path / "index"), dim=8, legacy_path=legacy_path), chunks)
+
+    assert store.snapshot().index.ntotal == 3
+
+
+def test_missing_index(segmented, chunks):
+    store = RetrievalStore(segmented, chunks)
+    assert store.warm() is False
+    with pytest.raises(FileNotFoundError):
+        store.snapshot()
+
+
+def test_reciprocal_rank_fusion():
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 4]], limit=3) == [3, 1, 2]
+    assert reciprocal_rank_fusion([[], [5]], limit=3) == [5]
+
+
+def test_hybrid_search_finds_lexical_match_outside_vector_top_k(segmented, tmp_path):
+    chunks = ChunkStore(str(tmp_path / "hybrid.sqlite3"))
+    chunks.append(0, [{"doc_id": "d", "chunk_id": i, "text": f"filler text {i}"} for i in range(6)])
+    chunks.append(6, [{"doc_id": "d", "chunk_id": 6, "text": "the platypus lays eggs"}])
+    vectors = _vectors(7)
+    segmented.append(vectors)
+    snap = RetrievalStore(segmented, chunks).snapshot()
+
+    q = vectors[:1]  # el vector más cercano es el id 0, lejos del 6
+    ids = snap.hybrid_search(q, "platypus", k=2, candidates=2)
+    assert ids[0] in (0, 6) and set(ids) == {0, 6}
+    assert snap.hybrid_search(q, "platypus", k=2, doc_ids=["other"]) == []
@@ -0,0 +1,124 @@
+# test_scraper.py
+
+import os
+import time
+import asyncio
+import threading
+import functools
+import pytest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import src.ingestion as ingestion
+import src.scraper as scraper
+from src.scraper import Scraper, HtmlCache, HostRateLimiter
+from src.utils import extract_article_text
+from src.bulk_ingest import ingest_urls, read_url_file
+from src.jobs import JobStore, DONE, FAILED
+from src.retrieval_store import RetrievalStore
+from src.segment_index import SegmentedIndex
+from src.chunk_store import ChunkStore
+from src.embedding_client import get_async_embedding_client
+from src.fake_upstream import start_fake_upstream, fake_article
+
+
+def _page(body: str) -> str:
+    return (
+        "<html><body><div id='mw-navigation'><p>Main menu</p></div>"
+        f"<div id='bodyContent'><div class='mw-parser-output'>{body}</div></div>"
+        "<div id='footer'><p>Footer</p></div></body></html>"
+    )
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def log_request(self, code="-", size="-"):
+        self.server.log.append((self.path, int(code), self.headers.get("If-Modified-Since")))
+
+
+@pytest.fixture
+def site(tmp_path):
+    root = tmp_path / "site"
+    root.mkdir()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_Handler, directory=str(root)))
+    server.log = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield root, f"http://127.0.0.1:{server.server_address[1]}", server.log
+    server.shutdown()
+
+
+def test_extracts_only_body_paragraphs():
+    html = _page("<p>Bananas[1] are berries.</p><table><tr><td><p>Cell</p></td></tr></table><p>Second[23].</p>")
+    assert extract_article_text(html) == "Bananas are berries.\n\nCell\n\nSecond."
+    with pytest.raises(RuntimeError):
+        extract_article_text("<html><body><p>No content</p></body></html>")
+
+
+def test_fake_article_is_deterministic_and_parses():
+    text = extract_article_text(fake_article("Banana", paragraphs=5))
+    assert text == extract_article_text(fake_article("Banana", paragraphs=5))
+    assert text.count("\n\n") == 4 and text.startswith("Banana ")
+    assert "Main menu" not in text and "[" not in text
+
+
+def test_conditional_refetch_uses_cache(site, tmp_path):
+    root, base, log = site
+    page = root / "Banana"
+    page.write_text(_page("<p>Version one.</p>"))
+    s = Scraper(HtmlCache(str(tmp_path / "html.sqlite3")), HostRateLimiter(0))
+
+    assert "Version one" in asyncio.run(s.fetch(f"{base}/Banana"))
+    # Segunda vez: If-Modified-Since → 304 y el HTML sale del caché
+    assert "Version one" in asyncio.run(s.fetch(f"{base}/Banana"))
+    assert [code for _, code, _ in log] == [200, 304] and log[1][2] is not None
+
+    page.write_text(_page("<p>Version two.</p>"))
+    later = time.time() + 5
+    os.utime(page, (later, later))
+    assert "Version two" in asyncio.run(s.fetch(f"{base}/Banana"))
+    assert log[-1][1] == 200 and s.stats() == {"fetched": 2, "not_modified": 1, "cached_pages": 1}
+
+    with pytest.raises(RuntimeError, match="404"):
+        asyncio.run(s.fetch(f"{base}/Missing"))
+
+
+def test_rate_limit_is_per_host():
+    limiter = HostRateLimiter(0.05)
+
+    async def run(hosts):
+        t0 = time.perf_counter()
+        await asyncio.gather(*(limiter.wait(h) for h in hosts))
+        return time.perf_counter() - t0
+
+    assert asyncio.run(run(["a", "b", "c"])) < 0.04
+    assert asyncio.run(run(["x"] * 4)) >= 0.14
+
+
+def test_bulk_ingest_from_url_file(site, tmp_path, monkeypatch):
+    root, base, log = site
+    for name in ("Banana", "Apple"):
+        (root / name).write_text(_page(f"<p>{name}s are fruits. {name}s grow on plants.</p>" * 20))
+    url_file = tmp_path / "urls.txt"
+    url_file.write_text(f"# artículos\n{base}/Banana\n\n{base}/Apple\n{base}/Banana\n{base}/Missing\n")
+
+    server, upstream = start_fake_upstream()
+    segmented = SegmentedIndex(str(tmp_path / "index"), legacy_path=None)
+    chunks = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+    monkeypatch.setattr(scraper, "_default_scraper", Scraper(HtmlCache(str(tmp_path / "html.sqlite3"))))
+    monkeypatch.setattr(ingestion, "save_text_to_file", lambda text, filename: None)
+    monkeypatch.setattr(ingestion, "segmented_index", segmented)
+    monkeypatch.setattr(ingestion, "chunk_store", chunks)
+    monkeypatch.setattr(ingestion, "retrieval_store", RetrievalStore(segmented, chunks))
+    monkeypatch.setattr(get_async_embedding_client(), "endpoint", f"{upstream}/api/embed")
+    monkeypatch.setattr(get_async_embedding_client(), "cache", None)
+    try:
+        urls = read_url_file(str(url_file))
+        assert len(urls) == 3
+        jobs = asyncio.run(ingest_urls(urls, JobStore(str(tmp_path / "jobs.sqlite3")), workers=3))
+    finally:
+        server.shutdown()
+
+    assert [j["status"] for j in jobs] == [DONE, DONE, FAILED]
+    assert segmented.read_manifest()["ntotal"] == len(chunks) == jobs[0]["chunks_indexed"] + jobs[1]["chunks_indexed"]
+    assert "Main menu" not in " ".join(c["text"] for c in chunks.iter_all())
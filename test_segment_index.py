@@ -0,0 +1,255 @@
+# test_segment_index.py
+
+import os
+import multiprocessing as mp
+import faiss
+import numpy as np
+import pytest
+
+import src.index_factory as index_factory
+from src.quantize_index import index_memory
+from src.segment_index import SegmentedIndex
+
+DIM = 8
+
+
+def _vectors(n, seed=0):
+    return np.random.default_rng(seed).random((n, DIM), dtype="float32")
+
+
+@pytest.fixture
+def seg(tmp_path):
+    return SegmentedIndex(str(tmp_path / "index"), dim=DIM, legacy_path=None, compact_max_segments=100)
+
+
+def _files(seg):
+    return sorted(f for f in os.listdir(seg.directory) if f.endswith(".index"))
+
+
+def test_appends_match_single_flat_index(seg):
+    batches = [_vectors(n, seed=n) for n in (5, 1, 12, 3)]
+    starts = [seg.append(b) for b in batches]
+    assert starts == [0, 5, 6, 18]
+
+    flat = faiss.IndexFlatL2(DIM)
+    flat.add(np.concatenate(batches))
+    q = _vectors(4, seed=99)
+    view = seg.open_view()
+    D, I = view.search(q, 6)
+    D_ref, I_ref = flat.search(q, 6)
+
+    assert view.ntotal == 21 and len(view.parts) == 4
+    np.testing.assert_array_equal(I, I_ref)
+    np.testing.assert_allclose(D, D_ref, rtol=1e-5)
+
+
+def test_search_subset_matches_filtered_flat(seg):
+    batches = [_vectors(n, seed=n) for n in (6, 4, 9)]
+    for b in batches:
+        seg.append(b)
+    allv = np.concatenate(batches)
+    subset = np.array([1, 2, 3, 5, 6, 7, 12, 18, 40])  # cruza segmentos; 40 no existe
+    q = _vectors(3, seed=7)
+
+    D, I = seg.open_view().search_subset(q, 4, subset)
+
+    valid = subset[subset < len(allv)]
+    flat = faiss.IndexFlatL2(DIM)
+    flat.add(allv[valid])
+    D_ref, I_ref = flat.search(q, 4)
+    np.testing.assert_array_equal(I, valid[I_ref])
+    np.testing.assert_allclose(D, D_ref, rtol=1e-4, atol=1e-5)
+    # Menos candidatos que k: se rellena con -1 como FAISS
+    assert list(seg.open_view().search_subset(q, 3, [4])[1][0]) == [4, -1, -1]
+
+
+def test_wal_is_replayed_after_crash(seg):
+    seg.append(_vectors(3))
+    # Simula un proceso que murió después de escribir el WAL y antes del manifest
+    with seg.writer():
+        seg._wal_append(3, _vectors(4, seed=1))
+    with open(os.path.join(seg.directory, "wal.log"), "ab") as f:
+        f.write(b"WAL1 registro a medias")
+
+    reopened = SegmentedIndex(seg.directory, dim=DIM, legacy_path=None)
+    assert reopened.append(_vectors(2, seed=2)) == 7
+    view = reopened.open_view()
+    assert view.ntotal == 9
+    np.testing.assert_allclose(view.parts[1][2].reconstruct_n(0, 4), _vectors(4, seed=1))
+    assert os.path.getsize(os.path.join(seg.directory, "wal.log")) == 0
+
+
+def test_compaction_keeps_results_and_removes_segments(seg):
+    for i in range(5):
+        seg.append(_vectors(4, seed=i))
+    q = _vectors(3, seed=50)
+    before = seg.open_view()
+
+    assert seg.compact() is True
+    after = seg.open_view()
+
+    assert len(after.parts) == 1 and after.ntotal == before.ntotal == 20
+    assert _files(seg) == [after.parts[0][0]]
+    np.testing.assert_array_equal(after.search(q, 5)[1], before.search(q, 5)[1])
+    # Un snapshot tomado antes sigue sirviendo desde memoria
+    assert before.search(q, 5)[0].shape == (3, 5)
+    assert seg.append(_vectors(1)) == 20
+
+
+def test_background_compaction_after_threshold(tmp_path):
+    seg = SegmentedIndex(str(tmp_path / "index"), dim=DIM, legacy_path=None, compact_max_segments=3)
+    for i in range(4):
+        seg.append(_vectors(2, seed=i))
+    seg.compact(wait=True)  # espera al hilo de fondo si sigue corriendo
+
+    assert len(seg.read_manifest()["segments"]) == 1
+    assert seg.read_manifest()["ntotal"] == 8
+
+
+def test_compaction_builds_ann_tier_and_retrains_on_growth(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_factory, "ANN_MIN_VECTORS", 1000)
+    monkeypatch.setattr(index_factory, "IVF_NPROBE", 8)
+    seg = SegmentedIndex(str(tmp_path / "index"), dim=DIM, legacy_path=None, compact_max_segments=100)
+    data = _vectors(5000, seed=3)
+    seg.append(data[:600])
+    seg.append(data[600:1200])
+
+    seg.compact()
+    base = seg.open_view().parts[0][2]
+    assert index_factory.index_kind(base) == "ivf" and base.nlist == 34 and base.nprobe == 8
+
+    # Crece poco: se clona el base entrenado y solo se agregan los vectores nuevos
+    seg.append(data[1200:2000])
+    seg.compact()
+    view = seg.open_view()
+    assert view.parts[0][2].nlist == 34 and view.ntotal == 2000
+    D, I = view.search_subset(data[[5, 1500]], 1, [5, 1500, 1600])
+    assert list(I[:, 0]) == [5, 1500]
+
+    # Crece >4x desde el entrenamiento: se re-entrena con más listas
+    seg.append(data[2000:])
+    seg.compact()
+    view = seg.open_view()
+    assert view.parts[0][2].nlist == 70
+    flat = faiss.IndexFlatL2(DIM)
+    flat.add(data)
+    q = _vectors(50, seed=11)
+    recall = np.mean([len(set(a) & set(b)) / 6 for a, b in zip(view.search(q, 6)[1], flat.search(q, 6)[1])])
+    assert recall > 0.8
+
+
+def test_quantized_base_reranks_from_raw_vectors(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_factory, "PQ_M", 4)
+    monkeypatch.setattr(index_factory, "PQ_MIN_VECTORS", 1300)
+    directory = str(tmp_path / "index")
+    data = _vectors(1500, seed=5)
+    seg = SegmentedIndex(directory, dim=DIM, legacy_path=None, quantization="pq", rerank=8)
+    seg.append(data[:600])
+    seg.append(data[600:1200])
+
+    # Bajo PQ_MIN_VECTORS "pq" usa sq8; los vectores exactos quedan al lado en disco
+    seg.compact()
+    entry = seg.read_manifest()["segments"][0]
+    assert index_factory.index_quantization(seg.open_view().parts[0][2]) == "sq8"
+    assert entry["raw"].endswith(".npy") and os.path.exists(os.path.join(directory, entry["raw"]))
+
+    seg.append(data[1200:])
+    seg.compact()
+    view = seg.open_view()
+    assert index_factory.index_quantization(view.parts[0][2]) == "pq"
+    # Reconstrucción y búsqueda por documento siguen siendo exactas
+    assert np.array_equal(view.reconstruct_ids(np.array([3, 1499])), data[[3, 1499]])
+    flat = faiss.IndexFlatL2(DIM)
+    flat.add(data)
+    q = _vectors(20, seed=9)
+    D, I = view.search(q, 5)
+    recall = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(I, flat.search(q, 5)[1])])
+    assert recall > 0.9
+    # Distancias re-calculadas con los vectores exactos
+    assert np.allclose(D[:, 0], ((data[I[:, 0]] - q) ** 2).sum(1), rtol=1e-4)
+
+    # Volver a "none" (sin mmap) reconstruye un Flat exacto y borra los .npy
+    plain = SegmentedIndex(directory, dim=DIM, legacy_path=None, quantization="none", mmap=False)
+    plain.compact()
+    assert "raw" not in plain.read_manifest()["segments"][0]
+    assert not [f for f in os.listdir(directory) if f.endswith(".npy")]
+    assert np.array_equal(plain.open_view().search(q, 5)[1], flat.search(q, 5)[1])
+
+
+def test_flat_base_is_searched_from_shared_mapped_vectors(tmp_path):
+    directory = str(tmp_path / "index")
+    data = _vectors(500, seed=3)
+    seg = SegmentedIndex(directory, dim=DIM, legacy_path=None, mmap=True)
+    seg.append(data[:300])
+    seg.append(data[300:])
+    seg.compact()
+    entry = seg.read_manifest()["segments"][0]
+    assert entry["search_raw"] and entry["raw"].endswith(".npy")
+    # Memoria: el .npy mapeado, no el .index que nunca se carga
+    mem = index_memory(seg)
+    assert mem["ram_per_vector"] == 0 and mem["mapped_per_vector"] >= DIM * 4
+    assert index_memory(SegmentedIndex(directory, dim=DIM, legacy_path=None, mmap=False))["ram_per_vector"] >= DIM * 4
+
+    # Los lectores no cargan el .index: buscan sobre el .npy mapeado (memoria compartida entre procesos)
+    view = seg.open_view()
+    assert isinstance(view.parts[0][2].vectors, np.memmap)
+    flat = faiss.IndexFlatL2(DIM)
+    flat.add(data)
+    q = _vectors(10, seed=4)
+    assert np.array_equal(view.search(q, 5)[1], flat.search(q, 5)[1])
+    assert np.array_equal(view.reconstruct_ids(np.array([0, 299, 499])), data[[0, 299, 499]])
+    assert np.array_equal(SegmentedIndex(directory, dim=DIM, legacy_path=None, mmap=False).open_view().search(q, 5)[1],
+                          flat.search(q, 5)[1])
+
+
+def _append_many(directory, n):
+    seg = SegmentedIndex(directory, dim=DIM, legacy_path=None, compact_max_segments=100)
+    return [seg.append(_vectors(3, seed=i)) for i in range(n)]
+
+
+def test_single_writer_across_processes(seg):
+    with mp.get_context("fork").Pool(2) as pool:
+        results = pool.starmap(_append_many, [(seg.directory, 10), (seg.directory, 10)])
+
+    starts = sorted(s for r in results for s in r)
+    assert starts == list(range(0, 60, 3))
+    assert seg.open_view().ntotal == 60
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw"])
+def test_removed_vectors_are_skipped_then_dropped_at_compaction(tmp_path, index_type):
+    seg = SegmentedIndex(str(tmp_path / "index"), dim=DIM, legacy_path=None,
+                         compact_max_segments=100, index_type=index_type)
+    data = _vectors(1200, seed=7)
+    seg.append(data[:500])
+    seg.append(data[500:1000])
+    seg.compact()
+    gone = [3, 499, 500, 777]
+    assert seg.remove(gone + [3]) == 4 and seg.remove([3]) == 0
+
+    # Antes de compactar: lápidas en el manifest, filtradas al buscar
+    view = seg.open_view()
+    _, I = view.search(data[gone], 5)
+    assert not set(I.ravel()) & set(gone) and (I >= 0).all()
+    _, I = view.search_subset(data[[3]], 2, [3, 4, 777])
+    assert list(I[0]) == [4, -1]
+
+    seg.append(data[1000:])
+    seg.compact()
+    manifest = seg.read_manifest()
+    assert manifest["deleted"] == [] and len(manifest["segments"]) == 1
+    view = seg.open_view()
+    base = view.parts[0][2]
+    # Base con mapa de ids: los ids de los demás vectores no cambian
+    assert isinstance(base, faiss.IndexIDMap2) and index_factory.index_kind(base) == index_type
+    assert base.ntotal == 1196 and view.ntotal == 1200
+    keep = np.array([0, 4, 501, 1100])
+    assert np.allclose(view.reconstruct_ids(keep), data[keep])
+    assert list(view.search(data[[4, 1100]], 1)[1][:, 0]) == [4, 1100]
+
+    # Un segundo borrado sale del base con remove_ids (IVF/HNSW se rellenan)
+    seg.remove([4])
+    seg.compact()
+    view = seg.open_view()
+    assert view.parts[0][2].ntotal == 1195 and 4 not in view.search(data[[4]], 3)[1]
+    assert np.allclose(view.reconstruct_ids(np.array([5, 1199])), data[[5, 1199]])
@@ -2,8 +2,10 @@
 
 import numpy as np
 import time
+import pytest
 import requests
-from src.utils import generate_embedding_nomic
+from src.utils import generate_embedding_nomic, EmbeddingError
+from src.embedding_client import get_embedding_client
 from src.config import EMBED_ENDPOINT, REQUEST_TIMEOUT
 
 def test_embeddings_differ_and_shape():
@@ -22,21 +24,21 @@ def test_embeddings_differ_and_shape():
 
     print("✔ Embeddings shape OK y difieren entre sí (norm diff = %.4f)" % norm_diff)
 
-def test_timeout_returns_zeros(monkeypatch):
-    # 1. Forzamos un timeout en requests.post
+def test_timeout_raises_embedding_error(monkeypatch):
+    # 1. Forzamos un timeout en cada POST de la sesión del cliente
     def fake_post(*args, **kwargs):
         raise requests.exceptions.Timeout("Simulated timeout")
-    monkeypatch.setattr(requests, "post", fake_post)
+    monkeypatch.setattr(requests.Session, "post", fake_post)
+    monkeypatch.setattr(get_embedding_client(), "retry_backoff", 0.0)
 
-    # 2. Llamada tras timeout: debería devolver lista de ceros
-    v = generate_embedding_nomic("anything")
-    assert isinstance(v, list) and len(v) == 768, "Tras timeout, debe retornar lista de longitud 768"
-    assert all(x == 0.0 for x in v), "Tras timeout, todos los valores deben ser 0.0"
+    # 2. Tras agotar los reintentos debe fallar explícitamente, no devolver ceros
+    with pytest.raises(EmbeddingError):
+        generate_embedding_nomic("anything")
 
-    print("✔ Timeout manejado correctamente, devuelve ceros")
+    print("✔ Timeout reportado como EmbeddingError")
 
 if __name__ == "__main__":
     print("Testeando generate_embedding_nomic…\n")
     test_embeddings_differ_and_shape()
-    test_timeout_returns_zeros()
+    test_timeout_raises_embedding_error()
     print("\nTodos los tests pasaron correctamente.")